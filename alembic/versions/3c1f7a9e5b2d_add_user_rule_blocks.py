@@ -0,0 +1,48 @@
+"""add user rule blocks
+
+Revision ID: 3c1f7a9e5b2d
+Revises: af6d67213e8f
+Create Date: 2025-06-03 10:12:41.518203
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "3c1f7a9e5b2d"
+down_revision: Union[str, None] = "af6d67213e8f"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "user_rule_blocks",
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("rule_block", sa.Text(), nullable=False),
+        sa.Column("rule_count", sa.Integer(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["user_id"],
+            ["users.id"],
+        ),
+        sa.PrimaryKeyConstraint("user_id"),
+    )
+
+    # Backfill blocks for existing preferences, in insertion order
+    op.execute("""
+        INSERT INTO user_rule_blocks (user_id, rule_block, rule_count, updated_at)
+        SELECT user_id, string_agg(rules, E'\\n' ORDER BY id), count(*), now()
+        FROM user_preferences
+        WHERE rules <> ''
+        GROUP BY user_id
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_rule_blocks")
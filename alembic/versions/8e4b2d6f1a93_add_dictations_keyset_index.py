@@ -0,0 +1,33 @@
+"""add dictations keyset index
+
+Revision ID: 8e4b2d6f1a93
+Revises: 3c1f7a9e5b2d
+Create Date: 2025-06-04 09:31:07.204115
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "8e4b2d6f1a93"
+down_revision: Union[str, None] = "3c1f7a9e5b2d"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        "ix_dictations_user_id_created_at_id",
+        "dictations",
+        ["user_id", "created_at", "id"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_dictations_user_id_created_at_id", table_name="dictations")
@@ -0,0 +1,28 @@
+"""add dictations audio duration
+
+Revision ID: 9b3f6c2d8e57
+Revises: 5d2e8b7c4a16
+Create Date: 2025-06-09 10:12:44.318205
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "9b3f6c2d8e57"
+down_revision: Union[str, None] = "5d2e8b7c4a16"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("dictations", sa.Column("audio_duration", sa.Float(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("dictations", "audio_duration")
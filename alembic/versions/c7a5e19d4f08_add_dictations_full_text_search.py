@@ -0,0 +1,42 @@
+"""add dictations full text search
+
+Revision ID: c7a5e19d4f08
+Revises: 8e4b2d6f1a93
+Create Date: 2025-06-05 15:48:22.671930
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "c7a5e19d4f08"
+down_revision: Union[str, None] = "8e4b2d6f1a93"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("""
+        ALTER TABLE dictations ADD COLUMN search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(formatted_text, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(text, '')), 'B')
+        ) STORED
+        """)
+    op.create_index(
+        "ix_dictations_search_vector",
+        "dictations",
+        ["search_vector"],
+        unique=False,
+        postgresql_using="gin",
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_dictations_search_vector", table_name="dictations")
+    op.drop_column("dictations", "search_vector")
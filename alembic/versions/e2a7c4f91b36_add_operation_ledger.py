@@ -0,0 +1,59 @@
+"""add operation ledger
+
+Revision ID: e2a7c4f91b36
+Revises: 9b3f6c2d8e57
+Create Date: 2025-06-12 14:03:27.551902
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a7c4f91b36"
+down_revision: Union[str, None] = "9b3f6c2d8e57"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "operation_ledger",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("operation", sa.String(length=32), nullable=False),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("dictation_id", sa.Integer(), nullable=True),
+        sa.Column("total_ms", sa.Float(), nullable=False),
+        sa.Column("stages", sa.JSON(), nullable=False),
+        sa.Column("audio_bytes", sa.Integer(), nullable=True),
+        sa.Column("audio_duration", sa.Float(), nullable=True),
+        sa.Column("model", sa.String(length=64), nullable=True),
+        sa.Column("prompt_version", sa.String(length=128), nullable=True),
+        sa.Column("prompt_tokens", sa.Integer(), nullable=False),
+        sa.Column("completion_tokens", sa.Integer(), nullable=False),
+        sa.Column("cached_tokens", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_operation_ledger_user_id_created_at",
+        "operation_ledger",
+        ["user_id", "created_at"],
+    )
+    op.create_index(
+        op.f("ix_operation_ledger_created_at"), "operation_ledger", ["created_at"]
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f("ix_operation_ledger_created_at"), table_name="operation_ledger")
+    op.drop_index(
+        "ix_operation_ledger_user_id_created_at", table_name="operation_ledger"
+    )
+    op.drop_table("operation_ledger")
@@ -0,0 +1,70 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse
+
+from api.config import settings
+from api.utils.logging import get_logger
+from api.utils.loop_monitor import loop_monitor
+from api.utils.profiler import SamplingProfiler
+from api.utils.security import require_admin
+
+logger = get_logger(__name__)
+
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    dependencies=[Depends(require_admin)],
+    include_in_schema=False,
+)
+
+# One on-demand profile per worker at a time
+_profile_lock = asyncio.Lock()
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(10, gt=0, description="How long to sample for"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="Time between samples"),
+) -> PlainTextResponse:
+    """Sample this worker's threads and return collapsed stacks.
+
+    Feed the body to flamegraph.pl or speedscope. With several workers, the
+    profile is of whichever one took the request.
+    """
+    if seconds > settings.PROFILER_MAX_SECONDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"seconds must be at most {settings.PROFILER_MAX_SECONDS}",
+        )
+    if _profile_lock.locked():
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running in this worker",
+        )
+
+    async with _profile_lock:
+        profiler = SamplingProfiler(interval=interval_ms / 1000)
+        profiler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(profiler.stop)
+
+    logger.info("Profiled for %ss: %d samples", seconds, profiler.samples)
+    return PlainTextResponse(
+        profiler.collapsed(), headers={"X-Profile-Samples": str(profiler.samples)}
+    )
+
+
+@router.get("/loop-stalls")
+async def loop_stalls() -> list[dict]:
+    """Recent times this worker's event loop was blocked, newest first.
+
+    Each stall carries the loop thread's stack as the watchdog caught it,
+    which names the blocking call.
+    """
+    return [
+        {"at": stall.at, "lag_ms": round(stall.lag_ms, 1), "stack": stall.stack}
+        for stall in reversed(loop_monitor.stalls)
+    ]
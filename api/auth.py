@@ -9,21 +9,53 @@ from sqlalchemy import select
 from api.database import get_session
 from api.utils.logging import get_logger
 from api.utils.security import (
-    get_current_user,
+    get_current_user_model,
     create_access_token,
-    verify_password,
-    get_password_hash,
+    invalidate_cached_user,
+    check_password,
+    hash_password,
 )
+from api.utils.password_hasher import PasswordHasherBusy
 from api.config import settings
-from api.utils.exceptions import UnauthorizedException
+from api.utils.exceptions import ServiceUnavailableException, UnauthorizedException
 from api.models import UserModel
-from api.schemas import LoginData, Token, UserCreate, UserResponse
+from api.repositories.refresh_tokens import (
+    InvalidRefreshTokenError,
+    RefreshTokenRepository,
+)
+from api.repositories.users import UsersRepository
+from api.schemas import (
+    LoginData,
+    RefreshTokenRequest,
+    Token,
+    UserCreate,
+    UserResponse,
+)
 
 logger = get_logger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
+def _refresh_tokens(session: AsyncSession) -> RefreshTokenRepository:
+    return RefreshTokenRepository(
+        session, timedelta(days=settings.REFRESH_TOKEN_EXPIRATION)
+    )
+
+
+def _token_response(user_id: int, refresh_token: str) -> Token:
+    """Build a token pair response for a user."""
+    expires_delta = timedelta(minutes=settings.JWT_EXPIRATION)
+    access_token = create_access_token(
+        data={"sub": str(user_id)}, expires_delta=expires_delta
+    )
+    return Token(
+        access_token=access_token,
+        expires_in=int(expires_delta.total_seconds()),
+        refresh_token=refresh_token,
+    )
+
+
 @router.post(
     "/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED
 )
@@ -31,27 +63,24 @@ async def register(
     user_data: UserCreate, session: AsyncSession = Depends(get_session)
 ) -> UserResponse:
     """Register a new user."""
-    logger.debug(f"Registering user: {user_data.email}")
+    logger.debug("Registering user: %s", user_data.email)
 
-    # Check if user exists
-    stmt = select(UserModel).where(UserModel.email == user_data.email)
-    result = await session.execute(stmt)
-    existing_user = result.scalar_one_or_none()
+    try:
+        hashed_password = await hash_password(user_data.password)
+    except PasswordHasherBusy:
+        raise ServiceUnavailableException(detail="Too many requests, try again")
 
-    if existing_user:
+    user = await UsersRepository(session).create(user_data.email, hashed_password)
+    if user is None:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
         )
-
-    # Create new user
-    hashed_password = get_password_hash(user_data.password)
-    user = UserModel(email=user_data.email, hashed_password=hashed_password)
-
-    session.add(user)
     await session.commit()
-    await session.refresh(user)
 
-    return UserResponse.model_validate(user)
+    # The id may have been cached as unknown (e.g. a reset database)
+    invalidate_cached_user(user.id)
+
+    return user
 
 
 @router.post("/login", response_model=Token)
@@ -61,7 +90,7 @@ async def login(
 ) -> Token:
     """Authenticate user and return token."""
     login_data = LoginData(email=form_data.username, password=form_data.password)
-    logger.debug(f"Login attempt: {login_data.email}")
+    logger.debug("Login attempt: %s", login_data.email)
 
     # Get user
     stmt = select(UserModel).where(UserModel.email == login_data.email)
@@ -69,20 +98,64 @@ async def login(
     user = result.scalar_one_or_none()
 
     # Verify credentials
-    if not user or not verify_password(login_data.password, str(user.hashed_password)):
+    if not user:
         raise UnauthorizedException(detail="Incorrect email or password")
 
-    # Create access token
-    access_token = create_access_token(
-        data={"sub": str(user.id)},
-        expires_delta=timedelta(minutes=settings.JWT_EXPIRATION),
-    )
+    try:
+        verified, new_hash = await check_password(
+            login_data.password, str(user.hashed_password)
+        )
+    except PasswordHasherBusy:
+        raise ServiceUnavailableException(detail="Too many requests, try again")
+
+    if not verified:
+        raise UnauthorizedException(detail="Incorrect email or password")
+
+    # The hash was made with a different cost factor; upgrade it now that we
+    # have the plaintext
+    if new_hash:
+        user.hashed_password = new_hash
+        logger.info("Rehashed password for user %s", user.id)
+
+    refresh_token = await _refresh_tokens(session).issue(user.id)
+    await session.commit()
+
+    logger.info("User authenticated: %s", user.email)
+    return _token_response(user.id, refresh_token)
 
-    logger.info(f"User authenticated: {user.email}")
-    return Token(access_token=access_token)
+
+@router.post("/refresh", response_model=Token)
+async def refresh(
+    data: RefreshTokenRequest, session: AsyncSession = Depends(get_session)
+) -> Token:
+    """Exchange a refresh token for a new token pair, without a password.
+
+    The presented refresh token is spent; reusing it revokes every token
+    descended from the same login.
+    """
+    try:
+        user_id, refresh_token = await _refresh_tokens(session).rotate(
+            data.refresh_token
+        )
+    except InvalidRefreshTokenError:
+        # Commit so a reuse-triggered revocation sticks
+        await session.commit()
+        raise UnauthorizedException(detail="Invalid refresh token")
+
+    await session.commit()
+    return _token_response(user_id, refresh_token)
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(
+    data: RefreshTokenRequest, session: AsyncSession = Depends(get_session)
+) -> None:
+    """Revoke a refresh token and the rest of its login session."""
+    await _refresh_tokens(session).revoke(data.refresh_token)
+    await session.commit()
 
 
 @router.get("/me", response_model=UserResponse)
-async def get_me(user: UserModel = Depends(get_current_user)) -> UserResponse:
+async def get_me(user: UserModel = Depends(get_current_user_model)) -> UserResponse:
     """Get current authenticated user."""
     return UserResponse.model_validate(user)
@@ -1,7 +1,7 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic_core import MultiHostUrl
 from pydantic import computed_field, PostgresDsn
-from typing import Literal
+from typing import Dict, Literal
 
 
 class Settings(BaseSettings):
@@ -11,19 +11,37 @@ class Settings(BaseSettings):
     ENV: Literal["local", "docker"] = "local"
     DEBUG: bool = True
 
+    # Production launcher (python -m api.server)
+    WEB_HOST: str = "0.0.0.0"
+    WEB_PORT: int = 8000
+    WEB_WORKERS: int = 0  # 0 starts one per CPU
+    WEB_GRACEFUL_TIMEOUT: int = 60  # seconds in-flight requests get after SIGTERM
+    WEB_DRAIN_DELAY_SECONDS: float = 0.0  # keep serving, reporting draining, first
+    WEB_ACCESS_LOG: bool = False  # the per-request timing log line covers it
+    WARMUP_ENABLED: bool = True
+    WARMUP_TIMEOUT_SECONDS: float = 30.0
+
+    # Logs go through a queue to a writer thread; sampling keeps this
+    # fraction of a logger's records below WARNING, e.g. {"api.auth": 0.1}
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: Literal["json", "text"] = "json"
+    LOG_QUEUE_SIZE: int = 10000  # records beyond this are dropped
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+
     # Postgres
     POSTGRES_SERVER: str
     POSTGRES_PORT: int
     POSTGRES_DB: str
     POSTGRES_USER: str
     POSTGRES_PASSWORD: str
+    DB_DRIVER: Literal["psycopg", "asyncpg"] = "psycopg"
 
     @computed_field  # type: ignore[prop-decorator]
     @property
     def DATABASE_URL(self) -> PostgresDsn:
         return str(
             MultiHostUrl.build(
-                scheme="postgresql+psycopg",
+                scheme=f"postgresql+{self.DB_DRIVER}",
                 username=self.POSTGRES_USER,
                 password=self.POSTGRES_PASSWORD,
                 host=self.POSTGRES_SERVER,
@@ -32,10 +50,39 @@ class Settings(BaseSettings):
             )
         )
 
+    # Database pool, sized per replica: pool + overflow across all workers
+    # must stay under the server's max_connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # seconds to wait for a connection
+    DB_POOL_RECYCLE: int = 1800  # seconds; -1 disables
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 0  # 0 disables
+    DB_SLOW_STATEMENT_MS: int = 500  # log statements slower than this; 0 disables
+    # asyncpg only: prepared statements cached per connection; set to 0 behind
+    # PgBouncer in transaction pooling mode
+    DB_ASYNCPG_STATEMENT_CACHE_SIZE: int = 100
+
     # JWT Settings
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
     JWT_EXPIRATION: int = 30  # minutes
+    REFRESH_TOKEN_EXPIRATION: int = 14  # days
+
+    # Shared secret for /admin endpoints, sent as X-Admin-Token; empty
+    # disables them
+    ADMIN_TOKEN: str = ""
+
+    # Authenticated-user cache (per worker process)
+    AUTH_USER_CACHE_TTL: int = 30  # seconds; 0 disables
+    AUTH_USER_CACHE_SIZE: int = 10000
+
+    # Password hashing; raising BCRYPT_ROUNDS rehashes each account on its
+    # next successful login
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_EXECUTOR: Literal["thread", "process"] = "thread"
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_PENDING: int = 64  # queued + running; beyond this 503
 
     # OpenAI
     OPENAI_API_KEY: str
@@ -44,6 +91,70 @@ class Settings(BaseSettings):
     DEFAULT_LLM_TEXT_MODEL: str = "gpt-4o"
     FORMAT_PROMPT: str = "format-transcript"
     EXTRACT_RULES_PROMPT: str = "create-memory"
+    PROMPT_CACHE_SECONDS: int = 300  # pulled prompts kept per worker; 0 disables
+
+    # Batch dictation upload
+    DICTATION_BATCH_MAX_FILES: int = 20
+    DICTATION_BATCH_CONCURRENCY: int = 3  # files in flight per user
+
+    # Response compression: gzip; brotli is opt-in, offered only once the
+    # brotli package is installed (it is not a project dependency)
+    COMPRESSION_MIN_SIZE: int = 1024  # bytes; smaller bodies go uncompressed
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 4
+
+    # Per-request stage timings in a Server-Timing header and a log line;
+    # the header reveals backend timing, so disable it where that matters
+    SERVER_TIMING_ENABLED: bool = True
+
+    # Per-operation latency and token ledger, inserted in batches
+    LEDGER_ENABLED: bool = True
+    LEDGER_BATCH_SIZE: int = 200
+    LEDGER_FLUSH_SECONDS: float = 2.0
+    LEDGER_MAX_PENDING: int = 10000  # entries beyond this are dropped
+
+    # Local span tracing, written per worker to rotating JSON-lines files
+    TRACING_ENABLED: bool = True
+    TRACE_DIR: str = "data/traces"
+    TRACE_BUFFER_SIZE: int = 10000  # finished spans held between flushes
+    TRACE_FILE_MAX_MB: int = 20
+    TRACE_FILE_BACKUPS: int = 5
+    TRACE_FLUSH_SECONDS: float = 5.0
+
+    # Sampling profiler: on demand through /admin/profile, and optionally
+    # always on at a low rate, writing a collapsed-stack snapshot per period
+    PROFILER_MAX_SECONDS: int = 120
+    PROFILER_CONTINUOUS: bool = False
+    PROFILER_CONTINUOUS_INTERVAL_MS: int = 100
+    PROFILER_SNAPSHOT_SECONDS: int = 60
+    PROFILER_DIR: str = "data/profiles"
+    PROFILER_KEEP: int = 60  # snapshots kept per worker
+
+    # Event-loop lag monitor; logs the loop's stack when it is blocked
+    LOOP_MONITOR_ENABLED: bool = True
+    LOOP_MONITOR_INTERVAL_MS: int = 100
+    LOOP_BLOCK_THRESHOLD_MS: int = 100
+
+    # Idempotency-Key on dictation and preference submissions: responses are
+    # replayed for IDEMPOTENCY_TTL_HOURS; a retry that arrives while the
+    # first request is running waits up to IDEMPOTENCY_WAIT_SECONDS for it.
+    # A claim whose worker died is given up after IDEMPOTENCY_LEASE_SECONDS
+    IDEMPOTENCY_TTL_HOURS: int = 24
+    IDEMPOTENCY_WAIT_SECONDS: float = 30.0
+    IDEMPOTENCY_LEASE_SECONDS: int = 600
+
+    # Resumable uploads; ranges are kept on local disk until finalized
+    UPLOAD_DIR: str = "data/uploads"
+    UPLOAD_TTL_HOURS: int = 24
+    UPLOAD_MAX_OPEN_PER_USER: int = 5
+    UPLOAD_MAX_PARTS: int = 256  # stored ranges per upload
+
+    # Similar-note search
+    EMBEDDING_INDEX_DIR: str = "data/embeddings"
+    EMBEDDING_DIM: int = 512
+    # Each cached user holds two open memory maps (and file descriptors)
+    EMBEDDING_MAP_CACHE_SIZE: int = 32
+    EMBEDDING_MAP_CACHE_SECONDS: int = 300
 
     # LangSmith
     LANGSMITH_TRACING: bool = False
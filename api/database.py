@@ -1,10 +1,54 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import declarative_base, sessionmaker
 
 from api.config import settings
+from api.utils.db_metrics import InstrumentedAsyncPool, instrument_engine
+from api.utils.tracing import trace_engine
+
+
+def _connect_args(driver: str) -> dict:
+    """Driver-specific connection arguments derived from settings."""
+    timeout = settings.DB_STATEMENT_TIMEOUT_MS
+    if driver == "asyncpg":
+        connect_args = {
+            "prepared_statement_cache_size": settings.DB_ASYNCPG_STATEMENT_CACHE_SIZE
+        }
+        if timeout:
+            connect_args["server_settings"] = {"statement_timeout": str(timeout)}
+        return connect_args
+
+    if timeout:
+        return {"options": f"-c statement_timeout={timeout}"}
+    return {}
+
+
+def build_engine(database_url: str) -> AsyncEngine:
+    """Create an instrumented async engine using the configured pool settings."""
+    driver = make_url(database_url).get_driver_name()
+    engine = create_async_engine(
+        database_url,
+        echo=False,
+        future=True,
+        poolclass=InstrumentedAsyncPool,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT,
+        pool_recycle=settings.DB_POOL_RECYCLE,
+        pool_pre_ping=settings.DB_POOL_PRE_PING,
+        connect_args=_connect_args(driver),
+    )
+    instrument_engine(engine, slow_statement_ms=settings.DB_SLOW_STATEMENT_MS)
+    trace_engine(engine)
+    return engine
+
 
 # Create async engine
-engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True)
+engine = build_engine(settings.DATABASE_URL)
 
 # Create async session factory
 async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
@@ -14,6 +58,32 @@ Base = declarative_base()
 metadata = Base.metadata
 
 
+async def warm_pool(engine: AsyncEngine, connections: int) -> None:
+    """Open ``connections`` pooled connections now rather than on first use."""
+
+    async def connect():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.gather(*(connect() for _ in range(connections)))
+
+
+def dialect_insert(session: AsyncSession, entity):
+    """INSERT construct for the session's dialect, for ON CONFLICT clauses."""
+    if session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(entity)
+    return sqlite.insert(entity)
+
+
+def get_session_factory() -> sessionmaker:
+    """Dependency for work that outlives the request and opens its own sessions.
+
+    A ``get_session`` session is closed once the endpoint returns, which, for
+    a streaming response before FastAPI 0.118, is before the body is sent.
+    """
+    return async_session
+
+
 async def get_session() -> AsyncSession:
     """Dependency for getting async database session."""
     async with async_session() as session:
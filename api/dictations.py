@@ -1,21 +1,216 @@
-from fastapi import APIRouter, Depends, File, UploadFile, status, HTTPException
+import asyncio
+import re
+import uuid
+from datetime import timedelta
+from functools import partial
+
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    Header,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+    HTTPException,
+)
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from sqlalchemy.orm import sessionmaker
+from typing import Awaitable, BinaryIO, Callable, List, Literal, Tuple, TypeVar
 
-from api.database import get_session
+from api.config import settings
+from api.database import get_session, get_session_factory
+from api.utils.audio_probe import AudioProbe, InvalidAudioError, probe_audio
+from api.utils.clock import utcnow
+from api.utils.ledger import discard_entry
 from api.utils.logging import get_logger
-from api.utils.security import get_current_user
+from api.utils.metrics import track_stage
+from api.utils.responses import FastJSONResponse
+from api.utils.security import Principal, get_current_user
+from api.utils.tracing import tracer
+from api.utils.uploads import (
+    MULTIPART_OVERHEAD,
+    IngestedUpload,
+    UploadTooLargeError,
+    detach_upload,
+    ingest_upload,
+)
+from api.repositories.dictations import (
+    LIST_FIELDS,
+    DictationsRepository,
+    InvalidCursorError,
+)
+from api.repositories.ledger import LedgerRepository
+from api.repositories.search import DictationSearchRepository
 from api.schemas import (
+    DictationBatchResult,
     DictationsCreateResponse,
+    DictationsPage,
+    DictationSearchPage,
+    DictationSimilarHit,
+    LedgerSummaryRow,
+    ResumableUploadCreate,
+    ResumableUploadStatus,
     UserEditsInput,
     UserPreferencesResponse,
 )
 from api.services.audio_service import AudioService, PreferencesService
-from api.models import UserModel
+from api.services.embedding_service import SimilarDictationsService
+from api.services.idempotency_service import (
+    IdempotencyKeyInFlightError,
+    IdempotencyKeyReusedError,
+    IdempotencyService,
+    StoredResponse,
+    request_hash,
+)
+from api.services.ledger_service import ledger_writer
+from api.services.upload_service import (
+    UploadBusyError,
+    UploadIncompleteError,
+    UploadInfo,
+    UploadLimitError,
+    UploadNotFoundError,
+    UploadRangeError,
+    upload_store,
+)
 
 logger = get_logger(__name__)
 
-router = APIRouter(prefix="/dictations", tags=["dictations"])
+router = APIRouter(
+    prefix="/dictations",
+    tags=["dictations"],
+    default_response_class=FastJSONResponse,
+)
+
+ALLOWED_CONTENT_TYPES = ["audio/mpeg", "audio/wav", "audio/mp4", "audio/ogg"]
+MAX_AUDIO_BYTES = 10 * 1024 * 1024  # 10MB
+
+# Whole-request caps, enforced by RequestSizeLimitMiddleware before the
+# multipart body is parsed
+REQUEST_BODY_LIMITS = {
+    ("POST", "/dictations/"): MAX_AUDIO_BYTES + MULTIPART_OVERHEAD,
+    ("POST", "/dictations/batch"): settings.DICTATION_BATCH_MAX_FILES
+    * (MAX_AUDIO_BYTES + MULTIPART_OVERHEAD),
+}
+
+
+IDEMPOTENCY_KEY = Header(
+    None,
+    min_length=1,
+    max_length=255,
+    description="Client-chosen key; a retry with the same key and body gets "
+    "the first response instead of running the request again",
+)
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+ResponseModel = TypeVar("ResponseModel")
+
+
+def _check_content_type(content_type: str | None) -> None:
+    if content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unsupported file type. Allowed: {', '.join([t.split('/')[-1] for t in ALLOWED_CONTENT_TYPES])}",
+        )
+
+
+def _file_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail="File too large. Maximum size is 10MB",
+    )
+
+
+async def _probe_audio(audio: BinaryIO) -> AudioProbe:
+    """Check that a file really is non-empty audio in a supported format."""
+    try:
+        with track_stage("probe"):
+            probe = await asyncio.to_thread(probe_audio, audio)
+            tracer.annotate(format=probe.format, duration=probe.duration)
+            return probe
+    except InvalidAudioError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid audio file: {e}",
+        )
+
+
+async def _ingest_audio(audio: UploadFile) -> Tuple[IngestedUpload, AudioProbe]:
+    """Validate an uploaded audio file's type, size and contents.
+
+    Returns the spooled upload itself, rewound, rather than a copy in memory,
+    along with its digest and what probing its headers found.
+    """
+    _check_content_type(audio.content_type)
+
+    try:
+        with track_stage("upload_read"):
+            ingested = await ingest_upload(audio, MAX_AUDIO_BYTES)
+            tracer.annotate(bytes=ingested.size)
+    except UploadTooLargeError:
+        raise _file_too_large()
+
+    probe = await _probe_audio(ingested.file)
+    logger.debug(
+        "Received %s: %d bytes, sha256 %s, %s/%s %sHz, %.1fs",
+        audio.filename,
+        ingested.size,
+        ingested.sha256,
+        probe.format,
+        probe.codec,
+        probe.sample_rate,
+        probe.duration,
+    )
+    return ingested, probe
+
+
+async def _read_audio(audio: UploadFile) -> Tuple[BinaryIO, AudioProbe]:
+    ingested, probe = await _ingest_audio(audio)
+    return ingested.file, probe
+
+
+async def _idempotent(
+    session: AsyncSession,
+    user_id: int,
+    endpoint: str,
+    key: str | None,
+    fingerprint: bytes,
+    operation: Callable[[], Awaitable[ResponseModel]],
+    status_code: int,
+) -> ResponseModel | Response:
+    """Run ``operation`` once per Idempotency-Key; retries get its response."""
+    if key is None:
+        return await operation()
+
+    try:
+        service = IdempotencyService(session)
+        result = await service.run(user_id, endpoint, key, fingerprint, operation)
+    except IdempotencyKeyReusedError as e:
+        discard_entry()
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
+    except IdempotencyKeyInFlightError as e:
+        discard_entry()
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e),
+            headers={"Retry-After": "5"},
+        )
+
+    if isinstance(result, StoredResponse):
+        # Nothing was processed; the ledger already has the first request
+        discard_entry()
+        return FastJSONResponse(
+            result.body,
+            status_code=status_code,
+            headers={"Idempotent-Replayed": "true"},
+        )
+    return result
 
 
 @router.post(
@@ -23,47 +218,390 @@ router = APIRouter(prefix="/dictations", tags=["dictations"])
 )
 async def create_dictation(
     audio: UploadFile = File(..., description="Audio file to be processed"),
+    idempotency_key: str | None = IDEMPOTENCY_KEY,
     session: AsyncSession = Depends(get_session),
-    user: UserModel = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> DictationsCreateResponse:
-    """Accept an audio file for dictation processing."""
+    """Accept an audio file for dictation processing.
 
-    # Validate file type
-    allowed_content_types = ["audio/mpeg", "audio/wav", "audio/mp4", "audio/ogg"]
-    if audio.content_type not in allowed_content_types:
+    With an ``Idempotency-Key``, resending the same file returns the first
+    request's dictation instead of processing it again.
+    """
+
+    # Opened before the upload is read, so the entry has the same stages as
+    # a batch file's
+    with ledger_writer.track("dictation", user.id):
+        ingested, probe = await _ingest_audio(audio)
+
+        async def process() -> DictationsCreateResponse:
+            try:
+                audio_service = AudioService(session)
+                return await audio_service.process_audio(ingested.file, user.id, probe)
+            except Exception as e:
+                logger.error("Error processing dictation: %s", e)
+                raise HTTPException(
+                    status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                    detail="Failed to process the audio file",
+                )
+
+        return await _idempotent(
+            session,
+            user.id,
+            "dictations.create",
+            idempotency_key,
+            request_hash(ingested.sha256),
+            process,
+            status.HTTP_201_CREATED,
+        )
+
+
+def _batch_result(
+    index: int, upload: UploadFile, outcome: DictationsCreateResponse | Exception
+) -> str:
+    if isinstance(outcome, Exception):
+        detail = (
+            outcome.detail
+            if isinstance(outcome, HTTPException)
+            else "Failed to process the audio file"
+        )
+        result = DictationBatchResult(
+            index=index, filename=upload.filename, status="failed", detail=detail
+        )
+    else:
+        result = DictationBatchResult(
+            index=index, filename=upload.filename, status="created", dictation=outcome
+        )
+    return result.model_dump_json(exclude_none=True) + "\n"
+
+
+@router.post(
+    "/batch",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}}},
+)
+async def create_dictations_batch(
+    audio: List[UploadFile] = File(..., description="Audio files to be processed"),
+    session_factory: sessionmaker = Depends(get_session_factory),
+    user: Principal = Depends(get_current_user),
+) -> StreamingResponse:
+    """Accept several audio files and process them concurrently.
+
+    Streams one ``DictationBatchResult`` JSON line per file as it finishes,
+    in completion order; ``index`` is the file's position in the upload. A
+    bad file fails on its own line without affecting the rest.
+    """
+    if len(audio) > settings.DICTATION_BATCH_MAX_FILES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Unsupported file type. Allowed: {', '.join([t.split('/')[-1] for t in allowed_content_types])}",
+            detail=f"Too many files. Maximum is {settings.DICTATION_BATCH_MAX_FILES}",
         )
 
-    # Validate file size (10MB max)
-    max_size = 10 * 1024 * 1024  # 10MB
-    content = await audio.read()
-    if len(content) > max_size:
+    # The body is sent after the endpoint returns, when FastAPI has already
+    # closed the request's files and session, so the stream owns its own
+    uploads = [detach_upload(upload) for upload in audio]
+    loaders = [partial(_read_audio, upload) for upload in uploads]
+
+    async def stream():
+        try:
+            async with session_factory() as session:
+                audio_service = AudioService(session)
+                results = await audio_service.process_batch(loaders, user.id)
+                try:
+                    async for index, outcome in results:
+                        yield _batch_result(index, uploads[index], outcome)
+                finally:
+                    await results.aclose()
+        finally:
+            for upload in uploads:
+                await upload.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+def _upload_status(info: UploadInfo) -> ResumableUploadStatus:
+    return ResumableUploadStatus(
+        upload_id=info.upload_id,
+        filename=info.filename,
+        content_type=info.content_type,
+        size=info.size,
+        offset=info.offset,
+        expires_at=info.expires_at,
+    )
+
+
+async def _get_upload(upload_id: uuid.UUID, user_id: int) -> UploadInfo:
+    try:
+        return await asyncio.to_thread(upload_store.get, upload_id, user_id)
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+
+
+def _parse_content_range(header: str, size: int) -> Tuple[int, int]:
+    match = _CONTENT_RANGE.fullmatch(header.strip())
+    if match is None:
         raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail="File too large. Maximum size is 10MB",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Content-Range must look like 'bytes <start>-<end>/<size>'",
         )
+    start, end, total = match.groups()
+    if total != "*" and int(total) != size:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Content-Range size does not match the upload's {size} bytes",
+        )
+    return int(start), int(end)
+
+
+@router.post(
+    "/uploads",
+    response_model=ResumableUploadStatus,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_upload(
+    upload: ResumableUploadCreate,
+    response: Response,
+    user: Principal = Depends(get_current_user),
+) -> ResumableUploadStatus:
+    """Start a resumable upload for a recording of a known size.
+
+    Send the bytes with ``PUT /dictations/uploads/{upload_id}`` and a
+    ``Content-Range`` header, in one piece or many, then finalize.
+    """
+    _check_content_type(upload.content_type)
+    if upload.size > MAX_AUDIO_BYTES:
+        raise _file_too_large()
+
+    try:
+        info = await asyncio.to_thread(
+            upload_store.create,
+            user.id,
+            upload.filename,
+            upload.content_type,
+            upload.size,
+        )
+    except UploadLimitError as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e)
+        )
+    response.headers["Location"] = f"{router.prefix}/uploads/{info.upload_id}"
+    return _upload_status(info)
+
+
+@router.get("/uploads/{upload_id}", response_model=ResumableUploadStatus)
+async def get_upload(
+    upload_id: uuid.UUID,
+    user: Principal = Depends(get_current_user),
+) -> ResumableUploadStatus:
+    """Report how much of an upload has arrived; resume from ``offset``."""
+
+    return _upload_status(await _get_upload(upload_id, user.id))
+
+
+@router.put("/uploads/{upload_id}", response_model=ResumableUploadStatus)
+async def put_upload_range(
+    upload_id: uuid.UUID,
+    request: Request,
+    content_range: str = Header(..., description="bytes <start>-<end>/<size>"),
+    user: Principal = Depends(get_current_user),
+) -> ResumableUploadStatus:
+    """Store one byte range of an upload, streamed straight to disk.
+
+    Ranges may arrive in any order and be resent; the response's ``offset``
+    is where the contiguous data received so far ends.
+    """
+    info = await _get_upload(upload_id, user.id)
+    start, end = _parse_content_range(content_range, info.size)
+    if not start <= end < info.size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail=f"Range must lie within 0-{info.size - 1}",
+        )
+
+    try:
+        info = await upload_store.write_range(info, start, end, request.stream())
+    except UploadRangeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return _upload_status(info)
+
+
+@router.post(
+    "/uploads/{upload_id}/finalize",
+    response_model=DictationsCreateResponse,
+    status_code=status.HTTP_201_CREATED,
+)
+async def finalize_upload(
+    upload_id: uuid.UUID,
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+) -> DictationsCreateResponse:
+    """Assemble a complete upload and process it like ``POST /dictations/``.
 
+    Once its dictation is saved the upload's bytes are deleted, and
+    finalizing again returns the same dictation; a concurrent finalize gets
+    409. An upload that turns out not to be valid audio is deleted straight
+    away; if processing fails it is kept, so finalizing can be retried
+    without uploading again.
+    """
     try:
-        audio_service = AudioService(session)
-        return await audio_service.process_audio(content, user.id)
-    except Exception as e:
-        logger.error(f"Error processing dictation: {str(e)}")
+        async with upload_store.finalizing(upload_id, user.id) as claimed:
+            info, finalized = claimed
+            if finalized is not None:
+                return DictationsCreateResponse.model_validate(finalized)
+            dictation = await _finalize(info, session, user.id)
+            await asyncio.to_thread(
+                upload_store.save_result, upload_id, dictation.model_dump(mode="json")
+            )
+            return dictation
+    except UploadNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except UploadBusyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+async def _finalize(
+    info: UploadInfo, session: AsyncSession, user_id: int
+) -> DictationsCreateResponse:
+    with ledger_writer.track("dictation", user_id):
+        try:
+            audio = await asyncio.to_thread(upload_store.assemble, info)
+        except UploadIncompleteError:
+            received = f"{info.offset} of {info.size}"
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Upload incomplete: {received} bytes received",
+            )
+
+        try:
+            probe = await _probe_audio(audio)
+        except HTTPException:
+            audio.close()
+            await asyncio.to_thread(upload_store.discard, info.upload_id)
+            raise
+
+        try:
+            audio_service = AudioService(session)
+            return await audio_service.process_audio(audio, user_id, probe)
+        except Exception as e:
+            logger.error("Error processing dictation: %s", e)
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Failed to process the audio file",
+            )
+        finally:
+            audio.close()
+
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT)
+async def delete_upload(
+    upload_id: uuid.UUID,
+    user: Principal = Depends(get_current_user),
+) -> None:
+    """Abandon an upload and delete what was received."""
+
+    await _get_upload(upload_id, user.id)
+    await asyncio.to_thread(upload_store.discard, upload_id)
+
+
+@router.get("/", response_model=DictationsPage, response_model_exclude_unset=True)
+async def list_dictations(
+    limit: int = Query(20, ge=1, le=100, description="Page size"),
+    cursor: str | None = Query(None, description="Cursor from a previous page"),
+    fields: str | None = Query(
+        None,
+        description=f"Comma-separated fields to return. Allowed: {', '.join(LIST_FIELDS)}",
+    ),
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+) -> DictationsPage:
+    """List the user's dictations, newest first, with keyset pagination."""
+
+    selected_fields = LIST_FIELDS
+    if fields:
+        selected_fields = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = set(selected_fields) - set(LIST_FIELDS)
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Unknown fields: {', '.join(sorted(unknown))}",
+            )
+
+    try:
+        repository = DictationsRepository(session)
+        return await repository.list_page(user.id, limit, cursor, selected_fields)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/search", response_model=DictationSearchPage)
+async def search_dictations(
+    q: str = Query(..., min_length=1, max_length=256, description="Search terms"),
+    limit: int = Query(20, ge=1, le=100, description="Page size"),
+    offset: int = Query(0, ge=0, le=1000, description="Matches to skip"),
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+) -> DictationSearchPage:
+    """Search the user's dictations and formatted notes, best matches first."""
+
+    repository = DictationSearchRepository(session)
+    return await repository.search(user.id, q, limit, offset)
+
+
+@router.get("/similar", response_model=List[DictationSimilarHit])
+async def similar_dictations(
+    dictation_id: int | None = Query(None, description="Find notes like this one"),
+    q: str | None = Query(None, max_length=20000, description="Or like this text"),
+    k: int = Query(5, ge=1, le=50, description="Number of notes to return"),
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+) -> List[DictationSimilarHit]:
+    """Find the user's past notes most similar to a dictation or free text."""
+
+    if (dictation_id is None) == (q is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Provide exactly one of dictation_id or q",
+        )
+
+    service = SimilarDictationsService(session)
+    hits = await service.find_similar(user.id, k, dictation_id=dictation_id, text=q)
+    if hits is None:
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to process the audio file",
+            status_code=status.HTTP_404_NOT_FOUND, detail="Dictation not found"
         )
+    return hits
+
+
+@router.get("/ledger", response_model=List[LedgerSummaryRow])
+async def ledger_summary(
+    group_by: Literal["operation", "model", "prompt_version", "day"] = Query(
+        "operation", description="Aggregate entries sharing this value"
+    ),
+    days: int = Query(30, ge=1, le=365, description="Look back this many days"),
+    session: AsyncSession = Depends(get_session),
+    user: Principal = Depends(get_current_user),
+) -> List[LedgerSummaryRow]:
+    """Latency and token usage of the user's recent operations, aggregated."""
+
+    since = utcnow() - timedelta(days=days)
+    repository = LedgerRepository(session)
+    return await repository.summarize(user.id, since, group_by)
 
 
 @router.post("/preference_extract", response_model=UserPreferencesResponse)
 async def preference_extract(
     original_text: str,
     edited_text: str,
+    idempotency_key: str | None = IDEMPOTENCY_KEY,
     session: AsyncSession = Depends(get_session),
-    user: UserModel = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> UserPreferencesResponse:
-    """Extract user preferences from text edits."""
+    """Extract user preferences from text edits.
+
+    With an ``Idempotency-Key``, resending the same edit returns the first
+    request's result instead of extracting and storing it again.
+    """
 
     user_edits = UserEditsInput(
         user_id=user.id,
@@ -72,13 +610,21 @@ async def preference_extract(
     )
 
     preferences_service = PreferencesService(session)
-    return await preferences_service.extract_preferences(user_edits)
+    return await _idempotent(
+        session,
+        user.id,
+        "dictations.preference_extract",
+        idempotency_key,
+        request_hash(original_text, edited_text),
+        partial(preferences_service.extract_preferences, user_edits),
+        status.HTTP_200_OK,
+    )
 
 
 @router.get("/preferences", response_model=List[UserPreferencesResponse])
 async def get_user_preferences(
     session: AsyncSession = Depends(get_session),
-    user: UserModel = Depends(get_current_user),
+    user: Principal = Depends(get_current_user),
 ) -> List[UserPreferencesResponse]:
     """Get all user preferences."""
 
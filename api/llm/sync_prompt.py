@@ -12,7 +12,6 @@ from langsmith.utils import LangSmithConflictError
 
 from api.config import settings
 
-
 PROMPT_PATH = "api/llm/prompts/"
 
 
@@ -46,17 +45,16 @@ def local_prompt_reader(prompt_name: str):
         return f.read()
 
 
-TEMPLATES = [
-    {
-        "prompt_name": "format-transcript",
-        "prompt_template": local_prompt_reader("format-transcript"),
-    },
-    {
-        "prompt_name": "create-memory",
-        "prompt_template": local_prompt_reader("create-memory"),
-    },
-]
+PROMPT_NAMES = ["format-transcript", "create-memory"]
+
+
+def load_templates() -> List[dict]:
+    # Read when syncing, not when the module is imported
+    return [
+        {"prompt_name": name, "prompt_template": local_prompt_reader(name)}
+        for name in PROMPT_NAMES
+    ]
 
 
 if __name__ == "__main__":
-    main(TEMPLATES)
+    main(load_templates())
@@ -1,9 +1,27 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from api.config import settings
-from api.utils.logging import get_logger, setup_logging
+from api.database import engine, warm_pool
+from api.services.ledger_service import ledger_writer
+from api.services.llm_service import LLMService, preload_clients
+from api.utils.db_metrics import db_metrics
+from api.utils.lifecycle import lifecycle
+from api.utils.logging import RequestIdMiddleware, get_logger, setup_logging
+from api.utils.loop_monitor import loop_monitor
+from api.utils.profiler import continuous_profiler
+from api.utils.security import password_hasher
+from api.admin import router as admin_router
 from api.auth import router as auth_router
-from api.dictations import router as dictations_router
+from api.dictations import REQUEST_BODY_LIMITS, router as dictations_router
+from api.utils.compression import CompressionMiddleware
+from api.utils.metrics import CONTENT_TYPE, HTTPMetricsMiddleware, default_registry
+from api.utils.timing import ServerTimingMiddleware
+from api.utils.tracing import TracingMiddleware, tracer
+from api.utils.uploads import RequestSizeLimitMiddleware
 
 # Set up logging configuration
 setup_logging()
@@ -11,14 +29,80 @@ setup_logging()
 # Set up logger for this module
 logger = get_logger(__name__)
 
+
+async def warm_up() -> None:
+    """Open pooled database connections, build the LLM clients, pull prompts.
+
+    Failures are logged, not raised: the worker still serves, and pays for
+    whatever did not warm up on its first requests.
+    """
+
+    async def warm_llm() -> None:
+        await asyncio.to_thread(preload_clients)
+        await LLMService().load_prompts()
+
+    steps = {
+        "database pool": warm_pool(engine, settings.DB_POOL_SIZE),
+        "LLM clients and prompts": warm_llm(),
+    }
+    results = await asyncio.gather(
+        *(
+            asyncio.wait_for(step, settings.WARMUP_TIMEOUT_SECONDS)
+            for step in steps.values()
+        ),
+        return_exceptions=True,
+    )
+    for name, result in zip(steps, results):
+        if isinstance(result, Exception):
+            logger.warning("Warmup of %s failed: %r", name, result)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ledger_writer.start()
+    tracer.start()
+    if settings.PROFILER_CONTINUOUS:
+        continuous_profiler.start()
+    if settings.LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    lifecycle.watch_signals(delay=settings.WEB_DRAIN_DELAY_SECONDS)
+    # The server accepts no connections until this returns
+    if settings.WARMUP_ENABLED:
+        await warm_up()
+    lifecycle.mark_ready()
+    yield
+    await loop_monitor.stop()
+    await ledger_writer.stop()
+    await tracer.stop()
+    if settings.PROFILER_CONTINUOUS:
+        await asyncio.to_thread(continuous_profiler.stop)
+    password_hasher.shutdown()
+
+
 app = FastAPI(
     title=settings.PROJECT_NAME,
     debug=settings.DEBUG,
+    lifespan=lifespan,
 )
 
+app.add_middleware(RequestSizeLimitMiddleware, limits=REQUEST_BODY_LIMITS)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.COMPRESSION_GZIP_LEVEL,
+    brotli_quality=settings.COMPRESSION_BROTLI_QUALITY,
+)
+app.add_middleware(TracingMiddleware)
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(RequestIdMiddleware)
+# Outermost, so latency includes compression and size checks
+app.add_middleware(HTTPMetricsMiddleware)
+
 # Include routers
 app.include_router(auth_router)
 app.include_router(dictations_router)
+app.include_router(admin_router)
 
 
 @app.get("/health")
@@ -26,6 +110,47 @@ async def health_check():
     return {"status": "ok"}
 
 
+@app.get("/health/ready")
+async def readiness():
+    """200 once warmed up; 503 while starting or draining, for load balancers."""
+    state = lifecycle.state
+    return JSONResponse({"status": state}, status_code=200 if state == "ready" else 503)
+
+
+@app.get("/health/db")
+async def database_health():
+    """Connection pool state and query latency, for sizing pools per replica."""
+    pool = engine.sync_engine.pool
+    return {
+        "pool": {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+            "idle": pool.checkedin(),
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+        },
+        **db_metrics.snapshot(),
+    }
+
+
+@app.get("/health/auth")
+async def auth_health():
+    """Password hashing executor queue depth and timing."""
+    return {
+        "rounds": password_hasher.rounds,
+        "executor": password_hasher.kind,
+        "workers": password_hasher.workers,
+        "max_pending": password_hasher.max_pending,
+        **password_hasher.metrics.snapshot(),
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """This worker's metrics in the Prometheus text format."""
+    return PlainTextResponse(default_registry.render(), media_type=CONTENT_TYPE)
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
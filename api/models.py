@@ -1,8 +1,23 @@
-from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import (
+    DDL,
+    Column,
+    Integer,
+    String,
+    Text,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    JSON,
+    LargeBinary,
+    PrimaryKeyConstraint,
+    Uuid,
+    event,
+)
 from sqlalchemy.orm import relationship
 
 from api.database import Base
+from api.utils.clock import utcnow
 
 
 class UserModel(Base):
@@ -23,18 +38,20 @@ class DictationsModel(Base):
     """Dictation model for database"""
 
     __tablename__ = "dictations"
+    __table_args__ = (
+        Index("ix_dictations_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     text = Column(Text, nullable=False)
     formatted_text = Column(Text, nullable=False)
-    created_at = Column(
-        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
-    )
+    audio_duration = Column(Float, nullable=True)  # seconds, from the upload probe
+    created_at = Column(DateTime, default=utcnow, nullable=False)
     updated_at = Column(
         DateTime,
-        default=lambda: datetime.now(timezone.utc),
-        onupdate=lambda: datetime.now(timezone.utc),
+        default=utcnow,
+        onupdate=utcnow,
         nullable=False,
     )
 
@@ -44,6 +61,67 @@ class DictationsModel(Base):
         return f"<Dictation(id={self.id}, user_id={self.user_id})>"
 
 
+# Full-text search over dictations. Postgres keeps a weighted tsvector as a
+# generated column with a GIN index (mirrors the Alembic migration); SQLite,
+# used by the test harness, uses an external-content FTS5 table kept in sync
+# by triggers.
+_dictations_ddl = {
+    "postgresql": [
+        """
+        ALTER TABLE dictations ADD COLUMN IF NOT EXISTS search_vector tsvector
+        GENERATED ALWAYS AS (
+            setweight(to_tsvector('english', coalesce(formatted_text, '')), 'A')
+            || setweight(to_tsvector('english', coalesce(text, '')), 'B')
+        ) STORED
+        """,
+        "CREATE INDEX IF NOT EXISTS ix_dictations_search_vector "
+        "ON dictations USING GIN (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS dictations_fts USING fts5("
+        "text, formatted_text, content='dictations', content_rowid='id', "
+        "tokenize='porter unicode61')",
+        """
+        CREATE TRIGGER IF NOT EXISTS dictations_fts_ai AFTER INSERT ON dictations
+        BEGIN
+            INSERT INTO dictations_fts(rowid, text, formatted_text)
+            VALUES (new.id, new.text, new.formatted_text);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS dictations_fts_ad AFTER DELETE ON dictations
+        BEGIN
+            INSERT INTO dictations_fts(dictations_fts, rowid, text, formatted_text)
+            VALUES ('delete', old.id, old.text, old.formatted_text);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS dictations_fts_au AFTER UPDATE ON dictations
+        BEGIN
+            INSERT INTO dictations_fts(dictations_fts, rowid, text, formatted_text)
+            VALUES ('delete', old.id, old.text, old.formatted_text);
+            INSERT INTO dictations_fts(rowid, text, formatted_text)
+            VALUES (new.id, new.text, new.formatted_text);
+        END
+        """,
+    ],
+}
+
+for _dialect, _statements in _dictations_ddl.items():
+    for _statement in _statements:
+        event.listen(
+            DictationsModel.__table__,
+            "after_create",
+            DDL(_statement).execute_if(dialect=_dialect),
+        )
+
+event.listen(
+    DictationsModel.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS dictations_fts").execute_if(dialect="sqlite"),
+)
+
+
 class UserEditsModel(Base):
     """UserEdits model for database"""
 
@@ -53,13 +131,11 @@ class UserEditsModel(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     original_text = Column(Text, nullable=False)
     edited_text = Column(Text, nullable=False)
-    created_at = Column(
-        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
-    )
+    created_at = Column(DateTime, default=utcnow, nullable=False)
     updated_at = Column(
         DateTime,
-        default=lambda: datetime.now(timezone.utc),
-        onupdate=lambda: datetime.now(timezone.utc),
+        default=utcnow,
+        onupdate=utcnow,
         nullable=False,
     )
 
@@ -83,13 +159,11 @@ class UserPreferencesModel(Base):
         Integer, ForeignKey("user_edits.id"), nullable=False, index=True
     )
     rules = Column(Text, nullable=False)
-    created_at = Column(
-        DateTime, default=lambda: datetime.now(timezone.utc), nullable=False
-    )
+    created_at = Column(DateTime, default=utcnow, nullable=False)
     updated_at = Column(
         DateTime,
-        default=lambda: datetime.now(timezone.utc),
-        onupdate=lambda: datetime.now(timezone.utc),
+        default=utcnow,
+        onupdate=utcnow,
         nullable=False,
     )
 
@@ -98,3 +172,103 @@ class UserPreferencesModel(Base):
 
     def __repr__(self):
         return f"<UserPreference(id={self.id}, user_id={self.user_id})>"
+
+
+class UserRuleBlockModel(Base):
+    """Precompiled, newline-joined preference rules for a user"""
+
+    __tablename__ = "user_rule_blocks"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    rule_block = Column(Text, nullable=False, default="")
+    rule_count = Column(Integer, nullable=False, default=0)
+    updated_at = Column(
+        DateTime,
+        default=utcnow,
+        onupdate=utcnow,
+        nullable=False,
+    )
+
+    def __repr__(self):
+        return f"<UserRuleBlock(user_id={self.user_id}, rule_count={self.rule_count})>"
+
+
+class RefreshTokenModel(Base):
+    """Refresh token, stored as a SHA-256 digest.
+
+    Tokens issued by rotating one another share a ``family_id``; presenting a
+    token that was already rotated revokes the whole family.
+    """
+
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    family_id = Column(Uuid, nullable=False, index=True)
+    token_hash = Column(LargeBinary(32), nullable=False, unique=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<RefreshToken(id={self.id}, user_id={self.user_id})>"
+
+
+class OperationLedgerModel(Base):
+    """Latency and token usage of one dictation or preference extraction.
+
+    Append-only and written in batches off the request path. ``dictation_id``
+    is not a foreign key, so history survives the dictation being deleted.
+    """
+
+    __tablename__ = "operation_ledger"
+    __table_args__ = (
+        Index("ix_operation_ledger_user_id_created_at", "user_id", "created_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    operation = Column(String(32), nullable=False)
+    status = Column(String(16), nullable=False)
+    dictation_id = Column(Integer, nullable=True)
+    total_ms = Column(Float, nullable=False)
+    stages = Column(JSON, nullable=False)  # stage name -> milliseconds
+    audio_bytes = Column(Integer, nullable=True)
+    audio_duration = Column(Float, nullable=True)  # seconds
+    model = Column(String(64), nullable=True)
+    prompt_version = Column(String(128), nullable=True)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    cached_tokens = Column(Integer, nullable=False, default=0)
+    created_at = Column(
+        DateTime,
+        default=utcnow,
+        nullable=False,
+        index=True,
+    )
+
+    def __repr__(self):
+        return f"<OperationLedger(id={self.id}, operation={self.operation})>"
+
+
+class IdempotencyKeyModel(Base):
+    """A client's Idempotency-Key and the response it was answered with.
+
+    ``response`` is empty while the first request is running; until then
+    ``expires_at`` is a short lease, so a claim left by a crashed worker
+    lapses. ``request_hash`` tells a retry from a different request reusing
+    the key.
+    """
+
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (PrimaryKeyConstraint("user_id", "endpoint", "key"),)
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    endpoint = Column(String(64), nullable=False)
+    key = Column(String(255), nullable=False)
+    request_hash = Column(LargeBinary(32), nullable=False)
+    response = Column(JSON, nullable=True)
+    created_at = Column(DateTime, default=utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey(user_id={self.user_id}, key={self.key})>"
@@ -0,0 +1,131 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import insert, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.models import DictationsModel
+from api.schemas import (
+    DictationsCreate,
+    DictationsCreateResponse,
+    DictationsListItem,
+    DictationsPage,
+)
+
+# Columns a client may request through sparse field selection
+LIST_FIELDS = ("id", "user_id", "text", "formatted_text", "created_at", "updated_at")
+
+# Columns every page query needs to build the next cursor
+_CURSOR_FIELDS = ("created_at", "id")
+
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded."""
+
+
+def encode_cursor(created_at: datetime, dictation_id: int) -> str:
+    """Encode a keyset position as an opaque, URL-safe cursor."""
+    raw = f"{created_at.isoformat()}|{dictation_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by ``encode_cursor``."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, dictation_id = base64.urlsafe_b64decode(padded).decode().split("|")
+        return datetime.fromisoformat(created_at), int(dictation_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError) as e:
+        raise InvalidCursorError("Invalid pagination cursor") from e
+
+
+class DictationsRepository:
+    """Access to a user's dictation history.
+
+    Pages are ordered newest first on ``(created_at, id)`` and walked with a
+    keyset cursor, so every page is a bounded range scan on the
+    ``(user_id, created_at, id)`` index regardless of how deep the client is.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create(self, dictation: DictationsCreate) -> DictationsCreateResponse:
+        """Insert a dictation in one ``INSERT ... RETURNING``; the caller commits."""
+        stmt = (
+            insert(DictationsModel)
+            .values(**dictation.model_dump())
+            .returning(
+                DictationsModel.id,
+                DictationsModel.user_id,
+                DictationsModel.text,
+                DictationsModel.formatted_text,
+                DictationsModel.audio_duration,
+            )
+        )
+        result = await self.session.execute(stmt)
+        return DictationsCreateResponse.model_validate(result.one())
+
+    async def list_page(
+        self,
+        user_id: int,
+        limit: int,
+        cursor: str | None = None,
+        fields: Iterable[str] = LIST_FIELDS,
+    ) -> DictationsPage:
+        """Get one page of the user's dictations, newest first."""
+        fields = list(dict.fromkeys(["id", *fields]))
+        selected = list(dict.fromkeys([*fields, *_CURSOR_FIELDS]))
+        columns = [getattr(DictationsModel, name) for name in selected]
+
+        stmt = (
+            select(*columns)
+            .where(DictationsModel.user_id == user_id)
+            .order_by(DictationsModel.created_at.desc(), DictationsModel.id.desc())
+            .limit(limit + 1)
+        )
+        if cursor:
+            created_at, dictation_id = decode_cursor(cursor)
+            stmt = stmt.where(
+                tuple_(DictationsModel.created_at, DictationsModel.id)
+                < tuple_(created_at, dictation_id)
+            )
+
+        result = await self.session.execute(stmt)
+        rows = result.mappings().all()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+        items: List[DictationsListItem] = [
+            DictationsListItem.model_validate({name: row[name] for name in fields})
+            for row in rows
+        ]
+        return DictationsPage(items=items, next_cursor=next_cursor)
+
+    async def get_formatted_text(self, user_id: int, dictation_id: int) -> str | None:
+        """Get one of the user's formatted notes, or None if it is not theirs."""
+        stmt = select(DictationsModel.formatted_text).where(
+            DictationsModel.id == dictation_id, DictationsModel.user_id == user_id
+        )
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
+
+    async def get_many(
+        self, user_id: int, dictation_ids: List[int], fields: Iterable[str]
+    ) -> Dict[int, DictationsListItem]:
+        """Get the user's dictations by id, keyed by id."""
+        fields = list(dict.fromkeys(["id", *fields]))
+        columns = [getattr(DictationsModel, name) for name in fields]
+        stmt = select(*columns).where(
+            DictationsModel.user_id == user_id, DictationsModel.id.in_(dictation_ids)
+        )
+        result = await self.session.execute(stmt)
+        return {
+            row["id"]: DictationsListItem.model_validate(dict(row))
+            for row in result.mappings()
+        }
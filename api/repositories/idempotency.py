@@ -0,0 +1,96 @@
+from datetime import timedelta
+from typing import Any, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.database import dialect_insert
+from api.models import IdempotencyKeyModel
+from api.utils.clock import utcnow
+
+
+class IdempotencyRepository:
+    """Claims Idempotency-Keys and stores the responses they got.
+
+    Callers own the transaction and must commit after each call; a claim
+    only keeps other workers out once it is committed.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def claim(
+        self,
+        user_id: int,
+        endpoint: str,
+        key: str,
+        request_hash: bytes,
+        lease: timedelta,
+    ) -> Optional[IdempotencyKeyModel]:
+        """Take a key for a new request.
+
+        Returns None when the key is now this request's, or the existing
+        record when another request holds it or has already answered it.
+        """
+        now = utcnow()
+
+        # Keep the table small, and let a lapsed claim be taken over. Rows
+        # read by an earlier poll stay in the session; there is no need to
+        # find and expire them in Python as well
+        await self.session.execute(
+            delete(IdempotencyKeyModel)
+            .where(
+                IdempotencyKeyModel.user_id == user_id,
+                IdempotencyKeyModel.expires_at < now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+        stmt = dialect_insert(self.session, IdempotencyKeyModel).values(
+            user_id=user_id,
+            endpoint=endpoint,
+            key=key,
+            request_hash=request_hash,
+            created_at=now,
+            expires_at=now + lease,
+        )
+        result = await self.session.execute(
+            stmt.on_conflict_do_nothing().returning(IdempotencyKeyModel.key)
+        )
+        if result.scalar_one_or_none() is not None:
+            return None
+
+        return await self.session.scalar(
+            select(IdempotencyKeyModel)
+            .where(
+                IdempotencyKeyModel.user_id == user_id,
+                IdempotencyKeyModel.endpoint == endpoint,
+                IdempotencyKeyModel.key == key,
+            )
+            .execution_options(populate_existing=True)
+        )
+
+    async def complete(
+        self, user_id: int, endpoint: str, key: str, response: Any, ttl: timedelta
+    ) -> None:
+        """Store the response that later requests with the key will get."""
+        await self.session.execute(
+            update(IdempotencyKeyModel)
+            .where(
+                IdempotencyKeyModel.user_id == user_id,
+                IdempotencyKeyModel.endpoint == endpoint,
+                IdempotencyKeyModel.key == key,
+            )
+            .values(response=response, expires_at=utcnow() + ttl)
+        )
+
+    async def release(self, user_id: int, endpoint: str, key: str) -> None:
+        """Drop an unanswered claim so a retry runs the request again."""
+        await self.session.execute(
+            delete(IdempotencyKeyModel).where(
+                IdempotencyKeyModel.user_id == user_id,
+                IdempotencyKeyModel.endpoint == endpoint,
+                IdempotencyKeyModel.key == key,
+                IdempotencyKeyModel.response.is_(None),
+            )
+        )
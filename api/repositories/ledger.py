@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import case, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.models import OperationLedgerModel
+from api.schemas import LedgerSummaryRow
+
+# Stages averaged in summaries; the ledger stores whichever ran
+LEDGER_STAGES = (
+    "upload_read",
+    "probe",
+    "transcribe",
+    "preference_fetch",
+    "format",
+    "extract",
+    "db_commit",
+    "index",
+)
+
+_GROUP_COLUMNS = {
+    "operation": OperationLedgerModel.operation,
+    "model": OperationLedgerModel.model,
+    "prompt_version": OperationLedgerModel.prompt_version,
+    "day": func.date(OperationLedgerModel.created_at),
+}
+LEDGER_GROUPS = tuple(_GROUP_COLUMNS)
+
+
+class LedgerRepository:
+    """Aggregate queries over the operation ledger."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def summarize(
+        self, user_id: int, since: datetime, group_by: str
+    ) -> List[LedgerSummaryRow]:
+        """Latency, audio and token totals per group since ``since``.
+
+        Stage means cover only the entries that ran that stage.
+        """
+        ledger = OperationLedgerModel
+        key = _GROUP_COLUMNS[group_by].label("key")
+        stage_columns = [
+            func.avg(ledger.stages[stage].as_float()).label(stage)
+            for stage in LEDGER_STAGES
+        ]
+        stmt = (
+            select(
+                key,
+                func.count().label("operations"),
+                func.sum(case((ledger.status == "error", 1), else_=0)).label("errors"),
+                func.avg(ledger.total_ms).label("mean_ms"),
+                func.max(ledger.total_ms).label("max_ms"),
+                func.coalesce(func.sum(ledger.audio_bytes), 0).label("audio_bytes"),
+                func.coalesce(func.sum(ledger.audio_duration), 0.0).label(
+                    "audio_seconds"
+                ),
+                func.sum(ledger.prompt_tokens).label("prompt_tokens"),
+                func.sum(ledger.completion_tokens).label("completion_tokens"),
+                func.sum(ledger.cached_tokens).label("cached_tokens"),
+                *stage_columns,
+            )
+            .where(ledger.user_id == user_id, ledger.created_at >= since)
+            .group_by(key)
+            .order_by(key)
+        )
+        result = await self.session.execute(stmt)
+
+        return [
+            LedgerSummaryRow(
+                key=None if row.key is None else str(row.key),
+                operations=row.operations,
+                errors=row.errors,
+                mean_ms=round(row.mean_ms, 3),
+                max_ms=round(row.max_ms, 3),
+                stage_mean_ms={
+                    stage: round(getattr(row, stage), 3)
+                    for stage in LEDGER_STAGES
+                    if getattr(row, stage) is not None
+                },
+                audio_bytes=row.audio_bytes,
+                audio_seconds=round(row.audio_seconds, 3),
+                prompt_tokens=row.prompt_tokens,
+                completion_tokens=row.completion_tokens,
+                cached_tokens=row.cached_tokens,
+            )
+            for row in result
+        ]
@@ -0,0 +1,119 @@
+from typing import List
+
+from sqlalchemy import case, func, insert, literal, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.database import dialect_insert
+from api.models import UserPreferencesModel, UserRuleBlockModel
+from api.schemas import UserPreferencesCreate, UserPreferencesResponse
+from api.utils.clock import utcnow
+
+RULE_SEPARATOR = "\n"
+
+
+class PreferencesRepository:
+    """Narrow, column-only access to user preferences.
+
+    Alongside the individual rules, each user has a precompiled rule block
+    (all rules joined in insertion order) kept in ``user_rule_blocks`` and
+    refreshed on every write, so prompt building is a single primary-key read.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def list_rules(self, user_id: int) -> List[str]:
+        """Get the user's non-empty rules in insertion order."""
+        stmt = (
+            select(UserPreferencesModel.rules)
+            .where(UserPreferencesModel.user_id == user_id)
+            .order_by(UserPreferencesModel.id)
+        )
+        result = await self.session.execute(stmt)
+        return [rules for rules in result.scalars() if rules]
+
+    async def list_preferences(self, user_id: int) -> List[UserPreferencesResponse]:
+        """Get the user's preferences without hydrating ORM objects."""
+        stmt = (
+            select(
+                UserPreferencesModel.id,
+                UserPreferencesModel.user_id,
+                UserPreferencesModel.user_edits_id,
+                UserPreferencesModel.rules,
+            )
+            .where(UserPreferencesModel.user_id == user_id)
+            .order_by(UserPreferencesModel.id)
+        )
+        result = await self.session.execute(stmt)
+        return [UserPreferencesResponse.model_validate(row) for row in result]
+
+    async def get_rule_block(self, user_id: int) -> str:
+        """Get the user's precompiled rule block.
+
+        Users whose preferences predate the rule block table get it built
+        from their rules on first read.
+        """
+        stmt = select(UserRuleBlockModel.rule_block).where(
+            UserRuleBlockModel.user_id == user_id
+        )
+        result = await self.session.execute(stmt)
+        rule_block = result.scalar_one_or_none()
+        if rule_block is not None:
+            return rule_block
+
+        rules = await self.list_rules(user_id)
+        return RULE_SEPARATOR.join(rules)
+
+    async def add_preference(
+        self, preference_data: UserPreferencesCreate, rule_block: str
+    ) -> int:
+        """Add a preference, append it to the rule block and return its id.
+
+        ``rule_block`` is the block as read earlier in the request; it is only
+        used if the user has no stored block yet; otherwise the rule is
+        appended to the stored block in the database, so concurrent writes
+        cannot drop each other's rules. Two statements, no reads; the caller
+        owns the transaction and nothing is committed here.
+        """
+        result = await self.session.execute(
+            insert(UserPreferencesModel)
+            .values(**preference_data.model_dump())
+            .returning(UserPreferencesModel.id)
+        )
+        preference_id = result.scalar_one()
+
+        rule = preference_data.rules or ""
+        if rule:
+            await self._append_rule(preference_data.user_id, rule, rule_block)
+        return preference_id
+
+    async def _append_rule(self, user_id: int, rule: str, rule_block: str) -> None:
+        """Upsert the user's rule block with one more rule."""
+        now = utcnow()
+        rule_count = (
+            select(func.count())
+            .where(
+                UserPreferencesModel.user_id == user_id,
+                UserPreferencesModel.rules.is_not(None),
+                UserPreferencesModel.rules != "",
+            )
+            .scalar_subquery()
+        )
+        stmt = dialect_insert(self.session, UserRuleBlockModel).values(
+            user_id=user_id,
+            rule_block=RULE_SEPARATOR.join(filter(None, [rule_block, rule])),
+            rule_count=rule_count,
+            updated_at=now,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserRuleBlockModel.user_id],
+            set_={
+                "rule_block": case(
+                    (UserRuleBlockModel.rule_block == "", literal(rule)),
+                    else_=UserRuleBlockModel.rule_block + RULE_SEPARATOR + rule,
+                ),
+                "rule_count": UserRuleBlockModel.rule_count + 1,
+                "updated_at": now,
+            },
+        )
+        await self.session.execute(stmt)
@@ -0,0 +1,115 @@
+import hashlib
+import secrets
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.models import RefreshTokenModel
+from api.utils.clock import utcnow
+
+
+class InvalidRefreshTokenError(ValueError):
+    """Raised when a refresh token is unknown, expired, revoked or reused."""
+
+
+def hash_refresh_token(token: str) -> bytes:
+    """Digest stored in place of the token.
+
+    Tokens are 256 random bits, so a plain SHA-256 is enough; a slow password
+    hash would put bcrypt back on the refresh path.
+    """
+    return hashlib.sha256(token.encode()).digest()
+
+
+class RefreshTokenRepository:
+    """Issues, rotates and revokes refresh tokens.
+
+    Callers own the transaction and must commit after each call.
+    """
+
+    def __init__(self, session: AsyncSession, lifetime: timedelta):
+        self.session = session
+        self.lifetime = lifetime
+
+    async def issue(self, user_id: int, family_id: Optional[uuid.UUID] = None) -> str:
+        """Create a token for a user, starting a new family unless given one."""
+        now = utcnow()
+
+        # Keep the table small: expired tokens can never be used or reused
+        await self.session.execute(
+            delete(RefreshTokenModel).where(
+                RefreshTokenModel.user_id == user_id,
+                RefreshTokenModel.expires_at < now,
+            )
+        )
+
+        token = secrets.token_urlsafe(32)
+        self.session.add(
+            RefreshTokenModel(
+                user_id=user_id,
+                family_id=family_id or uuid.uuid4(),
+                token_hash=hash_refresh_token(token),
+                expires_at=now + self.lifetime,
+            )
+        )
+        await self.session.flush()
+        return token
+
+    async def rotate(self, token: str) -> Tuple[int, str]:
+        """Spend a token and issue its successor; return the user id and token.
+
+        The token is revoked with a single conditional UPDATE, so two
+        concurrent refreshes with the same token cannot both succeed.
+        """
+        now = utcnow()
+        token_hash = hash_refresh_token(token)
+
+        result = await self.session.execute(
+            update(RefreshTokenModel)
+            .where(
+                RefreshTokenModel.token_hash == token_hash,
+                RefreshTokenModel.revoked_at.is_(None),
+                RefreshTokenModel.expires_at > now,
+            )
+            .values(revoked_at=now)
+            .returning(RefreshTokenModel.user_id, RefreshTokenModel.family_id)
+        )
+        row = result.one_or_none()
+
+        if row is None:
+            # A rotated token coming back means it leaked; cut off the family
+            family_id = await self.session.scalar(
+                select(RefreshTokenModel.family_id).where(
+                    RefreshTokenModel.token_hash == token_hash,
+                    RefreshTokenModel.revoked_at.is_not(None),
+                )
+            )
+            if family_id is not None:
+                await self._revoke_family(family_id, now)
+            raise InvalidRefreshTokenError("Invalid refresh token")
+
+        user_id, family_id = row
+        return user_id, await self.issue(user_id, family_id)
+
+    async def revoke(self, token: str) -> None:
+        """Revoke a token and every token rotated from the same login."""
+        family_id = await self.session.scalar(
+            select(RefreshTokenModel.family_id).where(
+                RefreshTokenModel.token_hash == hash_refresh_token(token)
+            )
+        )
+        if family_id is not None:
+            await self._revoke_family(family_id, utcnow())
+
+    async def _revoke_family(self, family_id: uuid.UUID, now: datetime) -> None:
+        await self.session.execute(
+            update(RefreshTokenModel)
+            .where(
+                RefreshTokenModel.family_id == family_id,
+                RefreshTokenModel.revoked_at.is_(None),
+            )
+            .values(revoked_at=now)
+        )
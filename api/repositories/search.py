@@ -0,0 +1,102 @@
+import re
+from typing import List
+
+from sqlalchemy import DateTime, Float, Integer, Text, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.schemas import DictationSearchHit, DictationSearchPage
+
+HIGHLIGHT_START = "<mark>"
+HIGHLIGHT_STOP = "</mark>"
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Matches come from either column, so the headline is taken from both, the
+# formatted text first, as FTS5's snippet() takes it from whichever matched
+_POSTGRES_SEARCH = text(f"""
+    WITH query AS (SELECT websearch_to_tsquery('english', :query) AS q),
+    page AS (
+        SELECT d.id, d.created_at, d.formatted_text, d.text,
+               ts_rank_cd(d.search_vector, query.q) AS rank
+        FROM dictations d, query
+        WHERE d.user_id = :user_id AND d.search_vector @@ query.q
+        ORDER BY rank DESC, d.id DESC
+        LIMIT :limit OFFSET :offset
+    )
+    SELECT page.id, page.created_at, page.rank,
+           ts_headline(
+               'english', concat_ws(chr(10), page.formatted_text, page.text),
+               query.q,
+               'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_STOP}, '
+               'MaxFragments=2, MinWords=5, MaxWords=20'
+           ) AS snippet
+    FROM page, query
+    ORDER BY page.rank DESC, page.id DESC
+    """).columns(id=Integer, created_at=DateTime, rank=Float, snippet=Text)
+
+# bm25() is lower-is-better; negate it so both dialects rank descending.
+# Column weights favour formatted_text, matching the Postgres 'A' weight.
+_SQLITE_SEARCH = text(f"""
+    SELECT d.id, d.created_at,
+           -bm25(dictations_fts, 1.0, 2.0) AS rank,
+           snippet(dictations_fts, -1, '{HIGHLIGHT_START}', '{HIGHLIGHT_STOP}',
+                   '…', 20) AS snippet
+    FROM dictations_fts
+    JOIN dictations d ON d.id = dictations_fts.rowid
+    WHERE dictations_fts MATCH :query AND d.user_id = :user_id
+    ORDER BY rank DESC, d.id DESC
+    LIMIT :limit OFFSET :offset
+    """).columns(id=Integer, created_at=DateTime, rank=Float, snippet=Text)
+
+
+def to_fts5_query(query: str) -> str:
+    """Turn free text into an FTS5 query matching every word.
+
+    Each word is quoted so user input can never be parsed as FTS5 syntax.
+    """
+    return " ".join(f'"{word}"' for word in _WORD.findall(query))
+
+
+class DictationSearchRepository:
+    """Ranked full-text search over a user's dictations.
+
+    Search results are ordered by relevance rather than time, so they are
+    paged by offset; clients rarely go more than a few pages deep.
+    """
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def search(
+        self, user_id: int, query: str, limit: int, offset: int = 0
+    ) -> DictationSearchPage:
+        """Get one page of matching dictations with highlighted snippets."""
+        dialect = self.session.get_bind().dialect.name
+        if dialect == "postgresql":
+            stmt, search_query = _POSTGRES_SEARCH, query
+        else:
+            stmt, search_query = _SQLITE_SEARCH, to_fts5_query(query)
+
+        if not search_query.strip():
+            return DictationSearchPage(items=[])
+
+        result = await self.session.execute(
+            stmt,
+            {
+                "query": search_query,
+                "user_id": user_id,
+                "limit": limit + 1,
+                "offset": offset,
+            },
+        )
+        rows = result.mappings().all()
+
+        next_offset = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_offset = offset + limit
+
+        items: List[DictationSearchHit] = [
+            DictationSearchHit.model_validate(dict(row)) for row in rows
+        ]
+        return DictationSearchPage(items=items, next_offset=next_offset)
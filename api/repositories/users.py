@@ -0,0 +1,29 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.database import dialect_insert
+from api.models import UserModel
+from api.schemas import UserResponse
+
+
+class UsersRepository:
+    """Write access to user accounts."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    async def create(self, email: str, hashed_password: str) -> UserResponse | None:
+        """Insert a user; None if the email is already registered.
+
+        One ``INSERT ... ON CONFLICT DO NOTHING RETURNING`` replaces the
+        select-then-insert, and cannot race another registration into a
+        unique violation. The caller commits.
+        """
+        stmt = (
+            dialect_insert(self.session, UserModel)
+            .values(email=email, hashed_password=hashed_password)
+            .on_conflict_do_nothing(index_elements=[UserModel.email])
+            .returning(UserModel.id, UserModel.email)
+        )
+        result = await self.session.execute(stmt)
+        row = result.one_or_none()
+        return UserResponse.model_validate(row) if row else None
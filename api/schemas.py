@@ -1,4 +1,8 @@
-from pydantic import BaseModel, ConfigDict, EmailStr
+import uuid
+from datetime import datetime
+from typing import Literal
+
+from pydantic import BaseModel, ConfigDict, EmailStr, Field
 
 
 class UserBase(BaseModel):
@@ -25,6 +29,14 @@ class Token(BaseModel):
 
     access_token: str
     token_type: str = "bearer"
+    expires_in: int | None = None  # seconds until the access token expires
+    refresh_token: str | None = None
+
+
+class RefreshTokenRequest(BaseModel):
+    """Refresh token schema, for refreshing or revoking a session."""
+
+    refresh_token: str
 
 
 class LoginData(BaseModel):
@@ -52,6 +64,8 @@ class DictationsBase(BaseModel):
 class DictationsCreate(DictationsBase):
     """Schema for creating a new dictation."""
 
+    audio_duration: float | None = None  # seconds
+
 
 class DictationFormatInput(BaseModel):
     """Schema for formatting dictation with preferences."""
@@ -65,6 +79,98 @@ class DictationsCreateResponse(DictationsBase):
 
     model_config = ConfigDict(from_attributes=True)
     id: int
+    audio_duration: float | None = None  # seconds
+
+
+class DictationsListItem(BaseModel):
+    """Schema for a dictation in a history page.
+
+    Only ``id`` is always present; other fields are omitted unless selected.
+    """
+
+    id: int
+    user_id: int | None = None
+    text: str | None = None
+    formatted_text: str | None = None
+    created_at: datetime | None = None
+    updated_at: datetime | None = None
+
+
+class DictationsPage(BaseModel):
+    """Schema for a keyset-paginated page of dictations."""
+
+    items: list[DictationsListItem]
+    next_cursor: str | None = None
+
+
+class DictationSearchHit(BaseModel):
+    """Schema for a ranked full-text search match."""
+
+    id: int
+    created_at: datetime
+    rank: float
+    snippet: str
+
+
+class DictationSearchPage(BaseModel):
+    """Schema for a page of full-text search matches."""
+
+    items: list[DictationSearchHit]
+    next_offset: int | None = None
+
+
+class DictationSimilarHit(BaseModel):
+    """Schema for a past note similar to the query."""
+
+    id: int
+    score: float
+    created_at: datetime
+    formatted_text: str
+
+
+class DictationBatchResult(BaseModel):
+    """Schema for one file's outcome in a batch upload, streamed as NDJSON."""
+
+    index: int
+    filename: str | None = None
+    status: Literal["created", "failed"]
+    dictation: DictationsCreateResponse | None = None
+    detail: str | None = None
+
+
+class LedgerSummaryRow(BaseModel):
+    """Schema for aggregated ledger entries sharing one group key."""
+
+    key: str | None
+    operations: int
+    errors: int
+    mean_ms: float
+    max_ms: float
+    stage_mean_ms: dict[str, float]
+    audio_bytes: int
+    audio_seconds: float
+    prompt_tokens: int
+    completion_tokens: int
+    cached_tokens: int
+
+
+class ResumableUploadCreate(BaseModel):
+    """Schema for starting a resumable upload."""
+
+    filename: str = Field(..., max_length=255)
+    content_type: str
+    size: int = Field(..., gt=0)  # bytes
+
+
+class ResumableUploadStatus(BaseModel):
+    """Schema for a resumable upload's progress."""
+
+    upload_id: uuid.UUID
+    filename: str
+    content_type: str
+    size: int
+    offset: int  # bytes stored contiguously from the start; resume here
+    expires_at: datetime
 
 
 class UserEditsInput(BaseModel):
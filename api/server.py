@@ -0,0 +1,64 @@
+"""
+Production entrypoint: several uvicorn workers sharing one socket.
+
+    uv run python -m api.server
+
+Workers run on uvloop with the httptools parser when those are installed
+(both come with ``uvicorn[standard]``). Each one warms its database pool,
+LLM clients and prompts in the app's lifespan before it accepts
+connections. The supervisor replaces workers that die.
+
+On SIGTERM every worker reports ``draining`` on ``/health/ready``, keeps
+serving for ``WEB_DRAIN_DELAY_SECONDS`` so load balancers can move traffic
+away, then stops accepting connections and gives in-flight requests,
+dictations included, up to ``WEB_GRACEFUL_TIMEOUT`` seconds to finish.
+"""
+
+import importlib.util
+import os
+from typing import Any, Dict
+
+import uvicorn
+
+from api.config import settings
+from api.utils.logging import get_logger, setup_logging
+
+logger = get_logger(__name__)
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def server_options() -> Dict[str, Any]:
+    """Keyword arguments for ``uvicorn.run``, from settings."""
+    return {
+        "host": settings.WEB_HOST,
+        "port": settings.WEB_PORT,
+        "workers": settings.WEB_WORKERS or os.cpu_count() or 1,
+        "loop": "uvloop" if _installed("uvloop") else "asyncio",
+        "http": "httptools" if _installed("httptools") else "h11",
+        "lifespan": "on",
+        "timeout_graceful_shutdown": settings.WEB_GRACEFUL_TIMEOUT,
+        "access_log": settings.WEB_ACCESS_LOG,
+        # Leave uvicorn's loggers to the app's queued JSON logging
+        "log_config": None,
+    }
+
+
+def main() -> None:
+    setup_logging()
+    options = server_options()
+    logger.info(
+        "Starting %d workers on %s:%d (loop=%s, http=%s)",
+        options["workers"],
+        options["host"],
+        options["port"],
+        options["loop"],
+        options["http"],
+    )
+    uvicorn.run("api.main:app", **options)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,15 @@
-from typing import List
+import asyncio
+import os
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, List, Tuple
+from weakref import WeakValueDictionary
+
+from sqlalchemy import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
 
-from api.models import DictationsModel, UserEditsModel, UserPreferencesModel
+from api.config import settings
+from api.models import UserEditsModel
+from api.repositories.dictations import DictationsRepository
+from api.repositories.preferences import PreferencesRepository
 from api.schemas import (
     DictationsCreate,
     DictationsCreateResponse,
@@ -10,11 +17,44 @@ from api.schemas import (
     UserPreferencesCreate,
     UserPreferencesResponse,
 )
+from api.services.embedding_service import embedding_index
+from api.services.ledger_service import ledger_writer
 from api.services.llm_service import LLMService
+from api.utils.audio_probe import AudioProbe
+from api.utils.ledger import update_entry
 from api.utils.logging import get_logger
+from api.utils.metrics import (
+    dictation_audio_seconds,
+    dictations_in_flight,
+    track_stage,
+)
 
 logger = get_logger(__name__)
 
+# Returns a file's audio and what its probe found, or raises if it is invalid
+AudioLoader = Callable[[], Awaitable[Tuple[BinaryIO, AudioProbe]]]
+
+# Per-user cap on batch files in flight, shared by all of a user's requests
+# in this worker; entries disappear once no batch holds them
+_user_batch_slots: WeakValueDictionary[int, asyncio.Semaphore] = WeakValueDictionary()
+
+
+def _audio_size(audio_data: bytes | BinaryIO) -> int:
+    if isinstance(audio_data, bytes):
+        return len(audio_data)
+    position = audio_data.tell()
+    size = audio_data.seek(0, os.SEEK_END)
+    audio_data.seek(position)
+    return size
+
+
+def _batch_slots(user_id: int) -> asyncio.Semaphore:
+    slots = _user_batch_slots.get(user_id)
+    if slots is None:
+        slots = asyncio.Semaphore(settings.DICTATION_BATCH_CONCURRENCY)
+        _user_batch_slots[user_id] = slots
+    return slots
+
 
 class AudioService:
     """Service for handling audio transcription and formatting."""
@@ -22,48 +62,166 @@ class AudioService:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.llm_service = LLMService()
+        self.preferences = PreferencesRepository(session)
+        self.dictations = DictationsRepository(session)
 
     async def process_audio(
-        self, audio_data: bytes, user_id: int
+        self,
+        audio_data: bytes | BinaryIO,
+        user_id: int,
+        probe: AudioProbe | None = None,
     ) -> DictationsCreateResponse:
-        """Process audio file: transcribe and format."""
+        """Process audio file: transcribe and format.
+
+        Stages and token usage go into the caller's ledger entry, opened
+        before the upload was read so the entry covers that too.
+        """
         try:
-            # Transcribe audio
-            transcript = await self.llm_service.transcribe_audio(audio_data)
+            update_entry(
+                audio_bytes=_audio_size(audio_data),
+                audio_duration=probe.duration if probe else None,
+            )
+            with dictations_in_flight.track_in_progress():
+                # Transcribe audio
+                with track_stage("transcribe"):
+                    transcript = await self.llm_service.transcribe_audio(audio_data)
+                if probe:
+                    dictation_audio_seconds.inc(probe.duration)
 
-            # Get user preferences
-            preferences = await self._get_user_preferences(user_id)
+                # Get user preferences
+                with track_stage("preference_fetch"):
+                    rule_block = await self.preferences.get_rule_block(user_id)
 
-            # Format transcript
-            formatted_text = await self.llm_service.format_transcript(
-                transcript, preferences
-            )
+                # Format transcript
+                with track_stage("format"):
+                    formatted_text = await self.llm_service.format_transcript(
+                        transcript, rule_block
+                    )
 
-            # Save to database
-            dictation_data = DictationsCreate(
-                text=transcript, formatted_text=formatted_text, user_id=user_id
-            )
+                # Save to database
+                dictation_data = DictationsCreate(
+                    text=transcript,
+                    formatted_text=formatted_text,
+                    user_id=user_id,
+                    audio_duration=probe.duration if probe else None,
+                )
+
+                with track_stage("db_commit"):
+                    dictation = await self.dictations.create(dictation_data)
+                    await self.session.commit()
+                update_entry(dictation_id=dictation.id)
 
-            dictation = DictationsModel(**dictation_data.model_dump())
-            self.session.add(dictation)
-            await self.session.commit()
-            await self.session.refresh(dictation)
+                await self._index_dictation(dictation)
 
-            return DictationsCreateResponse.model_validate(dictation)
+            return dictation
 
         except Exception as e:
             await self.session.rollback()
-            logger.error(f"Audio processing failed: {str(e)}")
+            logger.error("Audio processing failed: %s", e)
             raise
 
-    async def _get_user_preferences(self, user_id: int) -> List[str]:
-        """Get user preferences as list of strings."""
-        stmt = select(UserPreferencesModel).where(
-            UserPreferencesModel.user_id == user_id
-        )
-        result = await self.session.execute(stmt)
-        preferences = result.scalars().all()
-        return [pref.rules for pref in preferences if pref.rules]
+    async def process_batch(
+        self, uploads: List[AudioLoader], user_id: int
+    ) -> AsyncIterator[Tuple[int, DictationsCreateResponse | Exception]]:
+        """Process several audio files concurrently.
+
+        ``uploads`` are loaders returning each file's audio and probe (or
+        raising if it is invalid); they run under the user's batch slots, so only a few
+        files are read and sent to the LLM at once. The rule block is fetched
+        once, up front, for the whole batch. Returns an iterator yielding
+        ``(index, dictation)``, or ``(index, exception)`` for a failed file,
+        as each file finishes.
+        """
+        with track_stage("preference_fetch"):
+            rule_block = await self.preferences.get_rule_block(user_id)
+        return self._run_batch(uploads, user_id, rule_block)
+
+    async def _run_batch(
+        self,
+        uploads: List[AudioLoader],
+        user_id: int,
+        rule_block: str,
+    ) -> AsyncIterator[Tuple[int, DictationsCreateResponse | Exception]]:
+        # The session cannot run concurrent statements, so the short
+        # database writes take turns while LLM calls overlap
+        slots = _batch_slots(user_id)
+        write_lock = asyncio.Lock()
+
+        async def process(index: int, load: AudioLoader):
+            try:
+                # Recorded from the file's turn for a slot, so the ledger
+                # shows its upload read and probe stages too
+                with ledger_writer.track("dictation", user_id) as entry:
+                    async with slots:
+                        audio_data, probe = await load()
+                        entry.audio_bytes = _audio_size(audio_data)
+                        entry.audio_duration = probe.duration
+                        with dictations_in_flight.track_in_progress():
+                            with track_stage("transcribe"):
+                                transcript = await self.llm_service.transcribe_audio(
+                                    audio_data
+                                )
+                            dictation_audio_seconds.inc(probe.duration)
+                            with track_stage("format"):
+                                formatted_text = (
+                                    await self.llm_service.format_transcript(
+                                        transcript, rule_block
+                                    )
+                                )
+
+                    dictation_data = DictationsCreate(
+                        text=transcript,
+                        formatted_text=formatted_text,
+                        user_id=user_id,
+                        audio_duration=probe.duration,
+                    )
+                    async with write_lock:
+                        with track_stage("db_commit"):
+                            try:
+                                dictation = await self.dictations.create(dictation_data)
+                                await self.session.commit()
+                            except Exception:
+                                await self.session.rollback()
+                                raise
+                    entry.dictation_id = dictation.id
+
+                    await self._index_dictation(dictation)
+                return index, dictation
+
+            except Exception as e:
+                logger.error("Batch file %d failed: %s", index, e)
+                return index, e
+
+        tasks = [
+            asyncio.create_task(process(index, load))
+            for index, load in enumerate(uploads)
+        ]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            # The client went away; stop the remaining work, and wait for it
+            # so none of it is still using the session when it is closed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _index_dictation(self, dictation: DictationsCreateResponse) -> None:
+        """Add a saved dictation to the similar-note index.
+
+        Indexing is best effort: the dictation is already committed, and a
+        missing vector only hides it from similarity search until a rebuild.
+        """
+        try:
+            with track_stage("index"):
+                await asyncio.to_thread(
+                    embedding_index.add,
+                    dictation.user_id,
+                    dictation.id,
+                    dictation.formatted_text,
+                )
+        except Exception as e:
+            logger.error("Indexing dictation %s failed: %s", dictation.id, e)
 
 
 class PreferencesService:
@@ -72,69 +230,63 @@ class PreferencesService:
     def __init__(self, session: AsyncSession):
         self.session = session
         self.llm_service = LLMService()
+        self.preferences = PreferencesRepository(session)
 
     async def extract_preferences(
         self, user_edits_input: UserEditsInput
     ) -> UserPreferencesResponse:
         """Extract and save user preferences from edits."""
         try:
-            # Save user edit
-            user_edit = UserEditsModel(**user_edits_input.model_dump())
-            self.session.add(user_edit)
-            await self.session.flush()  # Get ID without committing
-
-            # Get existing preferences
-            existing_preferences = await self._get_user_preferences_list(
-                user_edits_input.user_id
-            )
+            with ledger_writer.track("preference_extract", user_edits_input.user_id):
+                # Get existing preferences
+                with track_stage("preference_fetch"):
+                    existing_preferences = await self.preferences.get_rule_block(
+                        user_edits_input.user_id
+                    )
 
-            # Extract new preference
-            new_preference = await self.llm_service.extract_user_preferences(
-                user_edits_input.original_text,
-                user_edits_input.edited_text,
-                existing_preferences,
-            )
+                # Extract new preference
+                with track_stage("extract"):
+                    new_preference = await self.llm_service.extract_user_preferences(
+                        user_edits_input.original_text,
+                        user_edits_input.edited_text,
+                        existing_preferences,
+                    )
+
+                with track_stage("db_commit"):
+                    # Save user edit
+                    result = await self.session.execute(
+                        insert(UserEditsModel)
+                        .values(**user_edits_input.model_dump())
+                        .returning(UserEditsModel.id)
+                    )
+                    user_edit_id = result.scalar_one()
+
+                    # Save preference if extracted
+                    preference_id = None
+                    if new_preference:
+                        preference_data = UserPreferencesCreate(
+                            user_id=user_edits_input.user_id,
+                            user_edits_id=user_edit_id,
+                            rules=new_preference,
+                        )
+                        preference_id = await self.preferences.add_preference(
+                            preference_data, existing_preferences
+                        )
 
-            # Save preference if extracted
-            preference_model = None
-            if new_preference:
-                preference_data = UserPreferencesCreate(
+                    await self.session.commit()
+
+                return UserPreferencesResponse(
+                    id=preference_id,
                     user_id=user_edits_input.user_id,
-                    user_edits_id=user_edit.id,
                     rules=new_preference,
+                    user_edits_id=user_edit_id,
                 )
-                preference_model = UserPreferencesModel(**preference_data.model_dump())
-                self.session.add(preference_model)
-                await self.session.flush()
-
-            await self.session.commit()
-
-            return UserPreferencesResponse(
-                id=preference_model.id if preference_model else None,
-                user_id=user_edits_input.user_id,
-                rules=new_preference,
-                user_edits_id=user_edit.id,
-            )
 
         except Exception as e:
             await self.session.rollback()
-            logger.error(f"Preference extraction failed: {str(e)}")
+            logger.error("Preference extraction failed: %s", e)
             raise
 
     async def get_user_preferences(self, user_id: int) -> List[UserPreferencesResponse]:
         """Get all user preferences."""
-        stmt = select(UserPreferencesModel).where(
-            UserPreferencesModel.user_id == user_id
-        )
-        result = await self.session.execute(stmt)
-        preferences = result.scalars().all()
-        return [UserPreferencesResponse.model_validate(pref) for pref in preferences]
-
-    async def _get_user_preferences_list(self, user_id: int) -> List[str]:
-        """Get user preferences as list of strings."""
-        stmt = select(UserPreferencesModel).where(
-            UserPreferencesModel.user_id == user_id
-        )
-        result = await self.session.execute(stmt)
-        preferences = result.scalars().all()
-        return [pref.rules for pref in preferences if pref.rules]
+        return await self.preferences.list_preferences(user_id)
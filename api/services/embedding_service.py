@@ -0,0 +1,315 @@
+"""
+Local embeddings for "find similar notes".
+
+Dictations are embedded with signed feature hashing over word unigrams and
+bigrams (no external service, no fitted vocabulary) and appended to a per-user
+index on disk: a contiguous float32 matrix of unit vectors plus a parallel
+int64 array of dictation ids. Queries memory-map the matrix and score every
+note with a single matrix product.
+
+Every worker process writes to the same files, so each user's index is
+guarded by an flock on its own ``.lock`` file: appends and rebuilds hold it
+exclusively, so vectors and ids always land in the same order, and readers
+hold it shared while they map the files. Rebuilds write new files rather
+than truncating, since other workers may still have the old ones mapped.
+
+Rebuild all indexes from the database with:
+
+    PYTHONPATH=. uv run python -m api.services.embedding_service
+"""
+
+import asyncio
+import fcntl
+import os
+import re
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.config import settings
+from api.database import async_session
+from api.models import DictationsModel
+from api.repositories.dictations import DictationsRepository
+from api.schemas import DictationSimilarHit
+from api.utils.cache import TTLCache
+from api.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """Stateless hashing vectorizer producing L2-normalised float32 vectors."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        tokens = _TOKEN.findall(text.lower())
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def embed(self, text: str) -> np.ndarray:
+        """Embed one text."""
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: List[str]) -> np.ndarray:
+        """Embed texts into an ``(len(texts), dim)`` float32 matrix."""
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature in self._features(text):
+                digest = zlib.crc32(feature.encode())
+                # Low bits pick the bucket, one high bit picks the sign so
+                # collisions tend to cancel rather than accumulate
+                sign = 1.0 if digest & 0x80000000 else -1.0
+                matrix[row, digest % self.dim] += sign
+
+        # Sublinear term frequency, then unit length so dot product = cosine
+        np.copysign(np.log1p(np.abs(matrix)), matrix, out=matrix)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+        return matrix
+
+
+class EmbeddingIndex:
+    """Append-only, memory-mapped per-user vector index."""
+
+    def __init__(
+        self,
+        directory: str | Path,
+        dim: int,
+        max_maps: int = 32,
+        map_ttl: float = 300,
+    ):
+        self.directory = Path(directory)
+        self.embedder = HashingEmbedder(dim)
+        # Maps are only reused while the files are the same ones at the same
+        # length, so another worker's writes are picked up. Each one holds
+        # a file descriptor, so only recently searched users keep theirs
+        self._maps: TTLCache[Tuple[Tuple[int, int, int], np.ndarray, np.ndarray]] = (
+            TTLCache(maxsize=max_maps, ttl=map_ttl)
+        )
+
+    @property
+    def dim(self) -> int:
+        return self.embedder.dim
+
+    def _paths(self, user_id: int) -> Tuple[Path, Path]:
+        # Vectors of different sizes are incompatible, so keep them apart
+        base = self.directory / f"d{self.dim}"
+        return base / f"user_{user_id}.f32", base / f"user_{user_id}.ids"
+
+    @contextmanager
+    def _locked(self, user_id: int, shared: bool = False) -> Iterator[None]:
+        """Hold the user's index lock against other threads and workers."""
+        path = self.directory / f"d{self.dim}" / f"user_{user_id}.lock"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # A separate open per caller, so threads exclude each other too
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+
+    def _rows(self, vectors_size: int, ids_size: int) -> int:
+        return min(vectors_size // (self.dim * 4), ids_size // 8)
+
+    def add(self, user_id: int, dictation_id: int, text: str) -> None:
+        """Embed a dictation and append it to the user's index."""
+        self.add_batch(user_id, [dictation_id], [text])
+
+    def add_batch(
+        self, user_id: int, dictation_ids: List[int], texts: List[str]
+    ) -> None:
+        """Embed dictations and append them to the user's index."""
+        vectors = self.embedder.embed_batch(texts)
+        ids = np.asarray(dictation_ids, dtype=np.int64)
+        vectors_path, ids_path = self._paths(user_id)
+
+        with self._locked(user_id):
+            # Vectors first: readers trust the shorter of the two files, so a
+            # crash between writes leaves an unlabelled row that is ignored.
+            # Cut any such row off before appending, or every later id would
+            # be paired with the vector before its own
+            with (
+                open(vectors_path, "ab") as vectors_file,
+                open(ids_path, "ab") as ids_file,
+            ):
+                rows = self._rows(vectors_file.tell(), ids_file.tell())
+                vectors_file.truncate(rows * self.dim * 4)
+                ids_file.truncate(rows * 8)
+                vectors_file.write(vectors.tobytes())
+                vectors_file.flush()
+                ids_file.write(ids.tobytes())
+
+    def rebuild(self, user_id: int, dictation_ids: List[int], texts: List[str]) -> None:
+        """Replace the user's index with these dictations."""
+        vectors = self.embedder.embed_batch(texts)
+        ids = np.asarray(dictation_ids, dtype=np.int64)
+
+        with self._locked(user_id):
+            for path, data in zip(self._paths(user_id), (vectors, ids)):
+                staged = path.with_name(path.name + ".tmp")
+                staged.write_bytes(data.tobytes())
+                os.replace(staged, path)
+
+    def reset(self, user_id: int) -> None:
+        """Delete the user's index."""
+        with self._locked(user_id):
+            for path in self._paths(user_id):
+                path.unlink(missing_ok=True)
+        self._maps.invalidate(user_id)
+
+    def _load(self, user_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Memory-map the user's vectors and ids, reusing maps while unchanged."""
+        vectors_path, ids_path = self._paths(user_id)
+        empty = np.empty((0, self.dim), dtype=np.float32), np.empty(0, np.int64)
+        if not ids_path.exists():
+            return empty
+
+        with self._locked(user_id, shared=True):
+            try:
+                vectors_stat, ids_stat = vectors_path.stat(), ids_path.stat()
+            except FileNotFoundError:
+                return empty
+            rows = self._rows(vectors_stat.st_size, ids_stat.st_size)
+            version = (vectors_stat.st_ino, ids_stat.st_ino, rows)
+            cached = self._maps.get(user_id)
+            if cached and cached[0] == version:
+                return cached[1], cached[2]
+            # Release the outdated maps now rather than when next replaced
+            self._maps.invalidate(user_id)
+            if rows == 0:
+                return empty
+
+            vectors = np.memmap(
+                vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim)
+            )
+            ids = np.memmap(ids_path, dtype=np.int64, mode="r", shape=(rows,))
+        self._maps.set(user_id, (version, vectors, ids))
+        return vectors, ids
+
+    def search(
+        self, user_id: int, queries: np.ndarray, k: int, exclude_id: int | None = None
+    ) -> List[List[Tuple[int, float]]]:
+        """Top-k cosine matches for each row of ``queries``.
+
+        All queries are scored in one ``(notes, dim) @ (dim, queries)`` product.
+        """
+        vectors, ids = self._load(user_id)
+        if len(ids) == 0:
+            return [[] for _ in range(len(queries))]
+
+        scores = vectors @ np.asarray(queries, dtype=np.float32).T
+        if exclude_id is not None:
+            scores[ids == exclude_id] = -np.inf
+
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        results = []
+        for column in range(scores.shape[1]):
+            candidates = top[:, column]
+            ranked = candidates[np.argsort(-scores[candidates, column])]
+            results.append(
+                [
+                    (int(ids[i]), float(scores[i, column]))
+                    for i in ranked
+                    if np.isfinite(scores[i, column])
+                ]
+            )
+        return results
+
+    def similar(
+        self, user_id: int, text: str, k: int, exclude_id: int | None = None
+    ) -> List[Tuple[int, float]]:
+        """Top-k dictations most similar to ``text``."""
+        query = self.embedder.embed(text)[np.newaxis, :]
+        return self.search(user_id, query, k, exclude_id)[0]
+
+
+embedding_index = EmbeddingIndex(
+    settings.EMBEDDING_INDEX_DIR,
+    settings.EMBEDDING_DIM,
+    max_maps=settings.EMBEDDING_MAP_CACHE_SIZE,
+    map_ttl=settings.EMBEDDING_MAP_CACHE_SECONDS,
+)
+
+
+class SimilarDictationsService:
+    """Service for finding a user's past notes similar to a note or text."""
+
+    def __init__(self, session: AsyncSession, index: EmbeddingIndex = embedding_index):
+        self.dictations = DictationsRepository(session)
+        self.index = index
+
+    async def find_similar(
+        self,
+        user_id: int,
+        k: int,
+        dictation_id: int | None = None,
+        text: str | None = None,
+    ) -> List[DictationSimilarHit] | None:
+        """Top-k similar notes; None if ``dictation_id`` is not the user's."""
+        if dictation_id is not None:
+            text = await self.dictations.get_formatted_text(user_id, dictation_id)
+            if text is None:
+                return None
+
+        matches = await asyncio.to_thread(
+            self.index.similar, user_id, text or "", k, dictation_id
+        )
+        if not matches:
+            return []
+
+        rows = await self.dictations.get_many(
+            user_id,
+            [match_id for match_id, _ in matches],
+            ["created_at", "formatted_text"],
+        )
+        return [
+            DictationSimilarHit(
+                id=match_id,
+                score=score,
+                created_at=rows[match_id].created_at,
+                formatted_text=rows[match_id].formatted_text,
+            )
+            for match_id, score in matches
+            if match_id in rows
+        ]
+
+
+async def rebuild_all() -> None:
+    """Rebuild every user's index from the dictations table."""
+
+    def flush(user_id: int, ids: List[int], texts: List[str]) -> None:
+        embedding_index.rebuild(user_id, ids, texts)
+        logger.info("Indexed %d dictations for user %s", len(ids), user_id)
+
+    async with async_session() as session:
+        stmt = select(
+            DictationsModel.user_id, DictationsModel.id, DictationsModel.formatted_text
+        ).order_by(DictationsModel.user_id, DictationsModel.id)
+        result = await session.stream(stmt.execution_options(yield_per=1000))
+
+        # Rows arrive grouped by user, so only one user is held in memory
+        current_user, ids, texts = None, [], []
+        async for user_id, dictation_id, formatted_text in result:
+            if user_id != current_user and current_user is not None:
+                flush(current_user, ids, texts)
+                ids, texts = [], []
+            current_user = user_id
+            ids.append(dictation_id)
+            texts.append(formatted_text)
+
+        if current_user is not None:
+            flush(current_user, ids, texts)
+
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_all())
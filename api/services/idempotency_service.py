@@ -0,0 +1,129 @@
+"""
+Idempotency-Key handling for requests that call the LLM.
+
+A client that times out and sends the same request again, with the same
+``Idempotency-Key`` header, gets the first request's response instead of a
+second transcription, formatting pass and dictation row. The first request
+claims the key in ``idempotency_keys`` before doing any work and stores its
+response there when it succeeds:
+
+- a retry after that is answered from the stored response until it expires
+- a retry while the first request is still running, on any worker, polls
+  the claim and answers as soon as the response is stored, or with a
+  conflict if it takes longer than ``IDEMPOTENCY_WAIT_SECONDS``
+- if the first request fails its claim is dropped, so a retry runs afresh
+- reusing a key for a different request body is refused
+
+Claims are leases: one left behind by a worker that died lapses after
+``IDEMPOTENCY_LEASE_SECONDS`` and the key can be used again.
+"""
+
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, TypeVar
+
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from api.config import settings
+from api.repositories.idempotency import IdempotencyRepository
+from api.utils.logging import get_logger
+from api.utils.metrics import idempotent_replays
+
+logger = get_logger(__name__)
+
+ResponseModel = TypeVar("ResponseModel", bound=BaseModel)
+
+# How often a retry checks whether the request holding its key has finished
+POLL_INTERVAL = 0.5
+
+
+class IdempotencyKeyReusedError(ValueError):
+    """Raised when a key comes back with a different request body."""
+
+
+class IdempotencyKeyInFlightError(Exception):
+    """Raised when the request holding a key is still running after the wait."""
+
+
+@dataclass
+class StoredResponse:
+    """The JSON body a key's first request was answered with."""
+
+    body: Any
+
+
+def request_hash(*parts: str | bytes) -> bytes:
+    """Fingerprint of a request's body, to tell retries from new requests."""
+    digest = hashlib.sha256()
+    for part in parts:
+        data = part.encode() if isinstance(part, str) else part
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.digest()
+
+
+class IdempotencyService:
+    """Runs a request at most once per user, endpoint and Idempotency-Key."""
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+        self.keys = IdempotencyRepository(session)
+        self.ttl = timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS)
+        self.lease = timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)
+
+    async def run(
+        self,
+        user_id: int,
+        endpoint: str,
+        key: str,
+        fingerprint: bytes,
+        operation: Callable[[], Awaitable[ResponseModel]],
+    ) -> ResponseModel | StoredResponse:
+        """Run ``operation`` unless the key already has, or is, running it.
+
+        Returns the operation's result, or the response stored for the key
+        by an earlier request.
+        """
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while True:
+            existing = await self.keys.claim(
+                user_id, endpoint, key, fingerprint, self.lease
+            )
+            await self.session.commit()
+            if existing is None:
+                break
+            if existing.request_hash != fingerprint:
+                raise IdempotencyKeyReusedError(
+                    "Idempotency-Key was already used for a different request"
+                )
+            if existing.response is not None:
+                idempotent_replays.labels(endpoint).inc()
+                return StoredResponse(existing.response)
+            if time.monotonic() >= deadline:
+                raise IdempotencyKeyInFlightError(
+                    "A request with this Idempotency-Key is still being processed"
+                )
+            await asyncio.sleep(POLL_INTERVAL)
+
+        try:
+            result = await operation()
+        except Exception:
+            await self.session.rollback()
+            await self.keys.release(user_id, endpoint, key)
+            await self.session.commit()
+            raise
+
+        try:
+            await self.keys.complete(
+                user_id, endpoint, key, result.model_dump(mode="json"), self.ttl
+            )
+            await self.session.commit()
+        except Exception as e:
+            # The work is done; a retry will find the claim lapsed and redo it
+            await self.session.rollback()
+            logger.warning("Could not store response for Idempotency-Key: %s", e)
+        return result
@@ -0,0 +1,125 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Iterator
+
+from sqlalchemy import insert
+
+from api.config import settings
+from api.database import async_session
+from api.models import OperationLedgerModel
+from api.utils.ledger import DISCARDED, LedgerEntry, use_entry
+from api.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class LedgerWriter:
+    """Buffers ledger entries in memory and inserts them in batches.
+
+    Requests only append to a deque; a background task started with the app
+    writes everything pending in one multi-row INSERT every
+    ``flush_interval`` seconds, or sooner once ``batch_size`` entries are
+    waiting. The ledger is for analysis, not accounting: if the database is
+    unavailable the batch is logged and dropped, and entries beyond
+    ``max_pending`` are discarded rather than growing memory.
+    """
+
+    def __init__(
+        self,
+        session_factory=async_session,
+        batch_size: int = 200,
+        flush_interval: float = 2.0,
+        max_pending: int = 10000,
+        enabled: bool = True,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self.pending: Deque[LedgerEntry] = deque(maxlen=max_pending)
+        self.dropped = 0
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+
+    @contextmanager
+    def track(self, operation: str, user_id: int, **fields) -> Iterator[LedgerEntry]:
+        """Record one operation; stages and token usage inside it are added.
+
+        The entry is queued when the block exits, marked as an error if it
+        raised, unless ``discard_entry()`` was called inside it.
+        """
+        entry = LedgerEntry(operation=operation, user_id=user_id, **fields)
+        start = time.perf_counter()
+        try:
+            with use_entry(entry):
+                yield entry
+        except BaseException:
+            if entry.status != DISCARDED:
+                entry.status = "error"
+            raise
+        finally:
+            entry.total_ms = round((time.perf_counter() - start) * 1000, 3)
+            if entry.status != DISCARDED:
+                self.record(entry)
+
+    def record(self, entry: LedgerEntry) -> None:
+        if not self.enabled:
+            return
+        if len(self.pending) == self.pending.maxlen:
+            self.dropped += 1
+        self.pending.append(entry)
+        if len(self.pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> int:
+        """Insert everything pending; returns the number of rows written."""
+        if not self.pending:
+            return 0
+        batch = list(self.pending)
+        self.pending.clear()
+        try:
+            async with self.session_factory() as session:
+                await session.execute(
+                    insert(OperationLedgerModel), [entry.as_row() for entry in batch]
+                )
+                await session.commit()
+        except Exception as e:
+            logger.error("Dropped %d ledger entries: %s", len(batch), e)
+            return 0
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            # Shielded so stopping mid-insert does not lose the batch
+            await asyncio.shield(self.flush())
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write what is still pending."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+ledger_writer = LedgerWriter(
+    batch_size=settings.LEDGER_BATCH_SIZE,
+    flush_interval=settings.LEDGER_FLUSH_SECONDS,
+    max_pending=settings.LEDGER_MAX_PENDING,
+    enabled=settings.LEDGER_ENABLED,
+)
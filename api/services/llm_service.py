@@ -1,50 +1,140 @@
+import asyncio
+import hashlib
 import json
-import tempfile
-from typing import List
-
-from langsmith import Client as LangSmithClient
-from langsmith.wrappers import wrap_openai
-from openai import AsyncOpenAI
+from functools import cache, cached_property
+from typing import TYPE_CHECKING, Any, BinaryIO
 
 from api.config import settings
+from api.utils.cache import TTLCache
+from api.utils.ledger import record_usage
 from api.utils.logging import get_logger
+from api.utils.metrics import llm_errors, llm_tokens
+from api.utils.tracing import tracer
+
+if TYPE_CHECKING:
+    from langsmith import Client as LangSmithClient
+    from openai import AsyncOpenAI
 
 logger = get_logger(__name__)
 
 
+# openai and langsmith take about a second to import, so they load with the
+# first client rather than with the app; one client of each is shared
+@cache
+def openai_client() -> "AsyncOpenAI":
+    """The OpenAI client, with LangSmith tracing."""
+    from langsmith.wrappers import wrap_openai
+    from openai import AsyncOpenAI
+
+    return wrap_openai(AsyncOpenAI(api_key=settings.OPENAI_API_KEY))
+
+
+@cache
+def langsmith_client() -> "LangSmithClient":
+    from langsmith import Client as LangSmithClient
+
+    return LangSmithClient(api_key=settings.LANGSMITH_API_KEY)
+
+
+def preload_clients() -> None:
+    """Build the clients ahead of the first request; blocking."""
+    try:
+        openai_client()
+        langsmith_client()
+    except Exception as e:
+        # The first request that needs them will try again
+        logger.warning("Could not preload LLM clients: %s", e)
+
+
+# Pulled prompts, so requests do not each fetch them from LangSmith
+prompt_cache: TTLCache[Any] = TTLCache(maxsize=16, ttl=settings.PROMPT_CACHE_SECONDS)
+
+
+def prompt_version(name: str, prompt: Any) -> str:
+    """``name:revision`` of a pulled prompt, for telling revisions apart.
+
+    The revision is the LangSmith commit the prompt was pulled at, or a hash
+    of the prompt itself when it carries none.
+    """
+    metadata = getattr(prompt, "metadata", None)
+    revision = (
+        metadata.get("lc_hub_commit_hash") if isinstance(metadata, dict) else None
+    )
+    if not revision:
+        revision = hashlib.sha256(repr(prompt).encode()).hexdigest()
+    return f"{name}:{revision[:12]}"
+
+
+def _record_usage(response, prompt_version: str) -> None:
+    """Count a chat completion's tokens by model, and in the ledger."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    llm_tokens.labels(response.model, "prompt").inc(usage.prompt_tokens)
+    llm_tokens.labels(response.model, "completion").inc(usage.completion_tokens)
+    tracer.annotate(
+        prompt_tokens=usage.prompt_tokens, completion_tokens=usage.completion_tokens
+    )
+    details = getattr(usage, "prompt_tokens_details", None)
+    record_usage(
+        response.model,
+        usage.prompt_tokens,
+        usage.completion_tokens,
+        cached_tokens=getattr(details, "cached_tokens", None) or 0,
+        prompt_version=prompt_version,
+    )
+
+
 class LLMService:
     """Service for handling LLM operations."""
 
-    def __init__(self):
-        self.openai_client = self._setup_openai_client()
-        self.langsmith_client = LangSmithClient(api_key=settings.LANGSMITH_API_KEY)
+    @cached_property
+    def openai_client(self) -> "AsyncOpenAI":
+        return openai_client()
+
+    @cached_property
+    def langsmith_client(self) -> "LangSmithClient":
+        return langsmith_client()
+
+    async def pull_prompt(self, name: str) -> Any:
+        """A LangSmith prompt, from the cache while it is fresh."""
+        prompt = prompt_cache.get(name)
+        if prompt is None:
+            # A blocking HTTP call in the LangSmith client; keep it off the loop
+            with tracer.span("langsmith.pull_prompt", prompt=name):
+                prompt = await asyncio.to_thread(
+                    self.langsmith_client.pull_prompt, name
+                )
+            prompt_cache.set(name, prompt)
+        return prompt
 
-    def _setup_openai_client(self) -> AsyncOpenAI:
-        """Setup OpenAI client with LangSmith tracing."""
-        client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        return wrap_openai(client)
+    async def load_prompts(self) -> None:
+        """Fetch every prompt the service uses into the cache."""
+        for name in (settings.FORMAT_PROMPT, settings.EXTRACT_RULES_PROMPT):
+            await self.pull_prompt(name)
 
-    async def transcribe_audio(self, audio_data: bytes) -> str:
-        """Transcribe audio using OpenAI Whisper."""
-        try:
-            with tempfile.NamedTemporaryFile(suffix=".mpga", delete=False) as f:
-                f.write(audio_data)
-                temp_filename = f.name
+    async def transcribe_audio(self, audio_data: bytes | BinaryIO) -> str:
+        """Transcribe audio using OpenAI Whisper.
 
-            with open(temp_filename, "rb") as audio_file:
+        A file object is streamed to the API as-is, without another copy.
+        """
+        try:
+            # The extension tells the API how to decode the upload
+            with tracer.span("openai.audio.transcriptions", model="whisper-1"):
                 transcription = await self.openai_client.audio.transcriptions.create(
-                    model="whisper-1", file=audio_file
+                    model="whisper-1", file=("audio.mpga", audio_data)
                 )
 
             return transcription.text
         except Exception as e:
-            logger.error(f"Audio transcription failed: {str(e)}")
+            llm_errors.labels("transcribe").inc()
+            logger.error("Audio transcription failed: %s", e)
             raise
 
-    async def format_transcript(self, transcript: str, preferences: List[str]) -> str:
-        """Format transcript based on user preferences."""
+    async def format_transcript(self, transcript: str, rule_block: str) -> str:
+        """Format transcript based on the user's precompiled rule block."""
         try:
-            system_prompt = self.langsmith_client.pull_prompt(settings.FORMAT_PROMPT)
+            system_prompt = await self.pull_prompt(settings.FORMAT_PROMPT)
 
             system_message = {
                 "role": "system",
@@ -55,31 +145,36 @@ class LLMService:
                 "role": "user",
                 "content": f"""
                 ### USER FORMATTING PREFERENCES
-                {chr(10).join(preferences)}
+                {rule_block}
 
                 ### TRANSCRIPT TO PROCESS
                 {transcript}
                 """,
             }
 
-            response = await self.openai_client.chat.completions.create(
-                model=settings.DEFAULT_LLM_TEXT_MODEL,
-                messages=[system_message, user_message],
-            )
+            with tracer.span(
+                "openai.chat.completions", model=settings.DEFAULT_LLM_TEXT_MODEL
+            ):
+                response = await self.openai_client.chat.completions.create(
+                    model=settings.DEFAULT_LLM_TEXT_MODEL,
+                    messages=[system_message, user_message],
+                )
+                _record_usage(
+                    response, prompt_version(settings.FORMAT_PROMPT, system_prompt)
+                )
 
             return response.choices[0].message.content
         except Exception as e:
-            logger.error(f"Transcript formatting failed: {str(e)}")
+            llm_errors.labels("format").inc()
+            logger.error("Transcript formatting failed: %s", e)
             raise
 
     async def extract_user_preferences(
-        self, original_text: str, edited_text: str, existing_preferences: List[str]
+        self, original_text: str, edited_text: str, existing_preferences: str
     ) -> str | None:
         """Extract user preferences from text edits."""
         try:
-            system_prompt = self.langsmith_client.pull_prompt(
-                settings.EXTRACT_RULES_PROMPT
-            )
+            system_prompt = await self.pull_prompt(settings.EXTRACT_RULES_PROMPT)
 
             system_message = {
                 "role": "system",
@@ -96,23 +191,31 @@ class LLMService:
                 {edited_text}
 
                 ### EXISTING USER PREFERENCES 
-                {chr(10).join(existing_preferences)}
+                {existing_preferences}
                 """,
             }
 
-            response = await self.openai_client.chat.completions.create(
-                model=settings.DEFAULT_LLM_TEXT_MODEL,
-                messages=[system_message, user_message],
-                response_format={"type": "json_object"},
-            )
+            with tracer.span(
+                "openai.chat.completions", model=settings.DEFAULT_LLM_TEXT_MODEL
+            ):
+                response = await self.openai_client.chat.completions.create(
+                    model=settings.DEFAULT_LLM_TEXT_MODEL,
+                    messages=[system_message, user_message],
+                    response_format={"type": "json_object"},
+                )
+                _record_usage(
+                    response,
+                    prompt_version(settings.EXTRACT_RULES_PROMPT, system_prompt),
+                )
 
             rules = json.loads(response.choices[0].message.content)
-            logger.debug(f"Extracted rules: {rules}")
+            logger.debug("Extracted rules: %s", rules)
 
             return (
                 rules.get("memory_to_write") if rules.get("memory_to_write") else None
             )
 
         except Exception as e:
-            logger.error(f"Preference extraction failed: {str(e)}")
+            llm_errors.labels("extract_preferences").inc()
+            logger.error("Preference extraction failed: %s", e)
             return None
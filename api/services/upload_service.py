@@ -0,0 +1,462 @@
+"""
+Resumable uploads for long recordings.
+
+A client declares the recording's size, sends it as byte ranges in any order
+and any number of attempts, and asks for the stored offset to resume after a
+dropped connection. Each upload is a directory on local disk:
+
+    <UPLOAD_DIR>/<upload id>/meta.json
+    <UPLOAD_DIR>/<upload id>/<start offset>.part   one file per received range
+    <UPLOAD_DIR>/<upload id>/result.json           the dictation, once finalized
+
+The offset reported to clients is the end of the contiguous run of bytes
+from zero, so a retry only resends what is missing. Resent bytes are not
+stored twice: only the parts of a range that no earlier range covers are
+kept, so an upload never takes more than its declared size on disk. Once
+every byte is present the ranges are concatenated into one file in the
+kernel (``copy_file_range``), without passing through this process, and the
+result is handed to the normal dictation pipeline.
+
+Workers share the directory, so changes are serialized with ``flock``: one
+lock for the whole store (creating and purging uploads), one per upload for
+its ranges, and one per upload held while it is finalized. Finalizing again
+after success returns the stored dictation rather than creating another.
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Iterator, List, Optional, Tuple
+
+from api.config import settings
+from api.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+_META = "meta.json"
+_PART_SUFFIX = ".part"
+_ASSEMBLED = "assembled"
+_RESULT = "result.json"
+_LOCK = ".lock"
+_FINALIZE_LOCK = ".finalize.lock"
+
+
+class UploadNotFoundError(LookupError):
+    """Raised for an unknown, expired or foreign upload id."""
+
+
+class UploadRangeError(ValueError):
+    """Raised when a byte range does not fit the upload or its body."""
+
+
+class UploadIncompleteError(ValueError):
+    """Raised when finalizing an upload that is still missing bytes."""
+
+
+class UploadLimitError(ValueError):
+    """Raised when a user already has as many open uploads as allowed."""
+
+
+class UploadBusyError(RuntimeError):
+    """Raised when an upload is already being finalized by another request."""
+
+
+def _release_claim(claim: asyncio.Future) -> None:
+    if not claim.cancelled() and claim.exception() is None:
+        os.close(claim.result()[0])
+
+
+@dataclass(frozen=True, slots=True)
+class UploadInfo:
+    """An upload's declared metadata and how much of it has arrived."""
+
+    upload_id: uuid.UUID
+    user_id: int
+    filename: str
+    content_type: str
+    size: int
+    created_at: datetime
+    expires_at: datetime
+    offset: int
+
+
+def _acquire(path: Path, blocking: bool = True) -> int:
+    """Take an exclusive ``flock`` on ``path``; closing the descriptor frees it.
+
+    The lock holds across threads and processes. Raises ``BlockingIOError``
+    straight away if ``blocking`` is false and the lock is taken.
+    """
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+    except BaseException:
+        os.close(fd)
+        raise
+    return fd
+
+
+@contextmanager
+def _locked(path: Path) -> Iterator[None]:
+    fd = _acquire(path)
+    try:
+        yield
+    finally:
+        os.close(fd)
+
+
+def _gaps(
+    parts: List[Tuple[int, int, Path]], start: int, stop: int
+) -> List[Tuple[int, int]]:
+    """The ``[start, stop)`` intervals within a range that no part covers."""
+    gaps = []
+    position = start
+    for part_start, length, _ in parts:
+        if part_start >= stop:
+            break
+        if part_start > position:
+            gaps.append((position, part_start))
+        position = max(position, part_start + length)
+        if position >= stop:
+            break
+    if position < stop:
+        gaps.append((position, stop))
+    return gaps
+
+
+def _copy_range(src: int, dst: int, src_offset: int, dst_offset: int, count: int):
+    """Copy ``count`` bytes between descriptors, in the kernel where possible."""
+    while count:
+        try:
+            copied = os.copy_file_range(src, dst, count, src_offset, dst_offset)
+        except (AttributeError, OSError):
+            # Not Linux, or a filesystem that refuses it: plain positional I/O
+            copied = os.pwrite(
+                dst, os.pread(src, min(count, 1024 * 1024), src_offset), dst_offset
+            )
+        if copied == 0:
+            raise UploadIncompleteError("Upload part is shorter than recorded")
+        src_offset += copied
+        dst_offset += copied
+        count -= copied
+
+
+class ResumableUploadStore:
+    """Upload directories on local disk, owned by one user each.
+
+    A user may have ``max_open`` uploads that are neither finalized nor
+    expired, each stored as at most ``max_parts`` ranges.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        ttl: timedelta,
+        max_open: int = 5,
+        max_parts: int = 256,
+    ):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.max_open = max_open
+        self.max_parts = max_parts
+
+    @contextmanager
+    def _store_locked(self) -> Iterator[None]:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with _locked(self.directory / _LOCK):
+            yield
+
+    def _path(self, upload_id: uuid.UUID) -> Path:
+        return self.directory / upload_id.hex
+
+    def _parts(self, path: Path) -> List[Tuple[int, int, Path]]:
+        """The upload's received ranges as ``(start, length, path)``, by start."""
+        parts = []
+        for entry in os.scandir(path):
+            if entry.name.endswith(_PART_SUFFIX):
+                start = int(entry.name[: -len(_PART_SUFFIX)])
+                parts.append((start, entry.stat().st_size, Path(entry.path)))
+        return sorted(parts)
+
+    @staticmethod
+    def _contiguous(parts: List[Tuple[int, int, Path]]) -> int:
+        offset = 0
+        for start, length, _ in parts:
+            if start > offset:
+                break
+            offset = max(offset, start + length)
+        return offset
+
+    def _open_uploads(self, user_id: int) -> int:
+        count = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_dir() or os.path.exists(os.path.join(entry.path, _RESULT)):
+                continue
+            try:
+                with open(os.path.join(entry.path, _META)) as f:
+                    count += json.load(f)["user_id"] == user_id
+            except (FileNotFoundError, ValueError):
+                continue
+        return count
+
+    def create(
+        self, user_id: int, filename: str, content_type: str, size: int
+    ) -> UploadInfo:
+        """Start an upload, clearing out expired ones first."""
+        self.purge_expired()
+
+        with self._store_locked():
+            if self._open_uploads(user_id) >= self.max_open:
+                raise UploadLimitError(
+                    f"Too many open uploads; finish or delete one of the "
+                    f"{self.max_open} first"
+                )
+
+            upload_id = uuid.uuid4()
+            created_at = datetime.now(timezone.utc)
+            path = self._path(upload_id)
+            path.mkdir(parents=True)
+            meta = {
+                "user_id": user_id,
+                "filename": filename,
+                "content_type": content_type,
+                "size": size,
+                "created_at": created_at.isoformat(),
+            }
+            (path / _META).write_text(json.dumps(meta))
+        return self._info(upload_id, meta, offset=0)
+
+    def _info(self, upload_id: uuid.UUID, meta: dict, offset: int) -> UploadInfo:
+        created_at = datetime.fromisoformat(meta["created_at"])
+        return UploadInfo(
+            upload_id=upload_id,
+            user_id=meta["user_id"],
+            filename=meta["filename"],
+            content_type=meta["content_type"],
+            size=meta["size"],
+            created_at=created_at,
+            expires_at=created_at + self.ttl,
+            offset=offset,
+        )
+
+    def _load(self, upload_id: uuid.UUID, user_id: int) -> dict:
+        """An upload's metadata, if it exists, is the user's and has not expired."""
+        try:
+            meta = json.loads((self._path(upload_id) / _META).read_text())
+        except FileNotFoundError:
+            raise UploadNotFoundError("Upload not found")
+
+        info = self._info(upload_id, meta, offset=0)
+        if info.user_id != user_id:
+            raise UploadNotFoundError("Upload not found")
+        if info.expires_at <= datetime.now(timezone.utc):
+            self.discard(upload_id)
+            raise UploadNotFoundError("Upload not found")
+        return meta
+
+    def get(self, upload_id: uuid.UUID, user_id: int) -> UploadInfo:
+        """Look up one of the user's open uploads and its current offset."""
+        meta = self._load(upload_id, user_id)
+        path = self._path(upload_id)
+        if (path / _RESULT).exists():
+            raise UploadNotFoundError("Upload not found")
+        return self._info(upload_id, meta, self._contiguous(self._parts(path)))
+
+    async def write_range(
+        self, info: UploadInfo, start: int, end: int, body: AsyncIterator[bytes]
+    ) -> UploadInfo:
+        """Store bytes ``start``..``end`` (inclusive) streamed from ``body``.
+
+        The range goes to a temporary file and is only stored once the body
+        has arrived in full, so a dropped request leaves nothing half-written
+        behind. Bytes an earlier range already delivered are dropped.
+        """
+        if not 0 <= start <= end < info.size:
+            raise UploadRangeError(f"Range must lie within 0-{info.size - 1}")
+
+        path = self._path(info.upload_id)
+        expected = end - start + 1
+        fd, temp_name = await asyncio.to_thread(tempfile.mkstemp, dir=path)
+        try:
+            received = 0
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in body:
+                    received += len(chunk)
+                    if received > expected:
+                        raise UploadRangeError("Body is longer than Content-Range")
+                    await asyncio.to_thread(f.write, chunk)
+            if received != expected:
+                raise UploadRangeError("Body is shorter than Content-Range")
+            await asyncio.to_thread(self._store_range, path, Path(temp_name), start)
+        finally:
+            Path(temp_name).unlink(missing_ok=True)
+
+        return await asyncio.to_thread(self.get, info.upload_id, info.user_id)
+
+    def _store_range(self, path: Path, received: Path, start: int) -> None:
+        """Keep the parts of a received range that are not stored yet."""
+        try:
+            lock = _acquire(path / _LOCK)
+        except FileNotFoundError:
+            raise UploadNotFoundError("Upload not found")
+        try:
+            parts = self._parts(path)
+            stop = start + received.stat().st_size
+            gaps = _gaps(parts, start, stop)
+            if len(parts) + len(gaps) > self.max_parts:
+                raise UploadRangeError(
+                    f"Upload is limited to {self.max_parts} ranges; send larger ones"
+                )
+
+            if gaps == [(start, stop)]:
+                os.replace(received, path / f"{start}{_PART_SUFFIX}")
+                return
+            with open(received, "rb") as src:
+                for gap_start, gap_stop in gaps:
+                    fd, temp_name = tempfile.mkstemp(dir=path)
+                    try:
+                        _copy_range(
+                            src.fileno(), fd, gap_start - start, 0, gap_stop - gap_start
+                        )
+                    finally:
+                        os.close(fd)
+                    os.replace(temp_name, path / f"{gap_start}{_PART_SUFFIX}")
+        finally:
+            os.close(lock)
+
+    @asynccontextmanager
+    async def finalizing(
+        self, upload_id: uuid.UUID, user_id: int
+    ) -> AsyncIterator[Tuple[UploadInfo, Optional[Any]]]:
+        """Hold one of the user's uploads while it is finalized.
+
+        Yields the upload and, if an earlier finalize succeeded, the result
+        it saved. Raises ``UploadBusyError`` if another request is
+        finalizing it; the lock is released if the process dies.
+        """
+        claim = asyncio.ensure_future(
+            asyncio.to_thread(self._claim, upload_id, user_id)
+        )
+        try:
+            lock, info, result = await asyncio.shield(claim)
+        except asyncio.CancelledError:
+            # The thread carries on; release the lock once it has it
+            claim.add_done_callback(_release_claim)
+            raise
+        try:
+            yield info, result
+        finally:
+            os.close(lock)
+
+    def _claim(
+        self, upload_id: uuid.UUID, user_id: int
+    ) -> Tuple[int, UploadInfo, Optional[Any]]:
+        """Lock an upload for finalizing and read its state; blocking."""
+        path = self._path(upload_id)
+        try:
+            lock = _acquire(path / _FINALIZE_LOCK, blocking=False)
+        except FileNotFoundError:
+            raise UploadNotFoundError("Upload not found")
+        except BlockingIOError:
+            raise UploadBusyError("Upload is already being finalized")
+        try:
+            meta = self._load(upload_id, user_id)
+            try:
+                result = json.loads((path / _RESULT).read_text())
+            except FileNotFoundError:
+                result = None
+            offset = self._contiguous(self._parts(path))
+        except BaseException:
+            os.close(lock)
+            raise
+        return lock, self._info(upload_id, meta, offset), result
+
+    def assemble(self, info: UploadInfo) -> BinaryIO:
+        """Concatenate the received ranges and open the result for reading.
+
+        Call while holding ``finalizing``. Overlapping ranges are fine; each
+        byte is taken from the first range that covers it.
+        """
+        path = self._path(info.upload_id)
+        with _locked(path / _LOCK):
+            parts = self._parts(path)
+            if self._contiguous(parts) < info.size:
+                raise UploadIncompleteError("Upload is missing bytes")
+
+            fd, temp_name = tempfile.mkstemp(dir=path)
+            try:
+                position = 0
+                for start, length, part in parts:
+                    if start + length <= position:
+                        continue
+                    count = min(start + length, info.size) - position
+                    with open(part, "rb") as src:
+                        _copy_range(src.fileno(), fd, position - start, position, count)
+                    position += count
+                    if position == info.size:
+                        break
+            finally:
+                os.close(fd)
+            os.replace(temp_name, path / _ASSEMBLED)
+
+        return open(path / _ASSEMBLED, "rb")
+
+    def save_result(self, upload_id: uuid.UUID, result: Any) -> None:
+        """Record a finalized upload's result and free its received bytes.
+
+        The result is kept until the upload expires, so finalizing again
+        returns it instead of processing the audio a second time.
+        """
+        path = self._path(upload_id)
+        fd, temp_name = tempfile.mkstemp(dir=path)
+        with os.fdopen(fd, "w") as f:
+            json.dump(result, f)
+        os.replace(temp_name, path / _RESULT)
+
+        with _locked(path / _LOCK):
+            for _, _, part in self._parts(path):
+                part.unlink()
+            (path / _ASSEMBLED).unlink(missing_ok=True)
+
+    def discard(self, upload_id: uuid.UUID) -> None:
+        """Delete an upload and everything received for it."""
+        shutil.rmtree(self._path(upload_id), ignore_errors=True)
+
+    def purge_expired(self) -> int:
+        """Delete uploads older than the TTL; returns how many were removed."""
+        if not self.directory.exists():
+            return 0
+
+        cutoff = time.time() - self.ttl.total_seconds()
+        removed = 0
+        with self._store_locked():
+            for entry in os.scandir(self.directory):
+                if not entry.is_dir():
+                    continue
+                try:
+                    created = os.stat(os.path.join(entry.path, _META)).st_mtime
+                except FileNotFoundError:
+                    # Interrupted before its metadata was written
+                    created = entry.stat().st_mtime
+                if created < cutoff:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                    removed += 1
+        if removed:
+            logger.info("Removed %d expired uploads", removed)
+        return removed
+
+
+upload_store = ResumableUploadStore(
+    settings.UPLOAD_DIR,
+    timedelta(hours=settings.UPLOAD_TTL_HOURS),
+    max_open=settings.UPLOAD_MAX_OPEN_PER_USER,
+    max_parts=settings.UPLOAD_MAX_PARTS,
+)
@@ -1,16 +1,24 @@
+import io
+
+import av
+import numpy as np
 import pytest
 import pytest_asyncio
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Dict
 from httpx import AsyncClient, ASGITransport
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 
 from api.main import app
-from api.database import get_session, Base
+from api.database import get_session, get_session_factory, Base
 from api.models import UserModel
-from api.utils.security import get_password_hash
-
+from api.services.embedding_service import embedding_index
+from api.services.ledger_service import ledger_writer
+from api.services.llm_service import prompt_cache
+from api.services.upload_service import upload_store
+from api.utils.security import get_password_hash, user_exists_cache
+from api.utils.tracing import tracer
 
 # Test database URL (SQLite in memory)
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
@@ -28,6 +36,56 @@ TestSessionLocal = sessionmaker(
 )
 
 
+@pytest.fixture(autouse=True)
+def isolated_embedding_index(tmp_path, monkeypatch):
+    """Keep similar-note index files in a per-test directory."""
+    monkeypatch.setattr(embedding_index, "directory", tmp_path / "embeddings")
+    embedding_index._maps.clear()
+    yield embedding_index
+    embedding_index._maps.clear()
+
+
+@pytest.fixture(autouse=True)
+def isolated_upload_store(tmp_path, monkeypatch):
+    """Keep resumable upload ranges in a per-test directory."""
+    monkeypatch.setattr(upload_store, "directory", tmp_path / "uploads")
+    return upload_store
+
+
+@pytest.fixture(autouse=True)
+def isolated_ledger(monkeypatch):
+    """Write ledger entries to the test database, starting with none pending."""
+    monkeypatch.setattr(ledger_writer, "session_factory", TestSessionLocal)
+    ledger_writer.pending.clear()
+    yield ledger_writer
+    ledger_writer.pending.clear()
+
+
+@pytest.fixture(autouse=True)
+def isolated_tracer(tmp_path, monkeypatch):
+    """Write trace files to a per-test directory, starting with no spans."""
+    monkeypatch.setattr(tracer, "directory", tmp_path / "traces")
+    tracer.finished.clear()
+    yield tracer
+    tracer.finished.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_prompt_cache():
+    """Pull prompts afresh in each test."""
+    prompt_cache.clear()
+    yield
+    prompt_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_user_cache():
+    """Start each test without cached account state."""
+    user_exists_cache.clear()
+    yield
+    user_exists_cache.clear()
+
+
 @pytest_asyncio.fixture(scope="function")
 async def test_db() -> AsyncGenerator[AsyncSession, None]:
     """Create a test database session."""
@@ -52,6 +110,7 @@ async def client(test_db: AsyncSession) -> AsyncGenerator[AsyncClient, None]:
         return test_db
 
     app.dependency_overrides[get_session] = override_get_session
+    app.dependency_overrides[get_session_factory] = lambda: TestSessionLocal
 
     transport = ASGITransport(app=app)
     async with AsyncClient(transport=transport, base_url="http://testserver") as ac:
@@ -118,3 +177,27 @@ def sample_audio_data() -> bytes:
     # Add some dummy audio data
     dummy_data = b"\x00" * 100
     return wav_header + dummy_data
+
+
+@pytest.fixture(scope="session")
+def encoded_audio() -> Dict[str, bytes]:
+    """Half a second of real encoded silence in each supported container."""
+    samples = {}
+    for container_format, codec in (
+        ("wav", "pcm_s16le"),
+        ("mp3", "libmp3lame"),
+        ("mp4", "aac"),
+        ("ogg", "libopus"),
+    ):
+        buffer = io.BytesIO()
+        with av.open(buffer, "w", format=container_format) as output:
+            stream = output.add_stream(codec, rate=16000)
+            stream.layout = "mono"
+            frame = av.AudioFrame.from_ndarray(
+                np.zeros((1, 8000), dtype=np.float32), format="fltp", layout="mono"
+            )
+            frame.sample_rate = 16000
+            for packet in [*stream.encode(frame), *stream.encode(None)]:
+                output.mux(packet)
+        samples[container_format] = buffer.getvalue()
+    return samples
@@ -1,8 +1,17 @@
+import asyncio
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.models import UserModel
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from api.models import RefreshTokenModel, UserModel
+from api.repositories.refresh_tokens import hash_refresh_token
+from api.utils.password_hasher import PasswordHasher, PasswordHasherBusy, crypt_context
+from api.utils.security import create_access_token, password_hasher, user_exists_cache
 
 
 class TestAuthEndpoints:
@@ -137,6 +146,58 @@ class TestTokenValidation:
         assert response.status_code == 401
 
 
+class TestCachedPrincipal:
+    """Test the cached principal used by authenticated endpoints."""
+
+    async def test_account_state_is_cached(
+        self, client: AsyncClient, auth_headers: dict, test_db: AsyncSession
+    ):
+        """Test repeated requests skip the user lookup while cached."""
+        await client.get("/dictations/preferences", headers=auth_headers)
+        user_id = (await client.get("/auth/me", headers=auth_headers)).json()["id"]
+        assert user_exists_cache.get(user_id) is True
+
+        with patch.object(test_db, "execute", wraps=test_db.execute) as mock_execute:
+            await client.get("/dictations/preferences", headers=auth_headers)
+
+        # Only the preference query itself, no user lookup
+        assert mock_execute.call_count == 1
+
+    async def test_token_for_unknown_user(self, client: AsyncClient):
+        """Test a valid token whose user does not exist is rejected."""
+        token = create_access_token(
+            data={"sub": "4242"}, expires_delta=timedelta(minutes=5)
+        )
+
+        response = await client.get(
+            "/dictations/preferences", headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == 401
+        assert user_exists_cache.get(4242) is False
+
+    async def test_register_invalidates_cached_state(self, client: AsyncClient):
+        """Test a newly registered id is not shadowed by a cached miss."""
+        user_exists_cache.set(1, False)
+
+        response = await client.post(
+            "/auth/register",
+            json={"email": "fresh@example.com", "password": "password123"},
+        )
+
+        assert user_exists_cache.get(response.json()["id"]) is None
+
+    async def test_non_numeric_subject(self, client: AsyncClient):
+        """Test a token with a non-numeric subject is rejected."""
+        token = create_access_token(data={"sub": "abc"})
+
+        response = await client.get(
+            "/dictations/preferences", headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == 401
+
+
 class TestPasswordSecurity:
     """Test password hashing and security."""
 
@@ -163,3 +224,196 @@ class TestPasswordSecurity:
         )
 
         assert response.status_code == 401
+
+    async def test_login_rehashes_on_cost_change(
+        self, client: AsyncClient, test_db: AsyncSession, test_user: UserModel
+    ):
+        """Test that a hash made at an old cost is upgraded on login."""
+        old_hash = test_user.hashed_password
+        assert crypt_context(4).needs_update(old_hash)
+
+        with patch.object(password_hasher, "rounds", 4):
+            response = await client.post(
+                "/auth/login",
+                data={"username": test_user.email, "password": "testpassword123"},
+            )
+
+        assert response.status_code == 200
+        await test_db.refresh(test_user)
+        assert test_user.hashed_password != old_hash
+        assert test_user.hashed_password.startswith("$2b$04$")
+        assert not crypt_context(4).needs_update(test_user.hashed_password)
+
+    async def test_login_keeps_current_hash(
+        self, client: AsyncClient, test_db: AsyncSession, test_user: UserModel
+    ):
+        """Test that a hash at the configured cost is left alone."""
+        old_hash = test_user.hashed_password
+
+        response = await client.post(
+            "/auth/login",
+            data={"username": test_user.email, "password": "testpassword123"},
+        )
+
+        assert response.status_code == 200
+        await test_db.refresh(test_user)
+        assert test_user.hashed_password == old_hash
+
+    async def test_hashing_queue_full(self, client: AsyncClient, test_user: UserModel):
+        """Test that logins are shed with 503 once the hashing queue is full."""
+        with patch.object(password_hasher, "max_pending", 0):
+            response = await client.post(
+                "/auth/login",
+                data={"username": test_user.email, "password": "testpassword123"},
+            )
+
+        assert response.status_code == 503
+        assert response.headers["retry-after"] == "1"
+
+
+class TestPasswordHasher:
+    """Test the password hashing executor."""
+
+    async def test_hash_and_verify(self):
+        """Test hashing and verifying off the event loop, with metrics."""
+        hasher = PasswordHasher(rounds=4, workers=2, max_pending=8)
+        try:
+            hashed = await hasher.hash("secret")
+            results = await asyncio.gather(
+                hasher.verify_and_update("secret", hashed),
+                hasher.verify_and_update("wrong", hashed),
+            )
+        finally:
+            hasher.shutdown()
+
+        assert results == [(True, None), (False, None)]
+        snapshot = hasher.metrics.snapshot()
+        assert snapshot["completed"] == 3
+        assert snapshot["pending"] == 0
+        assert snapshot["peak_pending"] == 2
+        assert snapshot["run_time"]["count"] == 3
+
+    async def test_rejects_beyond_max_pending(self):
+        """Test that work beyond the pending limit is rejected."""
+        hasher = PasswordHasher(rounds=4, workers=1, max_pending=1)
+        try:
+            results = await asyncio.gather(
+                hasher.hash("a"), hasher.hash("b"), return_exceptions=True
+            )
+        finally:
+            hasher.shutdown()
+
+        assert isinstance(results[1], PasswordHasherBusy)
+        assert hasher.metrics.rejected == 1
+        assert hasher.metrics.completed == 1
+
+    async def test_auth_health(self, client: AsyncClient):
+        """Test the password hashing health endpoint."""
+        response = await client.get("/health/auth")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["rounds"] == password_hasher.rounds
+        assert {"pending", "rejected", "queue_wait", "run_time"} <= data.keys()
+
+
+class TestRefreshTokens:
+    """Test refresh token rotation and revocation."""
+
+    async def _login(self, client: AsyncClient) -> dict:
+        await client.post(
+            "/auth/register",
+            json={"email": "refresh@example.com", "password": "password123"},
+        )
+        response = await client.post(
+            "/auth/login",
+            data={"username": "refresh@example.com", "password": "password123"},
+        )
+        assert response.status_code == 200
+        return response.json()
+
+    async def test_login_returns_refresh_token(self, client: AsyncClient):
+        """Test that login issues a refresh token alongside the access token."""
+        data = await self._login(client)
+
+        assert data["refresh_token"]
+        assert data["expires_in"] == 30 * 60
+
+    async def test_refresh_rotates_token(
+        self, client: AsyncClient, test_db: AsyncSession
+    ):
+        """Test that refreshing returns a working access token and a new refresh token."""
+        tokens = await self._login(client)
+
+        with patch("api.auth.check_password") as check_password:
+            response = await client.post(
+                "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+            )
+        check_password.assert_not_called()
+
+        assert response.status_code == 200
+        refreshed = response.json()
+        assert refreshed["refresh_token"] != tokens["refresh_token"]
+
+        me = await client.get(
+            "/auth/me",
+            headers={"Authorization": f"Bearer {refreshed['access_token']}"},
+        )
+        assert me.status_code == 200
+        assert me.json()["email"] == "refresh@example.com"
+
+        # Only digests are stored
+        stored = (await test_db.execute(select(RefreshTokenModel.token_hash))).scalars()
+        assert hash_refresh_token(refreshed["refresh_token"]) in list(stored)
+
+    async def test_reuse_revokes_family(self, client: AsyncClient):
+        """Test that replaying a rotated token revokes its successors."""
+        tokens = await self._login(client)
+        first = tokens["refresh_token"]
+
+        response = await client.post("/auth/refresh", json={"refresh_token": first})
+        second = response.json()["refresh_token"]
+
+        replay = await client.post("/auth/refresh", json={"refresh_token": first})
+        assert replay.status_code == 401
+
+        response = await client.post("/auth/refresh", json={"refresh_token": second})
+        assert response.status_code == 401
+
+    async def test_logins_are_separate_families(self, client: AsyncClient):
+        """Test that revoking one session leaves other sessions alone."""
+        first = (await self._login(client))["refresh_token"]
+        second = (await self._login(client))["refresh_token"]
+
+        response = await client.post("/auth/logout", json={"refresh_token": first})
+        assert response.status_code == 204
+
+        response = await client.post("/auth/refresh", json={"refresh_token": first})
+        assert response.status_code == 401
+        response = await client.post("/auth/refresh", json={"refresh_token": second})
+        assert response.status_code == 200
+
+    async def test_expired_refresh_token(
+        self, client: AsyncClient, test_db: AsyncSession
+    ):
+        """Test that an expired refresh token is rejected."""
+        tokens = await self._login(client)
+        await test_db.execute(
+            update(RefreshTokenModel).values(
+                expires_at=datetime.now(timezone.utc) - timedelta(minutes=1)
+            )
+        )
+        await test_db.commit()
+
+        response = await client.post(
+            "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+        )
+        assert response.status_code == 401
+
+    async def test_unknown_refresh_token(self, client: AsyncClient):
+        """Test that an unknown refresh token is rejected."""
+        response = await client.post(
+            "/auth/refresh", json={"refresh_token": "not-a-token"}
+        )
+
+        assert response.status_code == 401
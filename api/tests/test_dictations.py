@@ -1,9 +1,33 @@
+import asyncio
+import hashlib
+import json
+import time
+import uuid
+
 import pytest
+from fastapi import UploadFile
+from fastapi.responses import JSONResponse
 from httpx import AsyncClient
 from unittest.mock import AsyncMock, patch
 from io import BytesIO
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func, select
 
 from api.models import UserModel, DictationsModel, UserPreferencesModel
+from api.tests.conftest import test_engine
+from api.repositories.idempotency import IdempotencyRepository
+from api.services.idempotency_service import request_hash
+from api.utils.audio_probe import InvalidAudioError, probe_audio, sniff_format
+from api.services.ledger_service import ledger_writer
+from api.utils.compression import negotiate_encoding
+from api.utils.ledger import record_usage
+from api.utils.responses import FastJSONResponse
+from api.utils.uploads import (
+    RequestSizeLimitMiddleware,
+    UploadTooLargeError,
+    ingest_upload,
+)
 
 
 class TestDictationEndpoints:
@@ -116,6 +140,935 @@ class TestDictationEndpoints:
         assert "Failed to process" in response.json()["detail"]
 
 
+class TestBatchDictationEndpoints:
+    """Test batch dictation upload."""
+
+    def _files(self, audio: bytes, count: int) -> list:
+        return [("audio", (f"visit{i}.wav", audio, "audio/wav")) for i in range(count)]
+
+    def _results(self, response) -> list:
+        return [json.loads(line) for line in response.text.splitlines()]
+
+    async def test_batch_streams_result_per_file(
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data: bytes
+    ):
+        """Test that every file gets a result line and a saved dictation."""
+        with (
+            patch(
+                "api.services.llm_service.LLMService.transcribe_audio",
+                AsyncMock(return_value="Transcript"),
+            ),
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                AsyncMock(return_value="Formatted"),
+            ),
+        ):
+            response = await client.post(
+                "/dictations/batch",
+                headers=auth_headers,
+                files=self._files(sample_audio_data, 4),
+            )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        results = self._results(response)
+        assert sorted(r["index"] for r in results) == [0, 1, 2, 3]
+        assert all(r["status"] == "created" for r in results)
+        assert {r["filename"] for r in results} == {f"visit{i}.wav" for i in range(4)}
+        assert len({r["dictation"]["id"] for r in results}) == 4
+
+        history = await client.get("/dictations/", headers=auth_headers)
+        assert len(history.json()["items"]) == 4
+
+    async def test_batch_caps_concurrency_and_shares_preferences(
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data: bytes
+    ):
+        """Test the per-user cap and a single rule block fetch per batch."""
+        in_flight = 0
+        peak = 0
+
+        async def transcribe(self, audio_data):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return "Transcript"
+
+        with (
+            patch("api.services.llm_service.LLMService.transcribe_audio", transcribe),
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                AsyncMock(return_value="Formatted"),
+            ),
+            patch(
+                "api.repositories.preferences.PreferencesRepository.get_rule_block",
+                AsyncMock(return_value="Use metric units"),
+            ) as get_rule_block,
+            patch("api.config.settings.DICTATION_BATCH_CONCURRENCY", 2),
+        ):
+            response = await client.post(
+                "/dictations/batch",
+                headers=auth_headers,
+                files=self._files(sample_audio_data, 6),
+            )
+
+        assert response.status_code == 200
+        assert len(self._results(response)) == 6
+        assert peak == 2
+        get_rule_block.assert_awaited_once()
+
+    async def test_batch_isolates_failures(
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data: bytes
+    ):
+        """Test that an invalid or failing file does not fail the batch."""
+        files = self._files(sample_audio_data, 2)
+        files.append(("audio", ("notes.txt", b"not audio", "text/plain")))
+
+        with (
+            patch(
+                "api.services.llm_service.LLMService.transcribe_audio",
+                AsyncMock(side_effect=["Transcript", Exception("LLM down")]),
+            ),
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                AsyncMock(return_value="Formatted"),
+            ),
+        ):
+            response = await client.post(
+                "/dictations/batch", headers=auth_headers, files=files
+            )
+
+        assert response.status_code == 200
+        results = {r["index"]: r for r in self._results(response)}
+        assert results[2]["status"] == "failed"
+        assert "Unsupported file type" in results[2]["detail"]
+        statuses = sorted(results[i]["status"] for i in (0, 1))
+        assert statuses == ["created", "failed"]
+
+    async def test_batch_too_many_files(
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data: bytes
+    ):
+        """Test the batch size limit."""
+        with patch("api.config.settings.DICTATION_BATCH_MAX_FILES", 2):
+            response = await client.post(
+                "/dictations/batch",
+                headers=auth_headers,
+                files=self._files(sample_audio_data, 3),
+            )
+
+        assert response.status_code == 400
+
+    async def test_batch_unauthorized(
+        self, client: AsyncClient, sample_audio_data: bytes
+    ):
+        """Test batch upload without authentication."""
+        response = await client.post(
+            "/dictations/batch", files=self._files(sample_audio_data, 1)
+        )
+
+        assert response.status_code == 401
+
+
+class TestResumableUploadEndpoints:
+    """Test the resumable upload protocol."""
+
+    async def _create(self, client: AsyncClient, headers: dict, size: int) -> dict:
+        response = await client.post(
+            "/dictations/uploads",
+            headers=headers,
+            json={"filename": "visit.wav", "content_type": "audio/wav", "size": size},
+        )
+        assert response.status_code == 201
+        return response.json()
+
+    async def _put(
+        self, client: AsyncClient, headers: dict, upload: dict, start: int, data: bytes
+    ):
+        end = start + len(data) - 1
+        return await client.put(
+            f"/dictations/uploads/{upload['upload_id']}",
+            headers={
+                **headers,
+                "Content-Range": f"bytes {start}-{end}/{upload['size']}",
+            },
+            content=data,
+        )
+
+    async def test_upload_resume_and_finalize(
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data: bytes
+    ):
+        """Test out-of-order ranges, the resume offset and final processing."""
+        audio = sample_audio_data * 50
+        upload = await self._create(client, auth_headers, len(audio))
+        assert upload["offset"] == 0
+
+        # The middle arrives first; the offset only moves once the gap is filled
+        response = await self._put(client, auth_headers, upload, 2000, audio[2000:4000])
+        assert response.status_code == 200
+        assert response.json()["offset"] == 0
+
+        await self._put(client, auth_headers, upload, 0, audio[:1500])
+        status = await client.get(
+            f"/dictations/uploads/{upload['upload_id']}", headers=auth_headers
+        )
+        assert status.json()["offset"] == 1500
+
+        # Resume from the reported offset, overlapping the stored range
+        response = await self._put(client, auth_headers, upload, 1500, audio[1500:3000])
+        assert response.json()["offset"] == 4000
+        response = await self._put(client, auth_headers, upload, 4000, audio[4000:])
+        assert response.json()["offset"] == len(audio)
+
+        received = []
+
+        async def transcribe(self, audio_data):
+            received.append(audio_data.read())
+            return "Transcript"
+
+        with (
+            patch("api.services.llm_service.LLMService.transcribe_audio", transcribe),
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                AsyncMock(return_value="Formatted"),
+            ),
+        ):
+            response = await client.post(
+                f"/dictations/uploads/{upload['upload_id']}/finalize",
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 201
+        assert response.json()["formatted_text"] == "Formatted"
+        assert received == [audio]
+
+        # Finished uploads are removed
+        status = await client.get(
+            f"/dictations/uploads/{upload['upload_id']}", headers=auth_headers
+        )
+        assert status.status_code == 404
+
+    async def test_finalize_incomplete_upload(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Test that finalizing with missing bytes is refused."""
+        upload = await self._create(client, auth_headers, 100)
+        await self._put(client, auth_headers, upload, 0, b"x" * 40)
+        await self._put(client, auth_headers, upload, 60, b"x" * 40)
+
+        response = await client.post(
+            f"/dictations/uploads/{upload['upload_id']}/finalize",
+            headers=auth_headers,
+        )
+
+        assert response.status_code == 409
+        assert "40 of 100" in response.json()["detail"]
+
+    async def test_failed_processing_keeps_upload(
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data: bytes
+    ):
+        """Test that finalize can be retried after a processing failure."""
+        upload = await self._create(client, auth_headers, len(sample_audio_data))
+        await self._put(client, auth_headers, upload, 0, sample_audio_data)
+
+        with patch(
+            "api.services.llm_service.LLMService.transcribe_audio",
+            AsyncMock(side_effect=Exception("LLM down")),
+        ):
+            response = await client.post(
+                f"/dictations/uploads/{upload['upload_id']}/finalize",
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 500
+        status = await client.get(
+            f"/dictations/uploads/{upload['upload_id']}", headers=auth_headers
+        )
+        assert status.json()["offset"] == len(sample_audio_data)
+
+    async def test_finalize_rejects_invalid_audio(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Test that a complete upload of non-audio is refused and removed."""
+        upload = await self._create(client, auth_headers, 10)
+        await self._put(client, auth_headers, upload, 0, b"0123456789")
+
+        with patch(
+            "api.services.llm_service.LLMService.transcribe_audio"
+        ) as mock_transcribe:
+            response = await client.post(
+                f"/dictations/uploads/{upload['upload_id']}/finalize",
+                headers=auth_headers,
+            )
+
+        assert response.status_code == 400
+        mock_transcribe.assert_not_called()
+        status = await client.get(
+            f"/dictations/uploads/{upload['upload_id']}", headers=auth_headers
+        )
+        assert status.status_code == 404
+
+    async def test_put_range_validation(self, client: AsyncClient, auth_headers: dict):
+        """Test malformed, out-of-bounds and mismatched ranges."""
+        upload = await self._create(client, auth_headers, 10)
+        url = f"/dictations/uploads/{upload['upload_id']}"
+
+        response = await client.put(
+            url, headers={**auth_headers, "Content-Range": "0-4"}, content=b"01234"
+        )
+        assert response.status_code == 400
+
+        response = await client.put(
+            url,
+            headers={**auth_headers, "Content-Range": "bytes 8-11/10"},
+            content=b"0123",
+        )
+        assert response.status_code == 416
+
+        response = await client.put(
+            url,
+            headers={**auth_headers, "Content-Range": "bytes 0-4/10"},
+            content=b"0123456",
+        )
+        assert response.status_code == 400
+        assert "longer" in response.json()["detail"]
+
+        # Nothing from the rejected requests was kept
+        status = await client.get(url, headers=auth_headers)
+        assert status.json()["offset"] == 0
+
+    async def test_create_upload_validation(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Test the type and size checks when starting an upload."""
+        response = await client.post(
+            "/dictations/uploads",
+            headers=auth_headers,
+            json={"filename": "a.txt", "content_type": "text/plain", "size": 10},
+        )
+        assert response.status_code == 400
+
+        response = await client.post(
+            "/dictations/uploads",
+            headers=auth_headers,
+            json={
+                "filename": "a.wav",
+                "content_type": "audio/wav",
+                "size": 11 * 1024 * 1024,
+            },
+        )
+        assert response.status_code == 413
+
+    async def test_upload_belongs_to_its_user(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Test that another user cannot see, write or delete an upload."""
+        upload = await self._create(client, auth_headers, 10)
+        await client.post(
+            "/auth/register",
+            json={"email": "other@example.com", "password": "otherpassword123"},
+        )
+        login = await client.post(
+            "/auth/login",
+            data={"username": "other@example.com", "password": "otherpassword123"},
+        )
+        other = {"Authorization": f"Bearer {login.json()['access_token']}"}
+        url = f"/dictations/uploads/{upload['upload_id']}"
+
+        assert (await client.get(url, headers=other)).status_code == 404
+        assert (await self._put(client, other, upload, 0, b"x")).status_code == 404
+        assert (await client.delete(url, headers=other)).status_code == 404
+        assert (await client.get(url, headers=auth_headers)).status_code == 200
+
+    async def test_delete_upload(self, client: AsyncClient, auth_headers: dict):
+        """Test abandoning an upload."""
+        upload = await self._create(client, auth_headers, 10)
+        url = f"/dictations/uploads/{upload['upload_id']}"
+
+        assert (await client.delete(url, headers=auth_headers)).status_code == 204
+        assert (await client.get(url, headers=auth_headers)).status_code == 404
+
+    async def test_expired_uploads_are_purged(
+        self, client: AsyncClient, auth_headers: dict, isolated_upload_store
+    ):
+        """Test that stale uploads disappear."""
+        upload = await self._create(client, auth_headers, 10)
+        url = f"/dictations/uploads/{upload['upload_id']}"
+
+        with patch.object(isolated_upload_store, "ttl", timedelta(0)):
+            assert (await client.get(url, headers=auth_headers)).status_code == 404
+            await self._create(client, auth_headers, 10)
+            assert isolated_upload_store.purge_expired() == 1
+
+    async def test_resent_bytes_are_stored_once(
+        self, client: AsyncClient, auth_headers: dict, isolated_upload_store
+    ):
+        """Test overlapping ranges only add the bytes not already stored."""
+        data = bytes(range(256)) * 4
+        upload = await self._create(client, auth_headers, len(data))
+        for start, end in [(0, 600), (200, 400), (100, 900), (0, 1024)]:
+            response = await self._put(
+                client, auth_headers, upload, start, data[start:end]
+            )
+            assert response.status_code == 200
+
+        path = isolated_upload_store.directory / uuid.UUID(upload["upload_id"]).hex
+        parts = list(path.glob("*.part"))
+        assert sum(part.stat().st_size for part in parts) == len(data)
+        info = isolated_upload_store.get(uuid.UUID(upload["upload_id"]), 1)
+        with isolated_upload_store.assemble(info) as assembled:
+            assert assembled.read() == data
+
+    async def test_range_and_open_upload_limits(
+        self, client: AsyncClient, auth_headers: dict, isolated_upload_store
+    ):
+        """Test the caps on stored ranges per upload and open uploads per user."""
+        isolated_upload_store.max_parts = 2
+        isolated_upload_store.max_open = 2
+        upload = await self._create(client, auth_headers, 10)
+        await self._put(client, auth_headers, upload, 0, b"01")
+        await self._put(client, auth_headers, upload, 4, b"45")
+
+        response = await self._put(client, auth_headers, upload, 8, b"89")
+        assert response.status_code == 400
+        assert "limited to 2 ranges" in response.json()["detail"]
+
+        await self._create(client, auth_headers, 10)
+        response = await client.post(
+            "/dictations/uploads",
+            headers=auth_headers,
+            json={"filename": "c.wav", "content_type": "audio/wav", "size": 10},
+        )
+        assert response.status_code == 429
+
+    async def test_cancelled_finalize_releases_lock(
+        self, client: AsyncClient, auth_headers: dict, isolated_upload_store
+    ):
+        """Test a finalize cancelled while claiming does not leave the lock held."""
+        upload = await self._create(client, auth_headers, 10)
+        upload_id = uuid.UUID(upload["upload_id"])
+        user_id = (await client.get("/auth/me", headers=auth_headers)).json()["id"]
+        claim = isolated_upload_store._claim
+
+        def slow_claim(*args):
+            time.sleep(0.2)
+            return claim(*args)
+
+        async def finalize():
+            async with isolated_upload_store.finalizing(upload_id, user_id):
+                pass
+
+        with patch.object(isolated_upload_store, "_claim", slow_claim):
+            task = asyncio.create_task(finalize())
+            await asyncio.sleep(0.05)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        await asyncio.sleep(0.3)
+
+        async with isolated_upload_store.finalizing(upload_id, user_id) as claimed:
+            assert claimed[0].size == 10
+
+    async def test_finalize_is_idempotent(
+        self,
+        client: AsyncClient,
+        auth_headers: dict,
+        sample_audio_data: bytes,
+        isolated_upload_store,
+    ):
+        """Test a repeated finalize returns the dictation and a concurrent one waits."""
+        upload = await self._create(client, auth_headers, len(sample_audio_data))
+        await self._put(client, auth_headers, upload, 0, sample_audio_data)
+        url = f"/dictations/uploads/{upload['upload_id']}/finalize"
+        me = await client.get("/auth/me", headers=auth_headers)
+
+        async with isolated_upload_store.finalizing(
+            uuid.UUID(upload["upload_id"]), me.json()["id"]
+        ):
+            busy = await client.post(url, headers=auth_headers)
+        assert busy.status_code == 409
+
+        transcribe = AsyncMock(return_value="Transcript")
+        with (
+            patch("api.services.llm_service.LLMService.transcribe_audio", transcribe),
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                AsyncMock(return_value="Formatted"),
+            ),
+        ):
+            first = await client.post(url, headers=auth_headers)
+            retry = await client.post(url, headers=auth_headers)
+
+        assert first.status_code == retry.status_code == 201
+        assert retry.json() == first.json()
+        assert transcribe.await_count == 1
+
+    def test_assembly_falls_back_without_copy_file_range(
+        self, isolated_upload_store, monkeypatch
+    ):
+        """Test assembly where the kernel copy is unavailable."""
+        store = isolated_upload_store
+        info = store.create(1, "visit.wav", "audio/wav", 6)
+        path = store.directory / info.upload_id.hex
+        (path / "0.part").write_bytes(b"abcd")
+        (path / "2.part").write_bytes(b"CDef")
+
+        def refuse(*args):
+            raise OSError("not supported")
+
+        monkeypatch.setattr("os.copy_file_range", refuse)
+        with store.assemble(info) as assembled:
+            assert assembled.read() == b"abcdef"
+
+
+class TestDictationHistoryEndpoints:
+    """Test dictation history listing."""
+
+    async def _seed_dictations(self, client, auth_headers, test_db, count):
+        """Insert dictations for the authenticated user, oldest first."""
+        me = await client.get("/auth/me", headers=auth_headers)
+        user_id = me.json()["id"]
+        base = datetime(2025, 1, 1)
+        for i in range(count):
+            test_db.add(
+                DictationsModel(
+                    user_id=user_id,
+                    text=f"Text {i}",
+                    formatted_text=f"Formatted {i}",
+                    # Pairs share a timestamp so ordering must fall back to id
+                    created_at=base + timedelta(minutes=i // 2),
+                    updated_at=base,
+                )
+            )
+        await test_db.commit()
+
+    async def test_list_dictations_empty(self, client: AsyncClient, auth_headers: dict):
+        """Test listing when the user has no dictations."""
+        response = await client.get("/dictations/", headers=auth_headers)
+
+        assert response.status_code == 200
+        assert response.json() == {"items": [], "next_cursor": None}
+
+    async def test_list_dictations_pages_through_history(
+        self, client: AsyncClient, auth_headers: dict, test_db
+    ):
+        """Test walking all pages with the cursor, newest first."""
+        await self._seed_dictations(client, auth_headers, test_db, 5)
+
+        texts, cursor = [], None
+        while True:
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = await client.get(
+                "/dictations/", headers=auth_headers, params=params
+            )
+            assert response.status_code == 200
+            data = response.json()
+            texts.extend(item["text"] for item in data["items"])
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+
+        assert texts == [f"Text {i}" for i in reversed(range(5))]
+
+    async def test_list_dictations_sparse_fields(
+        self, client: AsyncClient, auth_headers: dict, test_db
+    ):
+        """Test that sparse field selection omits unrequested bodies."""
+        await self._seed_dictations(client, auth_headers, test_db, 1)
+
+        response = await client.get(
+            "/dictations/", headers=auth_headers, params={"fields": "created_at"}
+        )
+
+        assert response.status_code == 200
+        item = response.json()["items"][0]
+        assert set(item) == {"id", "created_at"}
+
+    async def test_list_dictations_unknown_field(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Test rejecting unknown fields."""
+        response = await client.get(
+            "/dictations/", headers=auth_headers, params={"fields": "id,password"}
+        )
+
+        assert response.status_code == 400
+        assert "password" in response.json()["detail"]
+
+    async def test_list_dictations_invalid_cursor(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Test rejecting a malformed cursor."""
+        response = await client.get(
+            "/dictations/", headers=auth_headers, params={"cursor": "not-a-cursor"}
+        )
+
+        assert response.status_code == 400
+
+    async def test_list_dictations_unauthorized(self, client: AsyncClient):
+        """Test listing without authentication."""
+        response = await client.get("/dictations/")
+
+        assert response.status_code == 401
+
+
+class TestDictationSearchEndpoints:
+    """Test full-text search over dictations."""
+
+    async def _seed_notes(self, client, auth_headers, test_db, notes):
+        """Insert (text, formatted_text) pairs for the authenticated user."""
+        me = await client.get("/auth/me", headers=auth_headers)
+        user_id = me.json()["id"]
+        for text, formatted_text in notes:
+            test_db.add(
+                DictationsModel(
+                    user_id=user_id, text=text, formatted_text=formatted_text
+                )
+            )
+        await test_db.commit()
+
+    async def test_search_ranks_and_highlights(
+        self, client: AsyncClient, auth_headers: dict, test_db
+    ):
+        """Test matches are ranked and snippets highlight the terms."""
+        await self._seed_notes(
+            client,
+            auth_headers,
+            test_db,
+            [
+                ("patient seen for knee pain", "**Knee pain** follow-up"),
+                ("started metformin today", "Plan: metformin 500mg twice daily"),
+                ("metformin dose reviewed", "Metformin continued. Metformin tolerated"),
+            ],
+        )
+
+        response = await client.get(
+            "/dictations/search", headers=auth_headers, params={"q": "metformin"}
+        )
+
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert len(items) == 2
+        assert items[0]["rank"] >= items[1]["rank"]
+        assert all("<mark>" in item["snippet"] for item in items)
+
+    async def test_search_highlights_transcript_only_match(
+        self, client: AsyncClient, auth_headers: dict, test_db
+    ):
+        """Test a word only in the raw transcript is still highlighted."""
+        await self._seed_notes(
+            client,
+            auth_headers,
+            test_db,
+            [("patient mentioned wheezing at night", "Chest clear on exam")],
+        )
+
+        response = await client.get(
+            "/dictations/search", headers=auth_headers, params={"q": "wheezing"}
+        )
+
+        [item] = response.json()["items"]
+        assert "<mark>wheezing</mark>" in item["snippet"]
+
+    async def test_search_pagination(
+        self, client: AsyncClient, auth_headers: dict, test_db
+    ):
+        """Test paging through search results by offset."""
+        await self._seed_notes(
+            client,
+            auth_headers,
+            test_db,
+            [(f"aspirin note {i}", f"Aspirin {i}") for i in range(3)],
+        )
+
+        first = await client.get(
+            "/dictations/search",
+            headers=auth_headers,
+            params={"q": "aspirin", "limit": 2},
+        )
+        second = await client.get(
+            "/dictations/search",
+            headers=auth_headers,
+            params={"q": "aspirin", "limit": 2, "offset": first.json()["next_offset"]},
+        )
+
+        ids = [item["id"] for item in first.json()["items"]]
+        ids += [item["id"] for item in second.json()["items"]]
+        assert len(set(ids)) == 3
+        assert second.json()["next_offset"] is None
+
+    async def test_search_query_syntax_is_escaped(
+        self, client: AsyncClient, auth_headers: dict, test_db
+    ):
+        """Test that search operators in user input are treated as text."""
+        await self._seed_notes(
+            client, auth_headers, test_db, [("Smith review", "Mr Smith")]
+        )
+
+        response = await client.get(
+            "/dictations/search",
+            headers=auth_headers,
+            params={"q": 'smith" OR NEAR(*'},
+        )
+
+        assert response.status_code == 200
+
+    async def test_search_isolated_per_user(
+        self, client: AsyncClient, auth_headers: dict, test_db
+    ):
+        """Test users never see each other's notes in search."""
+        other = UserModel(email="other@example.com", hashed_password="x")
+        test_db.add(other)
+        await test_db.flush()
+        test_db.add(
+            DictationsModel(
+                user_id=other.id, text="warfarin", formatted_text="Warfarin"
+            )
+        )
+        await test_db.commit()
+
+        response = await client.get(
+            "/dictations/search", headers=auth_headers, params={"q": "warfarin"}
+        )
+
+        assert response.json()["items"] == []
+
+    async def test_search_requires_query(self, client: AsyncClient, auth_headers: dict):
+        """Test search without terms."""
+        response = await client.get("/dictations/search", headers=auth_headers)
+
+        assert response.status_code == 422
+
+
+class TestSimilarDictationEndpoints:
+    """Test similar-note search."""
+
+    @pytest.fixture(autouse=True)
+    def _audio(self, sample_audio_data: bytes):
+        self.audio = sample_audio_data
+
+    @patch("api.services.llm_service.LLMService.transcribe_audio")
+    @patch("api.services.llm_service.LLMService.format_transcript")
+    async def _create(self, client, auth_headers, text, mock_format, mock_transcribe):
+        """Create a dictation through the API so it is indexed on insert."""
+        mock_transcribe.return_value = text
+        mock_format.return_value = text
+        response = await client.post(
+            "/dictations/",
+            headers=auth_headers,
+            files={"audio": ("note.wav", BytesIO(self.audio), "audio/wav")},
+        )
+        return response.json()["id"]
+
+    async def test_similar_by_text(self, client: AsyncClient, auth_headers: dict):
+        """Test finding notes similar to free text."""
+        await self._create(client, auth_headers, "Knee pain, refer to physio")
+        diabetes_id = await self._create(
+            client, auth_headers, "Diabetes review, continue metformin"
+        )
+
+        response = await client.get(
+            "/dictations/similar",
+            headers=auth_headers,
+            params={"q": "metformin diabetes", "k": 1},
+        )
+
+        assert response.status_code == 200
+        hits = response.json()
+        assert [hit["id"] for hit in hits] == [diabetes_id]
+        assert hits[0]["formatted_text"] == "Diabetes review, continue metformin"
+
+    async def test_similar_by_dictation_excludes_itself(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Test finding notes similar to an existing dictation."""
+        first = await self._create(client, auth_headers, "Asthma inhaler review")
+        second = await self._create(client, auth_headers, "Asthma review, inhaler")
+
+        response = await client.get(
+            "/dictations/similar",
+            headers=auth_headers,
+            params={"dictation_id": first},
+        )
+
+        assert response.status_code == 200
+        assert [hit["id"] for hit in response.json()] == [second]
+
+    async def test_similar_unknown_dictation(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Test querying by a dictation the user does not own."""
+        response = await client.get(
+            "/dictations/similar", headers=auth_headers, params={"dictation_id": 999}
+        )
+
+        assert response.status_code == 404
+
+    async def test_similar_requires_one_source(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Test that exactly one of dictation_id and q is required."""
+        response = await client.get("/dictations/similar", headers=auth_headers)
+
+        assert response.status_code == 400
+
+
+class TestIdempotencyKeys:
+    """Test Idempotency-Key handling on dictation and edit submissions."""
+
+    def _post_audio(self, client, auth_headers, audio_data, key="visit-1"):
+        return client.post(
+            "/dictations/",
+            headers={**auth_headers, "Idempotency-Key": key},
+            files={"audio": ("test.wav", BytesIO(audio_data), "audio/wav")},
+        )
+
+    async def _claim(self, client, auth_headers, test_db, fingerprint):
+        """Hold a key as if another worker were processing it."""
+        me = await client.get("/auth/me", headers=auth_headers)
+        await IdempotencyRepository(test_db).claim(
+            me.json()["id"],
+            "dictations.create",
+            "visit-1",
+            fingerprint,
+            timedelta(minutes=10),
+        )
+        await test_db.commit()
+
+    async def test_retry_replays_dictation(
+        self, client: AsyncClient, auth_headers: dict, test_db, sample_audio_data
+    ):
+        """Test a retried upload returns the first dictation without reprocessing."""
+        transcribe = AsyncMock(return_value="Transcript")
+        with (
+            patch("api.services.llm_service.LLMService.transcribe_audio", transcribe),
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                AsyncMock(return_value="Formatted"),
+            ),
+        ):
+            first = await self._post_audio(client, auth_headers, sample_audio_data)
+            retry = await self._post_audio(client, auth_headers, sample_audio_data)
+
+        assert first.status_code == retry.status_code == 201
+        assert retry.json() == first.json()
+        assert retry.headers["idempotent-replayed"] == "true"
+        assert "idempotent-replayed" not in first.headers
+        assert transcribe.await_count == 1
+        assert await test_db.scalar(select(func.count(DictationsModel.id))) == 1
+
+    async def test_key_reused_for_different_audio(
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data
+    ):
+        """Test a key sent with a different file is refused."""
+        with (
+            patch(
+                "api.services.llm_service.LLMService.transcribe_audio",
+                AsyncMock(return_value="Transcript"),
+            ),
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                AsyncMock(return_value="Formatted"),
+            ),
+        ):
+            await self._post_audio(client, auth_headers, sample_audio_data)
+            response = await self._post_audio(
+                client, auth_headers, sample_audio_data + b"\x00\x00"
+            )
+
+        assert response.status_code == 422
+        assert "different request" in response.json()["detail"]
+
+    async def test_failure_releases_key(
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data
+    ):
+        """Test a retry after a failed request processes the audio again."""
+        transcribe = AsyncMock(side_effect=[Exception("timeout"), "Transcript"])
+        with (
+            patch("api.services.llm_service.LLMService.transcribe_audio", transcribe),
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                AsyncMock(return_value="Formatted"),
+            ),
+        ):
+            failed = await self._post_audio(client, auth_headers, sample_audio_data)
+            retry = await self._post_audio(client, auth_headers, sample_audio_data)
+
+        assert failed.status_code == 500
+        assert retry.status_code == 201
+        assert "idempotent-replayed" not in retry.headers
+        assert transcribe.await_count == 2
+
+    async def test_in_flight_retry_conflicts(
+        self, client: AsyncClient, auth_headers: dict, test_db, sample_audio_data
+    ):
+        """Test a retry gives up with 409 while the first request still runs."""
+        fingerprint = request_hash(hashlib.sha256(sample_audio_data).hexdigest())
+        await self._claim(client, auth_headers, test_db, fingerprint)
+
+        transcribe = AsyncMock(return_value="Transcript")
+        with (
+            patch("api.services.llm_service.LLMService.transcribe_audio", transcribe),
+            patch("api.config.settings.IDEMPOTENCY_WAIT_SECONDS", 0),
+        ):
+            response = await self._post_audio(client, auth_headers, sample_audio_data)
+
+        assert response.status_code == 409
+        assert response.headers["retry-after"]
+        transcribe.assert_not_awaited()
+
+    async def test_in_flight_retry_waits_for_response(
+        self, client: AsyncClient, auth_headers: dict, test_db, sample_audio_data
+    ):
+        """Test a retry answers with the first request's result once it is stored."""
+        fingerprint = request_hash(hashlib.sha256(sample_audio_data).hexdigest())
+        await self._claim(client, auth_headers, test_db, fingerprint)
+        me = await client.get("/auth/me", headers=auth_headers)
+        stored = {"id": 7, "user_id": me.json()["id"], "text": "T"}
+
+        async def finish_first_request():
+            await asyncio.sleep(0.05)
+            await IdempotencyRepository(test_db).complete(
+                me.json()["id"],
+                "dictations.create",
+                "visit-1",
+                stored,
+                timedelta(hours=1),
+            )
+            await test_db.commit()
+
+        with patch("api.services.idempotency_service.POLL_INTERVAL", 0.02):
+            first = asyncio.create_task(finish_first_request())
+            response = await self._post_audio(client, auth_headers, sample_audio_data)
+            await first
+
+        assert response.status_code == 201
+        assert response.json() == stored
+
+    @patch("api.services.llm_service.LLMService.extract_user_preferences")
+    async def test_preference_extract_replayed(
+        self, mock_extract, client: AsyncClient, auth_headers: dict, test_db
+    ):
+        """Test a resubmitted edit is stored and extracted once."""
+        mock_extract.return_value = "The user prefers bullet points."
+        params = {"original_text": "Original", "edited_text": "Edited"}
+        headers = {**auth_headers, "Idempotency-Key": "edit-1"}
+
+        first = await client.post(
+            "/dictations/preference_extract", headers=headers, params=params
+        )
+        retry = await client.post(
+            "/dictations/preference_extract", headers=headers, params=params
+        )
+
+        assert first.status_code == retry.status_code == 200
+        assert retry.json() == first.json()
+        assert mock_extract.await_count == 1
+        assert await test_db.scalar(select(func.count(UserPreferencesModel.id))) == 1
+
+
 class TestPreferenceEndpoints:
     """Test preference extraction endpoints."""
 
@@ -233,7 +1186,7 @@ class TestFileValidation:
     """Test file upload validation."""
 
     async def test_supported_audio_formats(
-        self, client: AsyncClient, auth_headers: dict
+        self, client: AsyncClient, auth_headers: dict, encoded_audio: dict
     ):
         """Test various supported audio formats."""
         formats = [
@@ -253,7 +1206,7 @@ class TestFileValidation:
                 mock_format.return_value = "Formatted test"
 
                 for filename, content_type in formats:
-                    audio_file = BytesIO(b"fake audio data")
+                    audio_file = BytesIO(encoded_audio[filename.split(".")[-1]])
 
                     response = await client.post(
                         "/dictations/",
@@ -262,6 +1215,9 @@ class TestFileValidation:
                     )
 
                     assert response.status_code == 201, f"Failed for {filename}"
+                    assert response.json()["audio_duration"] == pytest.approx(
+                        0.5, abs=0.1
+                    )
 
     async def test_unsupported_audio_formats(
         self, client: AsyncClient, auth_headers: dict
@@ -286,6 +1242,376 @@ class TestFileValidation:
             assert response.status_code == 400, f"Should reject {filename}"
             assert "Unsupported file type" in response.json()["detail"]
 
+    async def test_ingest_upload_hashes_and_rewinds(self):
+        """Test chunked ingestion: size, hash and a rewound file, no copy."""
+        data = b"audio" * 1000
+        upload = UploadFile(BytesIO(data), size=len(data))
+
+        ingested = await ingest_upload(upload, max_bytes=len(data), chunk_size=64)
+
+        assert ingested.size == len(data)
+        assert ingested.sha256 == hashlib.sha256(data).hexdigest()
+        assert ingested.file is upload.file
+        assert ingested.file.read() == data
+
+    async def test_ingest_upload_enforces_cap_while_reading(self):
+        """Test that the cap holds even when the declared size is unknown."""
+        upload = UploadFile(BytesIO(b"x" * 1000))
+
+        with pytest.raises(UploadTooLargeError):
+            await ingest_upload(upload, max_bytes=999, chunk_size=100)
+
+    async def _call_limited(self, headers: list, chunks: list) -> tuple:
+        """Send a request through the size limit middleware; return the
+        response status and how many body chunks were read."""
+        reads = 0
+        messages = []
+
+        async def app(scope, receive, send):
+            while True:
+                message = await receive()
+                if not message.get("more_body"):
+                    break
+            await send({"type": "http.response.start", "status": 201, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        async def receive():
+            nonlocal reads
+            reads += 1
+            body = chunks[reads - 1]
+            return {
+                "type": "http.request",
+                "body": body,
+                "more_body": reads < len(chunks),
+            }
+
+        async def send(message):
+            messages.append(message)
+
+        middleware = RequestSizeLimitMiddleware(app, {("POST", "/upload"): 100})
+        scope = {
+            "type": "http",
+            "method": "POST",
+            "path": "/upload",
+            "headers": headers,
+        }
+        await middleware(scope, receive, send)
+        return messages[0]["status"], reads
+
+    async def test_request_limit_rejects_on_content_length(self):
+        """Test that a declared oversized body is refused before reading it."""
+        status, reads = await self._call_limited(
+            [(b"content-length", b"1000")], [b"x" * 1000]
+        )
+
+        assert status == 413
+        assert reads == 0
+
+    async def test_request_limit_cuts_off_streamed_body(self):
+        """Test that a body without Content-Length is stopped at the cap."""
+        status, reads = await self._call_limited([], [b"x" * 60] * 10)
+
+        assert status == 413
+        assert reads == 2
+
+    async def test_request_limit_allows_small_body(self):
+        """Test that bodies within the limit pass through untouched."""
+        status, reads = await self._call_limited(
+            [(b"content-length", b"80")], [b"x" * 40, b"x" * 40]
+        )
+
+        assert status == 201
+        assert reads == 2
+
+    def test_probe_reads_real_stream_parameters(self, encoded_audio: dict):
+        """Test format sniffing and header probing for each supported container."""
+        for container_format, data in encoded_audio.items():
+            assert sniff_format(data[:16]) == container_format
+
+            audio = BytesIO(data)
+            audio.seek(5)
+            probe = probe_audio(audio)
+
+            assert probe.format == container_format
+            assert probe.sample_rate in (16000, 48000)  # Opus always decodes at 48k
+            assert probe.channels == 1
+            assert probe.duration == pytest.approx(0.5, abs=0.1)
+            assert audio.tell() == 0
+
+    def test_probe_rejects_empty_and_corrupt_audio(self, encoded_audio: dict):
+        """Test that unplayable files fail the probe."""
+        wav_header_only = encoded_audio["wav"][:44]
+        for data in (
+            b"",
+            b"fake audio data",
+            b"RIFF",
+            wav_header_only,
+            b"ID3" + b"\x00" * 100,
+            encoded_audio["mp4"][:40],
+        ):
+            with pytest.raises(InvalidAudioError):
+                probe_audio(BytesIO(data))
+
+    async def test_content_decides_format_not_declared_type(
+        self, client: AsyncClient, auth_headers: dict, encoded_audio: dict
+    ):
+        """Test that a mislabelled file is judged by what it contains."""
+        with (
+            patch(
+                "api.services.llm_service.LLMService.transcribe_audio",
+                AsyncMock(return_value="Transcript"),
+            ) as mock_transcribe,
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                AsyncMock(return_value="Formatted"),
+            ),
+        ):
+            # Real MP3 declared as WAV is fine
+            response = await client.post(
+                "/dictations/",
+                headers=auth_headers,
+                files={"audio": ("visit.wav", encoded_audio["mp3"], "audio/wav")},
+            )
+            assert response.status_code == 201
+
+            # Text declared as MP3 never reaches the LLM
+            response = await client.post(
+                "/dictations/",
+                headers=auth_headers,
+                files={"audio": ("visit.mp3", b"\xff\xfb" * 200, "audio/mpeg")},
+            )
+            assert response.status_code == 400
+            assert mock_transcribe.await_count == 1
+
+
+class TestLedgerEndpoints:
+    """Test the per-operation latency and token ledger."""
+
+    @staticmethod
+    async def _format(transcript, rule_block):
+        record_usage(
+            "gpt-4o", 100, 20, cached_tokens=60, prompt_version="format-transcript"
+        )
+        return f"**{transcript}**"
+
+    async def _dictate(self, client, auth_headers, audio):
+        with (
+            patch(
+                "api.services.llm_service.LLMService.transcribe_audio",
+                AsyncMock(return_value="Transcript"),
+            ),
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                side_effect=self._format,
+            ),
+        ):
+            return await client.post(
+                "/dictations/",
+                headers=auth_headers,
+                files={"audio": ("test.wav", BytesIO(audio), "audio/wav")},
+            )
+
+    async def test_dictation_entry(
+        self, client: AsyncClient, auth_headers: dict, encoded_audio: dict
+    ):
+        """Test a dictation queues one entry with stages, audio and tokens."""
+        response = await self._dictate(client, auth_headers, encoded_audio["wav"])
+
+        assert response.status_code == 201
+        [entry] = ledger_writer.pending
+        assert entry.operation == "dictation"
+        assert entry.status == "ok"
+        assert entry.dictation_id == response.json()["id"]
+        assert entry.audio_bytes == len(encoded_audio["wav"])
+        assert entry.audio_duration == pytest.approx(0.5, abs=0.05)
+        assert (entry.model, entry.prompt_version) == ("gpt-4o", "format-transcript")
+        assert (entry.prompt_tokens, entry.completion_tokens) == (100, 20)
+        assert {
+            "upload_read",
+            "probe",
+            "transcribe",
+            "preference_fetch",
+            "format",
+            "db_commit",
+        } <= set(entry.stages)
+        assert entry.total_ms >= entry.stages["transcribe"]
+
+    async def test_replayed_dictation_is_not_recorded(
+        self, client: AsyncClient, auth_headers: dict, encoded_audio: dict
+    ):
+        """Test a replayed Idempotency-Key adds no second entry."""
+        headers = {**auth_headers, "Idempotency-Key": "visit-1"}
+        first = await self._dictate(client, headers, encoded_audio["wav"])
+        retry = await self._dictate(client, headers, encoded_audio["wav"])
+
+        assert retry.headers["Idempotent-Replayed"] == "true"
+        [entry] = ledger_writer.pending
+        assert entry.dictation_id == first.json()["id"]
+
+    async def test_summary(
+        self, client: AsyncClient, auth_headers: dict, encoded_audio: dict
+    ):
+        """Test flushed entries are aggregated per group."""
+        for _ in range(2):
+            await self._dictate(client, auth_headers, encoded_audio["wav"])
+        with patch(
+            "api.services.llm_service.LLMService.extract_user_preferences",
+            AsyncMock(return_value=None),
+        ):
+            await client.post(
+                "/dictations/preference_extract",
+                headers=auth_headers,
+                params={"original_text": "a", "edited_text": "b"},
+            )
+
+        assert await ledger_writer.flush() == 3
+        response = await client.get("/dictations/ledger", headers=auth_headers)
+
+        assert response.status_code == 200
+        rows = {row["key"]: row for row in response.json()}
+        assert set(rows) == {"dictation", "preference_extract"}
+        dictation = rows["dictation"]
+        assert dictation["operations"] == 2
+        assert dictation["errors"] == 0
+        assert dictation["prompt_tokens"] == 200
+        assert dictation["cached_tokens"] == 120
+        assert dictation["audio_seconds"] == pytest.approx(1.0, abs=0.1)
+        assert "transcribe" in dictation["stage_mean_ms"]
+        assert "extract" in rows["preference_extract"]["stage_mean_ms"]
+
+        response = await client.get(
+            "/dictations/ledger", headers=auth_headers, params={"group_by": "model"}
+        )
+        assert {row["key"] for row in response.json()} == {"gpt-4o", None}
+
+    async def test_failed_dictation_entry(
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data: bytes
+    ):
+        """Test a failed dictation is recorded as an error."""
+        with patch(
+            "api.services.llm_service.LLMService.transcribe_audio",
+            AsyncMock(side_effect=Exception("API Error")),
+        ):
+            response = await client.post(
+                "/dictations/",
+                headers=auth_headers,
+                files={"audio": ("test.wav", BytesIO(sample_audio_data), "audio/wav")},
+            )
+
+        assert response.status_code == 500
+        [entry] = ledger_writer.pending
+        assert entry.status == "error"
+        assert entry.dictation_id is None
+
+    async def test_summary_rejects_unknown_group(
+        self, client: AsyncClient, auth_headers: dict
+    ):
+        """Test only known group keys are accepted."""
+        response = await client.get(
+            "/dictations/ledger", headers=auth_headers, params={"group_by": "user_id"}
+        )
+
+        assert response.status_code == 422
+
+
+class TestResponseEncoding:
+    """Test response compression and JSON rendering."""
+
+    NOTE = "Patient reports intermittent chest pain on exertion, no radiation. " * 40
+
+    async def _seed_long_notes(self, client, auth_headers, test_db, count):
+        me = await client.get("/auth/me", headers=auth_headers)
+        for _ in range(count):
+            test_db.add(
+                DictationsModel(
+                    user_id=me.json()["id"], text=self.NOTE, formatted_text=self.NOTE
+                )
+            )
+        await test_db.commit()
+
+    def test_negotiate_encoding(self):
+        """Test Accept-Encoding negotiation."""
+        supported = ("br", "gzip")
+        assert negotiate_encoding("gzip, deflate", supported) == "gzip"
+        assert negotiate_encoding("gzip, br", supported) == "br"
+        assert negotiate_encoding("br;q=0.5, gzip", supported) == "gzip"
+        assert negotiate_encoding("*", ("gzip",)) == "gzip"
+        assert negotiate_encoding("gzip;q=0, *;q=0.1", ("gzip",)) is None
+        assert negotiate_encoding("identity", supported) is None
+        assert negotiate_encoding(None, supported) is None
+
+    async def test_large_responses_are_gzipped(
+        self, client: AsyncClient, auth_headers: dict, test_db
+    ):
+        """Test that long note lists are compressed when the client accepts it."""
+        await self._seed_long_notes(client, auth_headers, test_db, 5)
+
+        response = await client.get(
+            "/dictations/",
+            headers={**auth_headers, "Accept-Encoding": "gzip"},
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == "gzip"
+        assert "Accept-Encoding" in response.headers["vary"]
+        assert int(response.headers["content-length"]) == (
+            response.num_bytes_downloaded
+        )
+        assert response.num_bytes_downloaded * 10 < len(response.content)
+        assert len(response.json()["items"]) == 5
+
+    async def test_small_or_unaccepted_responses_are_not_compressed(
+        self, client: AsyncClient, auth_headers: dict, test_db
+    ):
+        """Test the size threshold and clients that do not ask for compression."""
+        small = await client.get("/health", headers={"Accept-Encoding": "gzip"})
+        assert "content-encoding" not in small.headers
+
+        await self._seed_long_notes(client, auth_headers, test_db, 5)
+        plain = await client.get(
+            "/dictations/", headers={**auth_headers, "Accept-Encoding": "identity"}
+        )
+        assert "content-encoding" not in plain.headers
+        assert len(plain.json()["items"]) == 5
+
+    async def test_streamed_batch_is_compressed_per_line(
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data: bytes
+    ):
+        """Test that NDJSON results stay decodable line by line when gzipped."""
+        with (
+            patch(
+                "api.services.llm_service.LLMService.transcribe_audio",
+                AsyncMock(return_value=self.NOTE),
+            ),
+            patch(
+                "api.services.llm_service.LLMService.format_transcript",
+                AsyncMock(return_value=self.NOTE),
+            ),
+        ):
+            response = await client.post(
+                "/dictations/batch",
+                headers={**auth_headers, "Accept-Encoding": "gzip"},
+                files=[
+                    ("audio", (f"visit{i}.wav", sample_audio_data, "audio/wav"))
+                    for i in range(3)
+                ],
+            )
+
+        assert response.headers["content-encoding"] == "gzip"
+        lines = response.text.splitlines()
+        assert [json.loads(line)["status"] for line in lines] == ["created"] * 3
+
+    def test_fast_json_matches_standard_rendering(self):
+        """Test that orjson output is interchangeable with JSONResponse."""
+        content = {
+            "items": [{"id": 1, "text": "Dosis 5 µg, Ödem ↓", "score": 0.25}],
+            "next_cursor": None,
+        }
+
+        fast = FastJSONResponse(content).body
+        assert json.loads(fast) == json.loads(JSONResponse(content).body)
+        assert fast == JSONResponse(content).body
+
 
 class TestIntegrationWorkflow:
     """Test complete workflow integration."""
@@ -349,3 +1675,67 @@ class TestIntegrationWorkflow:
         assert (
             preferences[0]["rules"] == "The user prefers bold headers in medical notes."
         )
+
+    @patch("api.services.llm_service.LLMService.transcribe_audio")
+    @patch("api.services.llm_service.LLMService.format_transcript")
+    @patch("api.services.llm_service.LLMService.extract_user_preferences")
+    async def test_timestamps_are_bound_naive(
+        self,
+        mock_extract,
+        mock_format,
+        mock_transcribe,
+        client: AsyncClient,
+        sample_audio_data: bytes,
+    ):
+        """Test no write binds an aware datetime, which asyncpg rejects."""
+        mock_transcribe.return_value = "Transcript"
+        mock_format.return_value = "Formatted"
+        mock_extract.return_value = "Rule"
+        aware = []
+
+        def collect(conn, cursor, statement, parameters, context, executemany):
+            # Before SQLite's DateTime has turned the values into strings
+            for row in context.compiled_parameters:
+                aware.extend(
+                    value
+                    for value in row.values()
+                    if isinstance(value, datetime) and value.tzinfo is not None
+                )
+
+        event.listen(test_engine.sync_engine, "before_cursor_execute", collect)
+        try:
+            await client.post(
+                "/auth/register",
+                json={"email": "naive@example.com", "password": "password123"},
+            )
+            tokens = (
+                await client.post(
+                    "/auth/login",
+                    data={"username": "naive@example.com", "password": "password123"},
+                )
+            ).json()
+            await client.post(
+                "/auth/refresh", json={"refresh_token": tokens["refresh_token"]}
+            )
+            headers = {
+                "Authorization": f"Bearer {tokens['access_token']}",
+                "Idempotency-Key": "visit-1",
+            }
+            created = await client.post(
+                "/dictations/",
+                headers=headers,
+                files={"audio": ("test.wav", BytesIO(sample_audio_data), "audio/wav")},
+            )
+            await client.post(
+                "/dictations/preference_extract",
+                headers=headers,
+                params={"original_text": "Formatted", "edited_text": "Edited"},
+            )
+            await client.get("/dictations/ledger", headers=headers)
+            flushed = await ledger_writer.flush()
+        finally:
+            event.remove(test_engine.sync_engine, "before_cursor_execute", collect)
+
+        assert created.status_code == 201
+        assert flushed == 2
+        assert aware == []
@@ -111,15 +111,16 @@ class TestAudioFileEdgeCases:
         with patch(
             "api.services.llm_service.LLMService.transcribe_audio"
         ) as mock_transcribe:
-            mock_transcribe.side_effect = Exception("Invalid audio format")
-
             response = await client.post(
                 "/dictations/",
                 headers=auth_headers,
                 files={"audio": ("corrupted.wav", corrupted_file, "audio/wav")},
             )
 
-            assert response.status_code == 500
+            # Rejected by the header probe, before any LLM call
+            assert response.status_code == 400
+            assert "Invalid audio file" in response.json()["detail"]
+            mock_transcribe.assert_not_called()
 
     async def test_wrong_content_type_header(
         self, client: AsyncClient, auth_headers: dict
@@ -141,11 +142,10 @@ class TestAudioFileEdgeCases:
         assert "Unsupported file type" in response.json()["detail"]
 
     async def test_filename_without_extension(
-        self, client: AsyncClient, auth_headers: dict
+        self, client: AsyncClient, auth_headers: dict, sample_audio_data: bytes
     ):
         """Test file without extension in filename."""
-        audio_data = b"fake audio data"
-        audio_file = BytesIO(audio_data)
+        audio_file = BytesIO(sample_audio_data)
 
         with patch(
             "api.services.llm_service.LLMService.transcribe_audio"
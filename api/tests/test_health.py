@@ -1,5 +1,53 @@
+import asyncio
+import json
+import logging
+import signal
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from io import BytesIO, StringIO
+from unittest.mock import patch
+
 import pytest
 from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from api.config import settings
+from api.database import _connect_args, warm_pool
+from api.server import server_options
+from api.utils.db_metrics import (
+    MAX_TRACKED_STATEMENTS,
+    DatabaseMetrics,
+    InstrumentedAsyncPool,
+    instrument_engine,
+)
+from api.utils.lifecycle import Lifecycle, lifecycle
+from api.utils.logging import (
+    JSONFormatter,
+    RequestIdMiddleware,
+    SamplingFilter,
+    build_queue_logging,
+)
+from api.utils.loop_monitor import LoopLagMonitor, LoopStall, loop_monitor
+from api.utils.metrics import (
+    Counter,
+    Gauge,
+    Histogram,
+    MetricsRegistry,
+    dictation_stage_duration,
+    event_loop_blocked,
+    event_loop_lag,
+    http_request_duration,
+)
+from api.utils.profiler import ContinuousProfiler, SamplingProfiler
+from api.utils.timing import server_timing_header
+from api.utils.trace_report import TraceSpan, critical_path, main as trace_report
+from api.utils.tracing import Tracer, trace_engine
 
 
 class TestHealthEndpoints:
@@ -52,3 +100,767 @@ class TestHealthEndpoints:
         # ReDoc endpoint should return HTML
         assert response.status_code == 200
         assert "text/html" in response.headers.get("content-type", "")
+
+    @pytest.mark.asyncio
+    async def test_database_health_endpoint(self, client: AsyncClient):
+        """Test that pool state and query metrics are exposed."""
+        response = await client.get("/health/db")
+
+        assert response.status_code == 200
+        data = response.json()
+        assert {"size", "checked_out", "overflow", "idle"} <= set(data["pool"])
+        assert "checkout_wait" in data
+        assert "statements" in data
+
+
+class TestDatabaseMetrics:
+    """Test SQLAlchemy pool and statement instrumentation."""
+
+    @pytest.mark.asyncio
+    async def test_statement_and_checkout_metrics(self):
+        """Test that events record in-use counts and statement latency."""
+        engine = create_async_engine(
+            "sqlite+aiosqlite:///:memory:", poolclass=InstrumentedAsyncPool
+        )
+        metrics = DatabaseMetrics()
+        instrument_engine(engine, metrics)
+
+        async with engine.connect() as conn:
+            assert metrics.in_use == 1
+            await conn.execute(text("SELECT 1"))
+            await conn.execute(text("SELECT 1"))
+        await engine.dispose()
+
+        assert metrics.in_use == 0
+        assert metrics.checkouts == 1
+        assert metrics.statements["SELECT 1"].count == 2
+
+    def test_statement_keys_are_bounded(self):
+        """Test that distinct statements beyond the cap fold into 'other'."""
+        metrics = DatabaseMetrics()
+        for i in range(MAX_TRACKED_STATEMENTS + 5):
+            metrics.observe_statement(f"SELECT {i}", 1.0)
+
+        assert len(metrics.statements) == MAX_TRACKED_STATEMENTS + 1
+        assert metrics.statements["other"].count == 5
+
+
+class TestDatabaseDriverConfig:
+    """Test driver-specific engine configuration."""
+
+    def test_asyncpg_connect_args(self, monkeypatch):
+        """Test asyncpg gets its statement cache size and server-side timeout."""
+        monkeypatch.setattr(settings, "DB_ASYNCPG_STATEMENT_CACHE_SIZE", 0)
+        monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 5000)
+
+        assert _connect_args("asyncpg") == {
+            "prepared_statement_cache_size": 0,
+            "server_settings": {"statement_timeout": "5000"},
+        }
+
+    def test_psycopg_connect_args(self, monkeypatch):
+        """Test psycopg sets the timeout through libpq options."""
+        monkeypatch.setattr(settings, "DB_STATEMENT_TIMEOUT_MS", 5000)
+
+        assert _connect_args("psycopg") == {"options": "-c statement_timeout=5000"}
+
+    def test_database_url_uses_driver(self, monkeypatch):
+        """Test the configured driver selects the URL scheme."""
+        monkeypatch.setattr(settings, "DB_DRIVER", "asyncpg")
+
+        assert settings.DATABASE_URL.startswith("postgresql+asyncpg://")
+
+
+class TestMetrics:
+    """Test the Prometheus metrics registry and endpoint."""
+
+    def test_histogram_exposition(self):
+        """Test histograms render cumulative buckets, sum and count."""
+        registry = MetricsRegistry()
+        histogram = Histogram(
+            "job_seconds", "Job time.", ("kind",), registry=registry, buckets=(1, 5)
+        )
+        for value in (0.5, 1, 3, 10):
+            histogram.labels("a").observe(value)
+
+        lines = registry.render().splitlines()
+
+        assert lines[:2] == [
+            "# HELP job_seconds Job time.",
+            "# TYPE job_seconds histogram",
+        ]
+        assert 'job_seconds_bucket{kind="a",le="1"} 2' in lines
+        assert 'job_seconds_bucket{kind="a",le="5"} 3' in lines
+        assert 'job_seconds_bucket{kind="a",le="+Inf"} 4' in lines
+        assert 'job_seconds_sum{kind="a"} 14.5' in lines
+        assert 'job_seconds_count{kind="a"} 4' in lines
+
+    def test_counter_and_gauge_exposition(self):
+        """Test label escaping and scrape-time gauges."""
+        registry = MetricsRegistry()
+        counter = Counter("errors_total", "Errors.", ("reason",), registry=registry)
+        counter.labels('bad "input"\n').inc(2)
+        Gauge("queue_depth", "Depth.", registry=registry, function=lambda: 7)
+
+        output = registry.render()
+
+        assert 'errors_total{reason="bad \\"input\\"\\n"} 2' in output
+        assert "# TYPE queue_depth gauge\nqueue_depth 7\n" in output
+
+    def test_duplicate_metric_rejected(self):
+        """Test a name can only be registered once."""
+        registry = MetricsRegistry()
+        Counter("dupe_total", "First.", registry=registry)
+
+        with pytest.raises(ValueError):
+            Counter("dupe_total", "Second.", registry=registry)
+
+    async def test_metrics_endpoint(self, client: AsyncClient):
+        """Test request latency is labelled by route template."""
+        await client.get("/health")
+        await client.get("/no-such-path")
+
+        response = await client.get("/metrics")
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        body = response.text
+        assert (
+            'http_request_duration_seconds_count{method="GET",route="/health",status="200"}'
+            in body
+        )
+        assert 'route="unmatched",status="404"' in body
+        assert "# TYPE llm_tokens_total counter" in body
+
+    @patch("api.services.llm_service.LLMService.transcribe_audio")
+    @patch("api.services.llm_service.LLMService.format_transcript")
+    async def test_dictation_stage_metrics(
+        self,
+        mock_format,
+        mock_transcribe,
+        client: AsyncClient,
+        auth_headers: dict,
+        sample_audio_data: bytes,
+    ):
+        """Test each pipeline stage of a dictation is timed."""
+        mock_transcribe.return_value = "Transcript"
+        mock_format.return_value = "**Transcript**"
+        stages = [
+            "upload_read",
+            "probe",
+            "transcribe",
+            "preference_fetch",
+            "format",
+            "db_commit",
+        ]
+        before = {s: sum(dictation_stage_duration.labels(s).counts) for s in stages}
+        route = http_request_duration.labels("POST", "/dictations/", "201")
+        requests_before = sum(route.counts)
+
+        response = await client.post(
+            "/dictations/",
+            headers=auth_headers,
+            files={"audio": ("test.wav", BytesIO(sample_audio_data), "audio/wav")},
+        )
+
+        assert response.status_code == 201
+        for stage in stages:
+            assert (
+                sum(dictation_stage_duration.labels(stage).counts) == before[stage] + 1
+            )
+        assert sum(route.counts) == requests_before + 1
+
+    @patch("api.services.llm_service.LLMService.extract_user_preferences")
+    async def test_preference_stage_metrics(
+        self, mock_extract, client: AsyncClient, auth_headers: dict
+    ):
+        """Test preference extraction stages reach the stage histogram."""
+        mock_extract.return_value = "The user prefers bullet points."
+        stages = ["auth", "preference_fetch", "extract", "db_commit"]
+        before = {s: sum(dictation_stage_duration.labels(s).counts) for s in stages}
+
+        response = await client.post(
+            "/dictations/preference_extract",
+            headers=auth_headers,
+            params={"original_text": "Original", "edited_text": "Edited"},
+        )
+
+        assert response.status_code == 200
+        for stage in stages:
+            assert sum(dictation_stage_duration.labels(stage).counts) > before[stage]
+
+
+def _server_timing(response) -> dict:
+    entries = {}
+    for entry in response.headers["server-timing"].split(", "):
+        name, _, duration = entry.partition(";dur=")
+        entries[name] = float(duration)
+    return entries
+
+
+class TestServerTiming:
+    """Test per-request stage timings."""
+
+    def test_header_sums_repeated_spans(self):
+        """Test spans with the same name are reported once, summed."""
+        header = server_timing_header(
+            [("auth", 0.002), ("format", 0.5), ("format", 0.25)], 1.0
+        )
+
+        assert header == "auth;dur=2.0, format;dur=750.0, total;dur=1000.0"
+
+    @patch("api.services.llm_service.LLMService.transcribe_audio")
+    @patch("api.services.llm_service.LLMService.format_transcript")
+    async def test_dictation_stages(
+        self,
+        mock_format,
+        mock_transcribe,
+        client: AsyncClient,
+        auth_headers: dict,
+        sample_audio_data: bytes,
+        caplog,
+    ):
+        """Test a dictation reports every stage in the header and the log."""
+        mock_transcribe.return_value = "Transcript"
+        mock_format.return_value = "**Transcript**"
+
+        with caplog.at_level(logging.INFO, logger="api.utils.timing"):
+            response = await client.post(
+                "/dictations/",
+                headers=auth_headers,
+                files={"audio": ("test.wav", BytesIO(sample_audio_data), "audio/wav")},
+            )
+
+        assert response.status_code == 201
+        timings = _server_timing(response)
+        for stage in (
+            "auth",
+            "upload_read",
+            "probe",
+            "transcribe",
+            "preference_fetch",
+            "format",
+            "db_commit",
+            "total",
+        ):
+            assert stage in timings
+        assert timings["total"] >= timings["transcribe"]
+
+        [record] = [r for r in caplog.records if hasattr(r, "timing")]
+        assert record.timing["path"] == "/dictations/"
+        assert record.timing["status"] == 201
+        assert "transcribe" in record.timing["spans_ms"]
+        assert "transcribe_ms=" in record.getMessage()
+
+    @patch("api.services.llm_service.LLMService.extract_user_preferences")
+    async def test_preference_extract_stages(
+        self, mock_extract, client: AsyncClient, auth_headers: dict
+    ):
+        """Test preference extraction reports its stages."""
+        mock_extract.return_value = "The user prefers bullet points."
+
+        response = await client.post(
+            "/dictations/preference_extract",
+            headers=auth_headers,
+            params={"original_text": "Original", "edited_text": "Edited"},
+        )
+
+        assert response.status_code == 200
+        assert set(_server_timing(response)) == {
+            "auth",
+            "preference_fetch",
+            "extract",
+            "db_commit",
+            "total",
+        }
+
+    async def test_untimed_request(self, client: AsyncClient):
+        """Test requests without spans still carry the total."""
+        response = await client.get("/health")
+
+        assert response.headers["server-timing"].startswith("total;dur=")
+
+
+class TestTracing:
+    """Test local span tracing and the trace report."""
+
+    def test_nested_spans(self, tmp_path):
+        """Test spans link to their parent and record errors."""
+        tracer = Tracer(tmp_path)
+
+        with tracer.span("request") as root:
+            with tracer.span("stage", bytes=10):
+                tracer.annotate_root(user_id=7)
+            with pytest.raises(ValueError):
+                with tracer.span("failing"):
+                    raise ValueError("boom")
+
+        stage, failing, request = tracer.finished
+        assert request is root and request.parent_id is None
+        assert stage.parent_id == failing.parent_id == root.span_id
+        assert stage.trace_id == root.trace_id
+        assert stage.attributes == {"bytes": 10}
+        assert root.attributes == {"user_id": 7}
+        assert failing.status == "error"
+
+    def test_ring_buffer_keeps_newest(self, tmp_path):
+        """Test the buffer overwrites the oldest spans when full."""
+        tracer = Tracer(tmp_path, buffer_size=2)
+
+        for name in ("a", "b", "c"):
+            with tracer.span(name):
+                pass
+
+        assert [span.name for span in tracer.finished] == ["b", "c"]
+        assert tracer.dropped == 1
+
+    def test_flush_rotates_files(self, tmp_path):
+        """Test spans are appended as JSON lines and files rotate."""
+        tracer = Tracer(tmp_path, max_bytes=1, backup_count=2)
+
+        for batch in range(3):
+            with tracer.span(f"batch-{batch}"):
+                pass
+            assert tracer.flush() == 1
+
+        files = sorted(p.name for p in tmp_path.iterdir())
+        assert files == [f"{tracer.path.name}.1", f"{tracer.path.name}.2"]
+        assert b'"name":"batch-2"' in (tmp_path / files[0]).read_bytes()
+        assert not tracer.finished
+
+    async def test_sql_statements_traced(self, tmp_path):
+        """Test statements run inside a span become db.query children."""
+        engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+        tracer = Tracer(tmp_path)
+        trace_engine(engine, tracer)
+
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))  # outside any trace
+            with tracer.span("request") as root:
+                await conn.execute(text("SELECT 2"))
+        await engine.dispose()
+
+        query, request = tracer.finished
+        assert query.name == "db.query"
+        assert query.parent_id == root.span_id
+        assert query.attributes["statement"] == "SELECT 2"
+
+    @patch("api.services.llm_service.LLMService.transcribe_audio")
+    @patch("api.services.llm_service.LLMService.format_transcript")
+    async def test_request_trace(
+        self,
+        mock_format,
+        mock_transcribe,
+        client: AsyncClient,
+        auth_headers: dict,
+        sample_audio_data: bytes,
+        isolated_tracer: Tracer,
+    ):
+        """Test a dictation produces one trace rooted at its route."""
+        mock_transcribe.return_value = "Transcript"
+        mock_format.return_value = "**Transcript**"
+        isolated_tracer.finished.clear()
+
+        await client.post(
+            "/dictations/",
+            headers=auth_headers,
+            files={"audio": ("test.wav", BytesIO(sample_audio_data), "audio/wav")},
+        )
+
+        [root] = [s for s in isolated_tracer.finished if s.parent_id is None]
+        assert root.name == "POST /dictations/"
+        assert root.attributes["status_code"] == 201
+        assert "user_id" in root.attributes
+        names = {
+            s.name for s in isolated_tracer.finished if s.trace_id == root.trace_id
+        }
+        assert {"auth", "upload_read", "probe", "transcribe", "format"} <= names
+        [upload] = [s for s in isolated_tracer.finished if s.name == "upload_read"]
+        assert upload.attributes["bytes"] == len(sample_audio_data)
+
+    def test_critical_path_skips_concurrent_work(self):
+        """Test the critical path follows the chain that set the end time."""
+
+        def span(name, start, end, parent=None):
+            return TraceSpan(name, "t", parent, name, start, end - start, "ok", {})
+
+        root = span("root", 0, 100)
+        transcribe = span("transcribe", 0, 30, "root")
+        index = span("index", 10, 20, "root")  # ran alongside transcribe
+        fmt = span("format", 30, 90, "root")
+        query = span("db.query", 40, 45, "format")
+        fmt.children = [query]
+        root.children = [transcribe, index, fmt]
+
+        path = [(s.name, ms) for s, ms in critical_path(root)]
+
+        assert path == [
+            ("root", 10),
+            ("transcribe", 30),
+            ("format", 55),
+            ("db.query", 5),
+        ]
+
+    def test_report(self, tmp_path, capsys):
+        """Test the report reads trace files and lists critical paths."""
+        tracer = Tracer(tmp_path)
+        with tracer.span("GET /slow"):
+            with tracer.span("transcribe"):
+                pass
+        tracer.flush()
+
+        assert trace_report([str(tmp_path), "--top", "3"]) == 0
+
+        output = capsys.readouterr().out
+        assert "1 traces, 2 spans" in output
+        assert "Critical paths of the 3 slowest traces" in output
+        assert "transcribe" in output
+
+    def test_report_without_files(self, tmp_path):
+        """Test the report fails cleanly on an empty directory."""
+        assert trace_report([str(tmp_path)]) == 1
+
+
+def _busy_until(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class TestProfiler:
+    """Test the sampling profiler and its admin endpoint."""
+
+    def test_samples_other_threads(self):
+        """Test a busy thread's function shows up in the collapsed stacks."""
+        stop = threading.Event()
+        worker = threading.Thread(target=_busy_until, args=(stop,), name="busy")
+        worker.start()
+        profiler = SamplingProfiler(interval=0.002)
+        profiler.start()
+        time.sleep(0.1)
+        profiler.stop()
+        stop.set()
+        worker.join()
+
+        assert profiler.samples > 0
+        busy = [s for s in profiler.stacks if s.startswith("busy;")]
+        assert busy and all("_busy_until (" in s for s in busy)
+        assert not any(s.startswith("sampling-profiler;") for s in profiler.stacks)
+        for line in profiler.collapsed().splitlines():
+            stack, count = line.rsplit(" ", 1)
+            assert int(count) > 0
+
+    def test_continuous_snapshots(self, tmp_path):
+        """Test snapshots reset the counts and old files are pruned."""
+        profiler = ContinuousProfiler(tmp_path, keep=2)
+
+        paths = []
+        for i in range(3):
+            profiler.stacks[f"MainThread;f{i}"] += 1
+            paths.append(profiler.write_snapshot())
+            time.sleep(0.01)
+
+        assert not profiler.stacks
+        assert profiler.write_snapshot() is None
+        remaining = sorted(tmp_path.iterdir())
+        assert len(remaining) <= 2
+        assert paths[-1] in remaining
+        assert paths[-1].read_text() == "MainThread;f2 1\n"
+
+    async def test_profile_requires_admin_token(self, client: AsyncClient, monkeypatch):
+        """Test the endpoint is hidden without a token and guarded with one."""
+        response = await client.get("/admin/profile", params={"seconds": 0.01})
+        assert response.status_code == 404
+
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "s3cret")
+        response = await client.get(
+            "/admin/profile",
+            params={"seconds": 0.01},
+            headers={"X-Admin-Token": "wrong"},
+        )
+        assert response.status_code == 403
+
+    async def test_profile(self, client: AsyncClient, monkeypatch):
+        """Test an on-demand profile returns collapsed stacks."""
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "s3cret")
+        headers = {"X-Admin-Token": "s3cret"}
+
+        response = await client.get(
+            "/admin/profile",
+            params={"seconds": 0.1, "interval_ms": 2},
+            headers=headers,
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert int(response.headers["x-profile-samples"]) > 0
+        assert "MainThread;" in response.text
+
+        response = await client.get(
+            "/admin/profile",
+            params={"seconds": settings.PROFILER_MAX_SECONDS + 1},
+            headers=headers,
+        )
+        assert response.status_code == 400
+
+
+def _block_loop(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+class TestLoopMonitor:
+    """Test the event-loop lag monitor."""
+
+    async def test_blocking_call_caught(self, caplog):
+        """Test a blocking call is counted and logged with its stack."""
+        blocked_before = event_loop_blocked.labels().value
+        monitor = LoopLagMonitor(interval=0.01, threshold=0.05)
+        monitor.start()
+        await asyncio.sleep(0.03)
+        with caplog.at_level(logging.WARNING, logger="api.utils.loop_monitor"):
+            _block_loop(0.3)
+            await asyncio.sleep(0.05)
+        await monitor.stop()
+
+        assert len(monitor.stalls) == 1
+        stall = monitor.stalls[0]
+        assert stall.lag_ms >= 200
+        assert "_block_loop" in "".join(stall.stack)
+        assert event_loop_blocked.labels().value == blocked_before + 1
+        assert "_block_loop" in caplog.text
+
+    async def test_idle_loop_records_lag(self):
+        """Test an idle loop records lag without reporting stalls."""
+        observed_before = sum(event_loop_lag.labels().counts)
+        monitor = LoopLagMonitor(interval=0.01, threshold=1.0)
+        monitor.start()
+        await asyncio.sleep(0.1)
+        await monitor.stop()
+
+        assert sum(event_loop_lag.labels().counts) > observed_before
+        assert not monitor.stalls
+        await monitor.stop()  # stopping twice is harmless
+
+    async def test_loop_stalls_endpoint(self, client: AsyncClient, monkeypatch):
+        """Test recent stalls are listed newest first."""
+        monkeypatch.setattr(settings, "ADMIN_TOKEN", "s3cret")
+        at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        stalls = deque(
+            [
+                LoopStall(at=at, lag_ms=120.04, stack=["old\n"]),
+                LoopStall(at=at, lag_ms=300.0, stack=[]),
+            ]
+        )
+        monkeypatch.setattr(loop_monitor, "stalls", stalls)
+
+        response = await client.get(
+            "/admin/loop-stalls", headers={"X-Admin-Token": "s3cret"}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert [stall["lag_ms"] for stall in data] == [300.0, 120.0]
+        assert data[1]["stack"] == ["old\n"]
+
+
+def _queue_logger(name: str, **kwargs):
+    stream = StringIO()
+    handler, listener = build_queue_logging(stream, JSONFormatter(), **kwargs)
+    logger = logging.getLogger(name)
+    logger.addHandler(handler)
+    logger.setLevel(logging.DEBUG)
+    logger.propagate = False
+    return logger, handler, listener, stream
+
+
+def _json_lines(stream: StringIO) -> list:
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+class TestLogging:
+    """Test queued JSON logging, request ids and sampling."""
+
+    def test_records_written_by_listener(self):
+        """Test records are formatted as JSON on the listener thread."""
+        logger, handler, listener, stream = _queue_logger("test.logging.json")
+        listener.start()
+        values = ["a"]
+        logger.info("Got %s", values, extra={"timing": {"total_ms": 1.5}})
+        values.append("b")  # the message was resolved when it was logged
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Failed")
+        listener.stop()
+        logger.removeHandler(handler)
+
+        first, second = _json_lines(stream)
+        assert first["message"] == "Got ['a']"
+        assert first["level"] == "INFO"
+        assert first["logger"] == "test.logging.json"
+        assert first["request_id"] == "-"
+        assert first["timing"] == {"total_ms": 1.5}
+        assert second["level"] == "ERROR"
+        assert "ValueError: boom" in second["exception"]
+
+    def test_full_queue_drops_records(self):
+        """Test logging never waits on a full queue, and drops are reported."""
+        logger, handler, listener, stream = _queue_logger(
+            "test.logging.full", queue_size=2
+        )
+        for i in range(4):
+            logger.info("Record %d", i)
+        assert handler.dropped == 2
+
+        listener.start()
+        time.sleep(0.05)
+        logger.info("After")
+        listener.stop()
+        logger.removeHandler(handler)
+
+        messages = [line["message"] for line in _json_lines(stream)]
+        assert messages == [
+            "Record 0",
+            "Record 1",
+            "Log queue full, dropped 2 records",
+            "After",
+        ]
+
+    def test_sampling_by_logger_prefix(self):
+        """Test rates apply to child loggers and never to warnings."""
+        sampling = SamplingFilter({"api.services": 0.0, "api.services.llm": 1.0})
+
+        assert sampling.rate("api.services.audio_service") == 0.0
+        assert sampling.rate("api.services.llm") == 1.0
+        assert sampling.rate("api.auth") == 1.0
+
+        debug = logging.makeLogRecord(
+            {"name": "api.services.audio_service", "levelno": logging.DEBUG}
+        )
+        warning = logging.makeLogRecord(
+            {"name": "api.services.audio_service", "levelno": logging.WARNING}
+        )
+        assert not sampling.filter(debug)
+        assert sampling.filter(warning)
+
+    async def test_request_id_on_records(self):
+        """Test records logged during a request carry its id."""
+        logger, handler, listener, stream = _queue_logger("test.logging.request")
+        listener.start()
+
+        async def app(scope, receive, send):
+            logger.info("Handling")
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {"type": "http", "headers": [(b"x-request-id", b"abc-123")]}
+        await RequestIdMiddleware(app)(scope, None, send)
+        listener.stop()
+        logger.removeHandler(handler)
+
+        assert (b"x-request-id", b"abc-123") in sent[0]["headers"]
+        [line] = _json_lines(stream)
+        assert line["request_id"] == "abc-123"
+
+    async def test_request_id_header(self, client: AsyncClient):
+        """Test an id is made up unless the client sends a valid one."""
+        response = await client.get("/health")
+        generated = response.headers["x-request-id"]
+        assert len(generated) == 16
+
+        response = await client.get("/health", headers={"X-Request-ID": "req-42"})
+        assert response.headers["x-request-id"] == "req-42"
+
+        response = await client.get("/health", headers={"X-Request-ID": "bad id!"})
+        assert response.headers["x-request-id"] != "bad id!"
+
+
+class TestStartup:
+    """Test heavy dependencies stay off the startup path."""
+
+    def test_deferred_modules_not_imported(self):
+        """Test importing the app leaves LLM, JWT and hashing libraries unloaded."""
+        deferred = ("openai", "langsmith", "langchain", "jose", "passlib")
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, api.main; "
+                f"print([name for name in {deferred!r} if name in sys.modules])",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+
+        assert result.stdout.strip() == "[]"
+
+
+class TestLifecycle:
+    """Test readiness, draining and the production server settings."""
+
+    @pytest.mark.asyncio
+    async def test_ready_endpoint(self, client: AsyncClient, monkeypatch):
+        """Test readiness follows the worker's lifecycle state."""
+        response = await client.get("/health/ready")
+        assert response.status_code == 503
+        assert response.json() == {"status": "starting"}
+
+        monkeypatch.setattr(lifecycle, "ready", True)
+        response = await client.get("/health/ready")
+        assert response.status_code == 200
+        assert response.json() == {"status": "ready"}
+
+        monkeypatch.setattr(lifecycle, "draining", True)
+        response = await client.get("/health/ready")
+        assert response.status_code == 503
+        assert response.json() == {"status": "draining"}
+
+    @pytest.mark.asyncio
+    async def test_signal_drains_then_delegates(self):
+        """Test SIGTERM marks the worker draining and reaches the old handler later."""
+        received = []
+        original = signal.signal(signal.SIGTERM, lambda *args: received.append(args))
+        interrupt = signal.getsignal(signal.SIGINT)
+        state = Lifecycle()
+        try:
+            state.watch_signals(delay=0.05)
+            signal.raise_signal(signal.SIGTERM)
+            await asyncio.sleep(0)
+
+            assert state.state == "draining"
+            assert received == []
+
+            await asyncio.sleep(0.1)
+            assert [signum for signum, _ in received] == [signal.SIGTERM]
+        finally:
+            signal.signal(signal.SIGTERM, original)
+            signal.signal(signal.SIGINT, interrupt)
+
+    @pytest.mark.asyncio
+    async def test_warm_pool_opens_connections(self, tmp_path):
+        """Test warming leaves the requested connections idle in the pool."""
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{tmp_path / 'warm.db'}",
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=3,
+        )
+        await warm_pool(engine, 3)
+
+        assert engine.pool.checkedin() == 3
+        await engine.dispose()
+
+    def test_server_options(self, monkeypatch):
+        """Test workers default to the CPU count and logging stays with the app."""
+        monkeypatch.setattr(settings, "WEB_WORKERS", 0)
+        monkeypatch.setattr("os.cpu_count", lambda: 6)
+        options = server_options()
+
+        assert options["workers"] == 6
+        assert options["lifespan"] == "on"
+        assert options["log_config"] is None
+        assert options["timeout_graceful_shutdown"] == settings.WEB_GRACEFUL_TIMEOUT
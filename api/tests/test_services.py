@@ -1,11 +1,33 @@
+import asyncio
+import multiprocessing
+import os
+from io import BytesIO
+from types import SimpleNamespace
+
 import pytest
 from unittest.mock import AsyncMock, Mock, patch
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from api.services.llm_service import LLMService
+import numpy as np
+
+from api.config import settings
+from api.services.embedding_service import EmbeddingIndex, HashingEmbedder
+from api.services.ledger_service import LedgerWriter, ledger_writer
+from api.services.llm_service import LLMService, prompt_version
 from api.services.audio_service import AudioService, PreferencesService
-from api.models import UserModel, DictationsModel, UserPreferencesModel, UserEditsModel
-from api.schemas import UserEditsInput
+from api.repositories.preferences import PreferencesRepository
+from api.models import (
+    UserModel,
+    DictationsModel,
+    OperationLedgerModel,
+    UserPreferencesModel,
+    UserEditsModel,
+    UserRuleBlockModel,
+)
+from api.schemas import UserEditsInput, UserPreferencesCreate
+from api.utils.ledger import LedgerEntry
+from api.utils.metrics import llm_tokens
 
 
 class TestLLMService:
@@ -14,28 +36,13 @@ class TestLLMService:
     @pytest.fixture
     def llm_service(self):
         """Create LLM service instance."""
-        with patch("api.services.llm_service.LangSmithClient"):
-            with patch("api.services.llm_service.wrap_openai"):
-                return LLMService()
-
-    @patch("api.services.llm_service.tempfile.NamedTemporaryFile")
-    @patch("builtins.open")
-    async def test_transcribe_audio_success(
-        self, mock_open, mock_tempfile, llm_service
-    ):
-        """Test successful audio transcription."""
-        # Mock tempfile with context manager support
-        mock_file = Mock()
-        mock_file.name = "/tmp/test.mpga"
-        mock_file.write = Mock()
-        mock_tempfile.return_value.__enter__ = Mock(return_value=mock_file)
-        mock_tempfile.return_value.__exit__ = Mock(return_value=None)
-
-        # Mock file open for reading
-        mock_audio_file = Mock()
-        mock_open.return_value.__enter__ = Mock(return_value=mock_audio_file)
-        mock_open.return_value.__exit__ = Mock(return_value=None)
+        service = LLMService()
+        service.openai_client = Mock()
+        service.langsmith_client = Mock()
+        return service
 
+    async def test_transcribe_audio_success(self, llm_service):
+        """Test successful audio transcription."""
         # Mock OpenAI response
         mock_transcription = Mock()
         mock_transcription.text = "This is a test transcription."
@@ -47,6 +54,20 @@ class TestLLMService:
 
         assert result == "This is a test transcription."
 
+    async def test_transcribe_audio_streams_file(self, llm_service):
+        """Test that a file object is passed through without copying."""
+        mock_transcription = Mock()
+        mock_transcription.text = "This is a test transcription."
+        create = AsyncMock(return_value=mock_transcription)
+        llm_service.openai_client.audio.transcriptions.create = create
+
+        audio_file = BytesIO(b"fake audio data")
+        await llm_service.transcribe_audio(audio_file)
+
+        filename, content = create.call_args.kwargs["file"]
+        assert filename.endswith(".mpga")
+        assert content is audio_file
+
     async def test_transcribe_audio_failure(self, llm_service):
         """Test audio transcription failure."""
         # Mock OpenAI failure
@@ -68,15 +89,36 @@ class TestLLMService:
         mock_response = Mock()
         mock_response.choices = [Mock()]
         mock_response.choices[0].message.content = "**Formatted transcript**"
+        mock_response.model = "gpt-test"
+        mock_response.usage = Mock(
+            prompt_tokens=120, completion_tokens=30, prompt_tokens_details=None
+        )
         llm_service.openai_client.chat.completions.create = AsyncMock(
             return_value=mock_response
         )
 
-        result = await llm_service.format_transcript(
-            "Raw transcript", ["User prefers bold headers"]
-        )
+        prompt_tokens = llm_tokens.labels("gpt-test", "prompt")
+        before = prompt_tokens.value
+
+        mock_prompt.metadata = {"lc_hub_commit_hash": "0123456789abcdef"}
+
+        with ledger_writer.track("dictation", 1) as entry:
+            result = await llm_service.format_transcript(
+                "Raw transcript", "User prefers bold headers"
+            )
 
         assert result == "**Formatted transcript**"
+        assert prompt_tokens.value == before + 120
+        assert entry.prompt_version == f"{settings.FORMAT_PROMPT}:0123456789ab"
+
+    def test_prompt_version_without_commit(self):
+        """Test prompts without a LangSmith commit are told apart by content."""
+        first = prompt_version("format", SimpleNamespace(template="Format {x}"))
+        same = prompt_version("format", SimpleNamespace(template="Format {x}"))
+        edited = prompt_version("format", SimpleNamespace(template="Format: {x}"))
+
+        assert first == same != edited
+        assert first.startswith("format:")
 
     async def test_extract_user_preferences_success(self, llm_service):
         """Test successful preference extraction."""
@@ -91,12 +133,13 @@ class TestLLMService:
         mock_response.choices[0].message.content = (
             '{"memory_to_write": "User prefers bullet points"}'
         )
+        mock_response.usage = None
         llm_service.openai_client.chat.completions.create = AsyncMock(
             return_value=mock_response
         )
 
         result = await llm_service.extract_user_preferences(
-            "Original text", "Edited text with bullets", ["Existing preference"]
+            "Original text", "Edited text with bullets", "Existing preference"
         )
 
         assert result == "User prefers bullet points"
@@ -112,14 +155,25 @@ class TestLLMService:
         mock_response = Mock()
         mock_response.choices = [Mock()]
         mock_response.choices[0].message.content = '{"memory_to_write": false}'
+        mock_response.usage = None
         llm_service.openai_client.chat.completions.create = AsyncMock(
             return_value=mock_response
         )
 
-        result = await llm_service.extract_user_preferences("Original", "Same text", [])
+        result = await llm_service.extract_user_preferences("Original", "Same text", "")
 
         assert result is None
 
+    async def test_prompts_cached(self, llm_service):
+        """Test loaded prompts are reused instead of pulled per request."""
+        await llm_service.load_prompts()
+        assert llm_service.langsmith_client.pull_prompt.call_count == 2
+
+        prompt = await llm_service.pull_prompt(settings.FORMAT_PROMPT)
+
+        assert prompt is llm_service.langsmith_client.pull_prompt.return_value
+        assert llm_service.langsmith_client.pull_prompt.call_count == 2
+
 
 class TestAudioService:
     """Test audio service functionality."""
@@ -173,7 +227,7 @@ class TestAudioService:
 
         # Verify format_transcript was called with preferences
         mock_llm.format_transcript.assert_called_once_with(
-            "Test transcription", ["User prefers bullet points"]
+            "Test transcription", "User prefers bullet points"
         )
 
     @patch("api.services.audio_service.LLMService")
@@ -193,6 +247,30 @@ class TestAudioService:
         with pytest.raises(Exception):
             await audio_service.process_audio(b"fake audio", test_user.id)
 
+    async def test_closing_batch_waits_for_cancelled_files(
+        self, audio_service, test_user
+    ):
+        """Test that abandoning a batch cancels the remaining files and waits."""
+        cancelled = asyncio.Event()
+
+        async def quick():
+            raise ValueError("Invalid audio")
+
+        async def stuck():
+            try:
+                await asyncio.Event().wait()
+            finally:
+                # Cleanup that must finish before the session is handed back
+                await asyncio.sleep(0)
+                cancelled.set()
+
+        results = await audio_service.process_batch([quick, stuck], test_user.id)
+        index, outcome = await results.__anext__()
+        await results.aclose()
+
+        assert index == 0 and isinstance(outcome, ValueError)
+        assert cancelled.is_set()
+
 
 class TestPreferencesService:
     """Test preferences service functionality."""
@@ -280,14 +358,286 @@ class TestPreferencesService:
         assert "Second preference" in rules
 
 
+class TestPreferencesRepository:
+    """Test preferences repository functionality."""
+
+    @pytest.fixture
+    def repository(self, test_db):
+        """Create preferences repository instance."""
+        return PreferencesRepository(test_db)
+
+    async def test_rule_block_empty(self, repository, test_user):
+        """Test rule block for a user without preferences."""
+        assert await repository.get_rule_block(test_user.id) == ""
+
+    async def test_add_preference_updates_rule_block(
+        self, repository, test_user, test_db
+    ):
+        """Test that writes keep the precompiled rule block current."""
+        for i, rules in enumerate(["First rule", "Second rule"], start=1):
+            await repository.add_preference(
+                UserPreferencesCreate(
+                    user_id=test_user.id, user_edits_id=i, rules=rules
+                ),
+                await repository.get_rule_block(test_user.id),
+            )
+        await test_db.commit()
+
+        block = await test_db.get(UserRuleBlockModel, test_user.id)
+        assert block.rule_block == "First rule\nSecond rule"
+        assert block.rule_count == 2
+        assert await repository.get_rule_block(test_user.id) == block.rule_block
+
+    async def test_add_preference_appends_to_stored_block(
+        self, repository, test_user, test_db
+    ):
+        """Test that a stale rule block read does not drop concurrent rules."""
+        stale_block = await repository.get_rule_block(test_user.id)
+        for i, rules in enumerate(["First rule", "Second rule"], start=1):
+            await repository.add_preference(
+                UserPreferencesCreate(
+                    user_id=test_user.id, user_edits_id=i, rules=rules
+                ),
+                stale_block,
+            )
+        await test_db.commit()
+
+        block = await test_db.get(UserRuleBlockModel, test_user.id)
+        await test_db.refresh(block)
+        assert block.rule_block == "First rule\nSecond rule"
+        assert block.rule_count == 2
+
+    async def test_add_preference_keeps_legacy_rules(
+        self, repository, test_user, test_db
+    ):
+        """Test the first write for a user whose rules predate the block."""
+        test_db.add(
+            UserPreferencesModel(user_id=test_user.id, user_edits_id=1, rules="Old")
+        )
+        await test_db.commit()
+
+        await repository.add_preference(
+            UserPreferencesCreate(user_id=test_user.id, user_edits_id=2, rules="New"),
+            await repository.get_rule_block(test_user.id),
+        )
+        await test_db.commit()
+
+        block = await test_db.get(UserRuleBlockModel, test_user.id)
+        assert block.rule_block == "Old\nNew"
+        assert block.rule_count == 2
+
+    async def test_rule_block_falls_back_to_rules(self, repository, test_user, test_db):
+        """Test rule block for preferences written before the block existed."""
+        test_db.add(
+            UserPreferencesModel(user_id=test_user.id, user_edits_id=1, rules="Old")
+        )
+        await test_db.commit()
+
+        assert await repository.get_rule_block(test_user.id) == "Old"
+
+    async def test_list_preferences_ordered(self, repository, test_user, test_db):
+        """Test preferences are listed in insertion order."""
+        for i in range(3):
+            test_db.add(
+                UserPreferencesModel(
+                    user_id=test_user.id, user_edits_id=i, rules=f"Rule {i}"
+                )
+            )
+        await test_db.commit()
+
+        result = await repository.list_preferences(test_user.id)
+
+        assert [pref.rules for pref in result] == ["Rule 0", "Rule 1", "Rule 2"]
+        assert all(pref.user_id == test_user.id for pref in result)
+
+
+class TestLedgerWriter:
+    """Test batched ledger writes."""
+
+    def test_track_records_error(self):
+        """Test an operation that raises is queued as an error."""
+        writer = LedgerWriter(session_factory=None)
+
+        with pytest.raises(ValueError):
+            with writer.track("dictation", 1):
+                raise ValueError("boom")
+
+        [entry] = writer.pending
+        assert entry.status == "error"
+        assert entry.total_ms >= 0
+
+    def test_drops_oldest_beyond_max_pending(self):
+        """Test the buffer is bounded."""
+        writer = LedgerWriter(session_factory=None, max_pending=2)
+
+        for user_id in range(3):
+            writer.record(LedgerEntry(operation="dictation", user_id=user_id))
+
+        assert [entry.user_id for entry in writer.pending] == [1, 2]
+        assert writer.dropped == 1
+
+    async def test_failed_flush_drops_batch(self):
+        """Test a database error does not keep entries pending forever."""
+
+        def broken_session():
+            raise RuntimeError("database down")
+
+        writer = LedgerWriter(session_factory=broken_session)
+        writer.record(LedgerEntry(operation="dictation", user_id=1))
+
+        assert await writer.flush() == 0
+        assert not writer.pending
+
+    async def test_background_flush_on_full_batch(
+        self, test_db: AsyncSession, isolated_ledger: LedgerWriter
+    ):
+        """Test a full batch is written without waiting for the interval."""
+        user = UserModel(email="ledger@example.com", hashed_password="x")
+        test_db.add(user)
+        await test_db.commit()
+        writer = LedgerWriter(
+            session_factory=isolated_ledger.session_factory,
+            batch_size=2,
+            flush_interval=60,
+        )
+        writer.start()
+        try:
+            for _ in range(2):
+                writer.record(LedgerEntry(operation="dictation", user_id=user.id))
+            for _ in range(50):
+                await asyncio.sleep(0.01)
+                if not writer.pending:
+                    break
+        finally:
+            await writer.stop()
+
+        rows = (await test_db.execute(select(OperationLedgerModel))).scalars().all()
+        assert len(rows) == 2
+
+
+class TestEmbeddingIndex:
+    """Test the local similar-note index."""
+
+    @pytest.fixture
+    def index(self, tmp_path):
+        """Create an index in a temporary directory."""
+        index = EmbeddingIndex(tmp_path, dim=256)
+        index.add_batch(
+            1,
+            [10, 11, 12],
+            [
+                "Knee pain after running, plan physiotherapy and ibuprofen",
+                "Type 2 diabetes review, continue metformin, check HbA1c",
+                "Diabetes follow up, metformin dose increased, HbA1c improving",
+            ],
+        )
+        return index
+
+    def test_embeddings_are_unit_length(self):
+        """Test vectors are normalised so dot product is cosine."""
+        vectors = HashingEmbedder(128).embed_batch(["some clinical note", ""])
+
+        assert vectors.dtype == np.float32
+        assert np.isclose(np.linalg.norm(vectors[0]), 1.0)
+        assert not vectors[1].any()
+
+    def test_similar_ranks_related_notes_first(self, index):
+        """Test related notes outrank unrelated ones."""
+        matches = index.similar(1, "metformin for diabetes, HbA1c", k=3)
+
+        assert [match_id for match_id, _ in matches[:2]] in ([11, 12], [12, 11])
+        assert matches[0][1] >= matches[1][1] >= matches[2][1]
+
+    def test_similar_excludes_source(self, index):
+        """Test the query note is not returned as its own match."""
+        matches = index.similar(1, "Diabetes follow up", k=5, exclude_id=12)
+
+        assert 12 not in [match_id for match_id, _ in matches]
+
+    def test_batch_search(self, index):
+        """Test several queries are answered in one call."""
+        queries = index.embedder.embed_batch(["knee pain", "metformin"])
+
+        results = index.search(1, queries, k=1)
+
+        assert results[0][0][0] == 10
+        assert results[1][0][0] in (11, 12)
+
+    def test_index_is_per_user(self, index):
+        """Test users without notes get no matches."""
+        assert index.similar(2, "metformin", k=3) == []
+
+    def test_appends_are_visible(self, index):
+        """Test memory-mapped reads pick up newly appended notes."""
+        index.similar(1, "asthma", k=1)
+        index.add(1, 13, "Asthma review, salbutamol inhaler technique checked")
+
+        assert index.similar(1, "asthma salbutamol", k=1)[0][0] == 13
+
+    def test_concurrent_workers_keep_ids_aligned(self, tmp_path):
+        """Test appends from several processes keep each id with its vector."""
+        context = multiprocessing.get_context("fork")
+
+        def append(worker: int) -> None:
+            index = EmbeddingIndex(tmp_path, dim=64)
+            for batch in range(20):
+                ids = [worker * 1000 + batch * 5 + i for i in range(5)]
+                index.add_batch(1, ids, [f"note {i} " * 50 for i in ids])
+
+        workers = [context.Process(target=append, args=(n,)) for n in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        index = EmbeddingIndex(tmp_path, dim=64)
+        vectors, ids = index._load(1)
+        assert len(ids) == 400
+        expected = index.embedder.embed_batch([f"note {i} " * 50 for i in ids])
+        assert np.array_equal(vectors, expected)
+
+    def test_append_drops_unlabelled_row(self, index):
+        """Test a vector left by a crash between writes is not mislabelled."""
+        vectors_path, _ = index._paths(1)
+        with open(vectors_path, "ab") as f:
+            f.write(np.ones(index.dim, dtype=np.float32).tobytes())
+
+        index.add(1, 13, "Asthma review, salbutamol inhaler technique checked")
+
+        vectors, ids = index._load(1)
+        assert list(ids) == [10, 11, 12, 13]
+        assert np.array_equal(
+            vectors[3],
+            index.embedder.embed("Asthma review, salbutamol inhaler technique checked"),
+        )
+
+    def test_cached_maps_are_bounded(self, tmp_path):
+        """Test searching many users keeps only a few memory maps open."""
+        index = EmbeddingIndex(tmp_path, dim=64, max_maps=3)
+        for user_id in range(20):
+            index.add(user_id, user_id, f"note for user {user_id}")
+        open_fds = len(os.listdir("/proc/self/fd"))
+
+        for user_id in range(20):
+            assert index.similar(user_id, "note", k=1)[0][0] == user_id
+
+        assert len(index._maps) == 3
+        assert len(os.listdir("/proc/self/fd")) <= open_fds + 2 * 3
+
+    def test_rebuild_by_another_worker_is_visible(self, index, tmp_path):
+        """Test cached maps are dropped when another process rebuilds."""
+        assert index.similar(1, "knee pain", k=1)[0][0] == 10
+
+        other = EmbeddingIndex(tmp_path, dim=256)
+        other.rebuild(1, [20, 21, 22], ["knee pain", "asthma", "eczema"])
+
+        assert index.similar(1, "knee pain", k=1)[0][0] == 20
+
+
 class TestServiceIntegration:
     """Test service integration scenarios."""
 
-    @patch("api.services.llm_service.LangSmithClient")
-    @patch("api.services.llm_service.wrap_openai")
-    async def test_audio_to_preferences_workflow(
-        self, mock_wrap_openai, mock_langsmith, test_db, test_user
-    ):
+    async def test_audio_to_preferences_workflow(self, test_db, test_user):
         """Test complete workflow from audio to preferences."""
         # Setup services
         audio_service = AudioService(test_db)
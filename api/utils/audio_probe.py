@@ -0,0 +1,93 @@
+from dataclasses import dataclass
+from typing import BinaryIO
+
+import av
+
+# Bytes read from the start of a file to identify it
+SNIFF_BYTES = 16
+
+# Upper bound on what the container probe reads when a header leaves the
+# stream parameters open; duration comes from headers (or, for Ogg, the last
+# page) rather than decoding
+PROBE_SIZE = 64 * 1024
+
+
+class InvalidAudioError(ValueError):
+    """Raised when an upload is not audio this service can transcribe."""
+
+
+@dataclass(frozen=True, slots=True)
+class AudioProbe:
+    """What an upload actually contains, as read from its headers."""
+
+    format: str  # wav, mp3, mp4 or ogg
+    codec: str
+    duration: float  # seconds
+    sample_rate: int
+    channels: int
+
+
+def sniff_format(header: bytes) -> str | None:
+    """Identify a supported container from its first bytes."""
+    if header[:4] == b"RIFF" and header[8:12] == b"WAVE":
+        return "wav"
+    if header[:3] == b"ID3":
+        return "mp3"
+    # MPEG audio frame sync; layer bits 00 would be ADTS AAC, not MP3
+    if len(header) >= 2 and header[0] == 0xFF and header[1] & 0xE6 > 0xE0:
+        return "mp3"
+    if header[4:8] == b"ftyp":
+        return "mp4"
+    if header[:4] == b"OggS":
+        return "ogg"
+    return None
+
+
+def probe_audio(file: BinaryIO) -> AudioProbe:
+    """Read an audio file's container headers and rewind it.
+
+    Blocking (the demuxer reads through ``file``), so call it off the event
+    loop for spooled uploads.
+    """
+    file.seek(0)
+    header = file.read(SNIFF_BYTES)
+    file.seek(0)
+    if not header:
+        raise InvalidAudioError("Audio is empty")
+    container_format = sniff_format(header)
+    if container_format is None:
+        raise InvalidAudioError("Unrecognised audio format")
+
+    try:
+        # Spooled uploads are opened "w+b"; without an explicit mode av would
+        # take that as a file to write
+        with av.open(
+            file,
+            mode="r",
+            format=container_format,
+            container_options={"probesize": str(PROBE_SIZE)},
+        ) as container:
+            if not container.streams.audio:
+                raise InvalidAudioError("File has no audio track")
+            stream = container.streams.audio[0]
+            if container.duration is not None:
+                duration = container.duration / av.time_base
+            elif stream.duration is not None:
+                duration = float(stream.duration * stream.time_base)
+            else:
+                duration = 0.0
+            probe = AudioProbe(
+                format=container_format,
+                codec=stream.codec_context.name,
+                duration=duration,
+                sample_rate=stream.codec_context.sample_rate,
+                channels=stream.codec_context.channels,
+            )
+    except av.FFmpegError as e:
+        raise InvalidAudioError(f"Unreadable {container_format} file") from e
+    finally:
+        file.seek(0)
+
+    if probe.duration <= 0 or not probe.sample_rate:
+        raise InvalidAudioError("Audio is empty")
+    return probe
@@ -0,0 +1,11 @@
+from datetime import datetime, timezone
+
+
+def utcnow() -> datetime:
+    """The current UTC time, naive, as stored in the ``DateTime`` columns.
+
+    The columns are ``timestamp without time zone``; asyncpg refuses to bind
+    an aware datetime to one, so every value written or compared goes
+    through here.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
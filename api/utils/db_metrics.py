@@ -0,0 +1,135 @@
+import time
+from bisect import bisect_left
+from typing import Any, Dict
+
+from sqlalchemy import event, exc
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from api.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Upper bounds in milliseconds; the last bucket catches everything above
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Distinct statements tracked individually before folding into "other"
+MAX_TRACKED_STATEMENTS = 200
+
+
+class LatencyStats:
+    """Cumulative latency summary with fixed histogram buckets."""
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed_ms: float) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 3),
+            "buckets_ms": dict(
+                zip([*map(str, LATENCY_BUCKETS_MS), "+Inf"], self.buckets)
+            ),
+        }
+
+
+class DatabaseMetrics:
+    """Pool and statement metrics collected from SQLAlchemy events."""
+
+    def __init__(self):
+        self.checkout_wait = LatencyStats()
+        self.checkouts = 0
+        self.checkout_timeouts = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.statements: Dict[str, LatencyStats] = {}
+
+    def observe_statement(self, statement: str, elapsed_ms: float) -> None:
+        key = " ".join(statement.split())[:120]
+        stats = self.statements.get(key)
+        if stats is None:
+            if len(self.statements) >= MAX_TRACKED_STATEMENTS:
+                key = "other"
+                stats = self.statements.setdefault(key, LatencyStats())
+            else:
+                stats = self.statements[key] = LatencyStats()
+        stats.observe(elapsed_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "checkouts": self.checkouts,
+            "checkout_timeouts": self.checkout_timeouts,
+            "checkout_wait": self.checkout_wait.snapshot(),
+            "in_use": self.in_use,
+            "max_in_use": self.max_in_use,
+            "statements": {
+                key: stats.snapshot() for key, stats in self.statements.items()
+            },
+        }
+
+
+db_metrics = DatabaseMetrics()
+
+
+class InstrumentedAsyncPool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long callers wait for a connection.
+
+    SQLAlchemy has no event for the start of a checkout, so the wait is timed
+    around the pool's own get.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            db_metrics.checkout_timeouts += 1
+            raise
+        finally:
+            db_metrics.checkout_wait.observe((time.perf_counter() - start) * 1000)
+
+
+def instrument_engine(
+    engine: AsyncEngine,
+    metrics: DatabaseMetrics = db_metrics,
+    slow_statement_ms: float = 0,
+) -> None:
+    """Attach in-use and per-statement latency listeners to an engine."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "checkout")
+    def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+        metrics.checkouts += 1
+        metrics.in_use += 1
+        metrics.max_in_use = max(metrics.max_in_use, metrics.in_use)
+
+    @event.listens_for(sync_engine, "checkin")
+    def _on_checkin(dbapi_connection, connection_record):
+        metrics.in_use -= 1
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["query_start"].pop()) * 1000
+        metrics.observe_statement(statement, elapsed_ms)
+        if slow_statement_ms and elapsed_ms >= slow_statement_ms:
+            logger.warning("Slow statement (%.1f ms): %s", elapsed_ms, statement[:200])
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _on_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("query_start"):
+            conn.info["query_start"].pop()
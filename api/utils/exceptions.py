@@ -10,3 +10,14 @@ class UnauthorizedException(HTTPException):
             detail=detail,
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+
+class ServiceUnavailableException(HTTPException):
+    """Exception for temporary overload; clients should retry later."""
+
+    def __init__(self, detail: str = "Service unavailable", retry_after: int = 1):
+        super().__init__(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=detail,
+            headers={"Retry-After": str(retry_after)},
+        )
@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Any, Dict, Iterator
+
+from api.utils.clock import utcnow
+
+
+@dataclass(slots=True)
+class LedgerEntry:
+    """Cost and latency of one dictation or preference extraction."""
+
+    operation: str  # "dictation" or "preference_extract"
+    user_id: int
+    created_at: datetime = field(default_factory=utcnow)
+    status: str = "ok"
+    dictation_id: int | None = None
+    total_ms: float = 0.0
+    stages: Dict[str, float] = field(default_factory=dict)  # milliseconds
+    audio_bytes: int | None = None
+    audio_duration: float | None = None
+    model: str | None = None
+    prompt_version: str | None = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+
+    def as_row(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+# Status of an entry that should not be written, such as a replayed response
+DISCARDED = "discarded"
+
+# The operation being recorded in this task, if any
+_current_entry: ContextVar[LedgerEntry | None] = ContextVar(
+    "ledger_entry", default=None
+)
+
+
+def current_entry() -> LedgerEntry | None:
+    return _current_entry.get()
+
+
+@contextmanager
+def use_entry(entry: LedgerEntry) -> Iterator[LedgerEntry]:
+    """Make ``entry`` the one stages and token usage are recorded into."""
+    token = _current_entry.set(entry)
+    try:
+        yield entry
+    finally:
+        _current_entry.reset(token)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Add a stage's time to the current ledger entry, if there is one."""
+    entry = _current_entry.get()
+    if entry is not None:
+        entry.stages[name] = round(entry.stages.get(name, 0.0) + seconds * 1000, 3)
+
+
+def update_entry(**fields: Any) -> None:
+    """Set fields of the current ledger entry, if there is one."""
+    entry = _current_entry.get()
+    if entry is not None:
+        for name, value in fields.items():
+            setattr(entry, name, value)
+
+
+def discard_entry() -> None:
+    """Drop the current ledger entry: the request did no work worth recording."""
+    entry = _current_entry.get()
+    if entry is not None:
+        entry.status = DISCARDED
+
+
+def record_usage(
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    cached_tokens: int = 0,
+    prompt_version: str | None = None,
+) -> None:
+    """Add an LLM call's token usage to the current ledger entry."""
+    entry = _current_entry.get()
+    if entry is None:
+        return
+    entry.model = model
+    entry.prompt_tokens += prompt_tokens
+    entry.completion_tokens += completion_tokens
+    entry.cached_tokens += cached_tokens
+    if prompt_version is not None:
+        entry.prompt_version = prompt_version
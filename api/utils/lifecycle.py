@@ -0,0 +1,68 @@
+import asyncio
+import signal
+import threading
+
+
+def _forward(handler, signum, frame) -> None:
+    if callable(handler):
+        handler(signum, frame)
+    elif handler == signal.SIG_DFL:
+        signal.signal(signum, signal.SIG_DFL)
+        signal.raise_signal(signum)
+
+
+class Lifecycle:
+    """Whether this worker should be sent traffic.
+
+    A worker is ``starting`` until its lifespan has warmed up, then
+    ``ready``, and ``draining`` from the moment it is told to stop; load
+    balancers read this from ``/health/ready``.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+
+    @property
+    def state(self) -> str:
+        if self.draining:
+            return "draining"
+        return "ready" if self.ready else "starting"
+
+    def mark_ready(self) -> None:
+        self.ready = True
+
+    def begin_drain(self) -> None:
+        self.draining = True
+
+    def watch_signals(self, delay: float = 0.0) -> None:
+        """Start draining on SIGTERM or SIGINT, then pass the signal on.
+
+        The server's own handlers still run, so it shuts down as before, but
+        ``delay`` seconds later: time for load balancers to see the worker
+        draining and stop sending it requests. A second signal is passed on
+        at once.
+
+        Call from the lifespan, after the server has installed its handlers.
+        Only possible on the main thread; elsewhere this does nothing.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                first = not self.draining
+                self.begin_drain()
+                if first and delay > 0:
+                    loop.call_soon_threadsafe(
+                        loop.call_later, delay, _forward, previous, signum, None
+                    )
+                else:
+                    _forward(previous, signum, frame)
+
+            signal.signal(sig, handler)
+
+
+lifecycle = Lifecycle()
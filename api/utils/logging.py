@@ -1,17 +1,248 @@
+"""
+Logging setup: structured records, written off the request path.
+
+Loggers hand records to a ``QueueHandler``; a listener thread formats them
+(JSON lines by default, ``LOG_FORMAT=text`` for humans) and writes them to
+stdout, so a slow or blocked stdout never stalls the event loop. The queue
+is bounded: when it is full, records are dropped and counted instead of
+waited on.
+
+Each record carries the id of the request it was logged under; see
+``RequestIdMiddleware``. Records below WARNING can be sampled per logger
+with ``LOG_SAMPLE_RATES``, e.g. ``{"api.utils.timing": 0.1}``.
+
+Pass values as arguments rather than building f-strings
+(``logger.debug("Login attempt: %s", email)``), so records that are
+disabled or sampled out are never formatted.
+"""
+
+import atexit
+import copy
 import logging
+import random
+import re
+import secrets
 import sys
-from typing import Dict, Any
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import Full, Queue
+from typing import Dict, TextIO, Tuple
+
+import orjson
+from starlette.datastructures import MutableHeaders
+
+from api.config import settings
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(request_id)s - %(message)s"
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+
+# Attributes every record has; anything else was passed in ``extra``
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {
+    "message",
+    "asctime",
+    "request_id",
+}
+
+
+def get_request_id() -> str | None:
+    """The id of the request being handled, if any."""
+    return _request_id.get()
+
+
+def _add_request_id(record: logging.LogRecord) -> bool:
+    # Handler filters run in the caller, where the request's context is set
+    record.request_id = _request_id.get() or "-"
+    return True
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per record, with any ``extra`` fields included."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry, default=str).decode()
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of records below WARNING, by logger name.
+
+    A rate set for ``api.services`` also covers ``api.services.audio_service``
+    unless that logger has a rate of its own.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def rate(self, name: str) -> float:
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate, prefix = 1.0, name
+            while prefix:
+                if prefix in self.rates:
+                    rate = self.rates[prefix]
+                    break
+                prefix = prefix.rpartition(".")[0]
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate(record.name)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queues records without waiting, dropping them when the queue is full.
+
+    The message is resolved here, since its arguments may change once the
+    caller moves on; encoding and traceback formatting happen on the
+    listener thread.
+    """
+
+    def __init__(self, queue: Queue):
+        super().__init__(queue)
+        self.dropped = 0
+        self._reported = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.dropped > self._reported:
+                self.queue.put_nowait(
+                    logging.makeLogRecord(
+                        {
+                            "name": __name__,
+                            "levelno": logging.WARNING,
+                            "levelname": "WARNING",
+                            "msg": "Log queue full, dropped %d records",
+                            "args": (self.dropped - self._reported,),
+                            "request_id": "-",
+                        }
+                    )
+                )
+                self._reported = self.dropped
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room: on a full queue the stop signal must not be lost
+        self.queue.put(self._sentinel)
+
+
+def build_queue_logging(
+    stream: TextIO,
+    formatter: logging.Formatter,
+    queue_size: int = 10000,
+    sample_rates: Dict[str, float] | None = None,
+) -> Tuple[NonBlockingQueueHandler, QueueListener]:
+    """A queue handler for loggers, and the listener that writes to ``stream``.
+
+    The listener is not started.
+    """
+    output = logging.StreamHandler(stream)
+    output.setFormatter(formatter)
+    handler = NonBlockingQueueHandler(Queue(queue_size))
+    handler.addFilter(_add_request_id)
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+    return handler, _Listener(handler.queue, output)
 
 
 def setup_logging():
-    """Setup logging configuration."""
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-        handlers=[logging.StreamHandler(sys.stdout)],
+    """Setup logging configuration.
+
+    Like ``logging.basicConfig``, does nothing if the root logger already
+    has handlers.
+    """
+    root = logging.getLogger()
+    if root.handlers:
+        return
+    formatter = (
+        JSONFormatter()
+        if settings.LOG_FORMAT == "json"
+        else logging.Formatter(TEXT_FORMAT)
     )
+    handler, listener = build_queue_logging(
+        sys.stdout,
+        formatter,
+        queue_size=settings.LOG_QUEUE_SIZE,
+        sample_rates=settings.LOG_SAMPLE_RATES,
+    )
+    root.addHandler(handler)
+    root.setLevel(settings.LOG_LEVEL)
+    listener.start()
+    # Write out what is still queued when the process exits
+    atexit.register(listener.stop)
 
 
 def get_logger(name: str) -> logging.Logger:
     """Get a logger instance."""
     return logging.getLogger(name)
+
+
+_VALID_REQUEST_ID = re.compile(r"[A-Za-z0-9._-]{1,64}")
+
+
+class RequestIdMiddleware:
+    """Gives each request an id, for its log records and response headers.
+
+    A well-formed ``X-Request-ID`` from the client or a proxy is kept, so
+    one id can follow a request across services; otherwise one is made up.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                value = value.decode("latin-1")
+                if _VALID_REQUEST_ID.fullmatch(value):
+                    request_id = value
+                break
+        if request_id is None:
+            request_id = secrets.token_hex(8)
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = request_id
+            await send(message)
+
+        token = _request_id.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            _request_id.reset(token)
@@ -0,0 +1,119 @@
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Deque, List
+
+from api.config import settings
+from api.utils.logging import get_logger
+from api.utils.metrics import event_loop_blocked, event_loop_lag
+
+logger = get_logger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class LoopStall:
+    """One time the event loop was blocked past the threshold."""
+
+    at: datetime
+    lag_ms: float
+    stack: List[str]  # the loop thread's stack while it was blocked, if caught
+
+
+class LoopLagMonitor:
+    """Measures event-loop scheduling delay and catches what blocks it.
+
+    A heartbeat coroutine sleeps for ``interval`` and records how late it
+    woke up. A watchdog thread checks the heartbeat; once the loop has been
+    stuck ``threshold`` past its wake-up time, it grabs the loop thread's
+    stack, so the report names the blocking call rather than whatever ran
+    after it. Stalls shorter than the watchdog's check period are still
+    counted, but may come without a stack.
+    """
+
+    def __init__(
+        self, interval: float = 0.1, threshold: float = 0.1, history: int = 50
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: Deque[LoopStall] = deque(maxlen=history)
+        self._last_beat = 0.0
+        self._captured_beat = 0.0
+        self._captured_stack: List[str] = []
+        self._loop_thread: int | None = None
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop = threading.Event()
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._last_beat = time.monotonic()
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - scheduled)
+            event_loop_lag.observe(lag)
+            if lag >= self.threshold:
+                self._report(lag)
+
+    def _report(self, lag: float) -> None:
+        event_loop_blocked.inc()
+        stack = []
+        if self._captured_beat == self._last_beat:
+            stack = self._captured_stack
+        self.stalls.append(
+            LoopStall(at=datetime.now(timezone.utc), lag_ms=lag * 1000, stack=stack)
+        )
+        logger.warning(
+            "Event loop blocked for %.0f ms%s",
+            lag * 1000,
+            ":\n" + "".join(stack) if stack else " (stack not captured)",
+        )
+
+    def _watch(self) -> None:
+        check = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(check):
+            beat = self._last_beat
+            if beat == self._captured_beat:
+                continue
+            if time.monotonic() - beat >= self.interval + self.threshold:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self._captured_stack = traceback.format_stack(frame)
+                    self._captured_beat = beat
+
+    def start(self) -> None:
+        """Start monitoring the running loop; call from the loop's thread."""
+        if self._task is not None:
+            return
+        self._loop_thread = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(
+            target=self._watch, name="loop-watchdog", daemon=True
+        )
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        self._stop.set()
+        await asyncio.to_thread(self._watchdog.join)
+        self._watchdog = None
+
+
+loop_monitor = LoopLagMonitor(
+    interval=settings.LOOP_MONITOR_INTERVAL_MS / 1000,
+    threshold=settings.LOOP_BLOCK_THRESHOLD_MS / 1000,
+)
@@ -0,0 +1,354 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Each worker keeps its own counters in plain Python objects: recording is a
+dict lookup and an addition, with no locks, threads or I/O on the request
+path. ``GET /metrics`` renders the current values; scrape every worker (or
+run one per container) and let Prometheus aggregate.
+"""
+
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+from api.utils.db_metrics import db_metrics
+from api.utils.timing import record_span
+from api.utils.tracing import tracer
+
+# Seconds; spans fast database work through slow LLM calls
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+# Event-loop lag is normally well under a millisecond
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    @contextmanager
+    def track_in_progress(self) -> Iterator[None]:
+        self.value += 1
+        try:
+            yield
+        finally:
+            self.value -= 1
+
+
+class _HistogramChild:
+    __slots__ = ("bounds", "counts", "sum")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        # Buckets are inclusive upper bounds, as Prometheus' "le" expects
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        registry: "MetricsRegistry | None" = None,
+    ):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        (registry if registry is not None else default_registry).register(self)
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh series for one set of label values."""
+
+    def labels(self, *values: str):
+        """The series for these label values; keep it to skip the lookup."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _samples(self) -> List[str]:
+        return [
+            f"{self.name}{_format_labels(self.labelnames, values)} "
+            f"{_format_value(child.value)}"
+            for values, child in self._children.items()
+        ]
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+
+class Counter(_Metric):
+    """A monotonically increasing total."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, or is read from a callback at scrape."""
+
+    kind = "gauge"
+
+    def __init__(self, *args, function: Callable[[], float] | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.function = function
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def track_in_progress(self):
+        return self.labels().track_in_progress()
+
+    def _samples(self) -> List[str]:
+        if self.function is not None:
+            return [f"{self.name} {_format_value(self.function())}"]
+        return super()._samples()
+
+
+class Histogram(_Metric):
+    """Observations counted into fixed buckets, with their sum."""
+
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bounds = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.bounds)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _samples(self) -> List[str]:
+        lines = []
+        for values, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip((*self.bounds, float("inf")), child.counts):
+                cumulative += count
+                labels = _format_labels(
+                    self.labelnames, values, f'le="{_format_value(bound)}"'
+                )
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{labels} {_format_value(child.sum)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """The metrics one worker exposes."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+default_registry = MetricsRegistry()
+
+
+http_request_duration = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route template and status.",
+    ("method", "route", "status"),
+)
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "HTTP requests currently being served."
+)
+dictation_stage_duration = Histogram(
+    "dictation_stage_duration_seconds",
+    "Time spent in each stage of dictation and preference requests.",
+    ("stage",),
+)
+dictation_stage_errors = Counter(
+    "dictation_stage_errors_total",
+    "Stages of dictation and preference requests that raised.",
+    ("stage",),
+)
+dictations_in_flight = Gauge(
+    "dictations_in_flight", "Dictations being transcribed, formatted or saved."
+)
+dictation_audio_seconds = Counter(
+    "dictation_audio_seconds_total", "Seconds of audio sent for transcription."
+)
+db_connections_in_use = Gauge(
+    "db_connections_in_use",
+    "Pooled database connections checked out.",
+    function=lambda: db_metrics.in_use,
+)
+llm_tokens = Counter(
+    "llm_tokens_total", "LLM tokens used, by model and type.", ("model", "type")
+)
+llm_errors = Counter(
+    "llm_errors_total", "Failed LLM calls, by operation.", ("operation",)
+)
+event_loop_lag = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop ran a timer scheduled by the lag monitor.",
+    buckets=LOOP_LAG_BUCKETS,
+)
+event_loop_blocked = Counter(
+    "event_loop_blocked_total", "Times the event loop lagged past the threshold."
+)
+idempotent_replays = Counter(
+    "idempotent_replays_total",
+    "Requests answered from a stored Idempotency-Key response, by endpoint.",
+    ("endpoint",),
+)
+
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Time one stage of a request, counting it as an error if it raises.
+
+    The one helper for stages: the duration goes to the stage histogram, the
+    trace, the request's Server-Timing spans and the current ledger entry.
+    """
+    start = time.perf_counter()
+    try:
+        with tracer.span(stage):
+            yield
+    except BaseException:
+        dictation_stage_errors.labels(stage).inc()
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        dictation_stage_duration.labels(stage).observe(elapsed)
+        record_span(stage, elapsed)
+
+
+class HTTPMetricsMiddleware:
+    """Records latency per route template, method and status code.
+
+    The route template (``/dictations/uploads/{upload_id}``), not the raw
+    path, keeps the number of series bounded; unmatched paths share one.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        with http_requests_in_flight.track_in_progress():
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = scope.get("route")
+                http_request_duration.labels(
+                    scope["method"],
+                    getattr(route, "path", "unmatched"),
+                    str(status_code),
+                ).observe(time.perf_counter() - start)
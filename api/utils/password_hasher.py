@@ -0,0 +1,135 @@
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Dict, Literal, Optional, Tuple
+
+from api.utils.db_metrics import LatencyStats
+
+if TYPE_CHECKING:
+    from passlib.context import CryptContext
+
+
+@lru_cache(maxsize=4)
+def crypt_context(rounds: int) -> "CryptContext":
+    """Password context for a bcrypt cost factor.
+
+    Hashes made with any other cost report ``needs_update``, which is what
+    drives rehashing on login after the cost changes. passlib is imported on
+    first use, off the startup path.
+    """
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+# Module-level so they can also run in a process pool
+def _hash(password: str, rounds: int) -> Tuple[str, float]:
+    start = time.perf_counter()
+    hashed = crypt_context(rounds).hash(password)
+    return hashed, time.perf_counter() - start
+
+
+def _verify_and_update(
+    password: str, hashed: str, rounds: int
+) -> Tuple[Tuple[bool, Optional[str]], float]:
+    start = time.perf_counter()
+    result = crypt_context(rounds).verify_and_update(password, hashed)
+    return result, time.perf_counter() - start
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when too many hashing jobs are already queued."""
+
+
+class PasswordHasherMetrics:
+    """Queue depth and timing for the password hashing executor."""
+
+    def __init__(self):
+        self.pending = 0
+        self.peak_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.queue_wait = LatencyStats()
+        self.run_time = LatencyStats()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "pending": self.pending,
+            "peak_pending": self.peak_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "queue_wait": self.queue_wait.snapshot(),
+            "run_time": self.run_time.snapshot(),
+        }
+
+
+class PasswordHasher:
+    """Runs bcrypt in a dedicated, bounded executor off the event loop.
+
+    Each bcrypt call takes hundreds of milliseconds of CPU. Running it inline
+    stalls every other request on the worker, so calls go to their own pool,
+    and once ``max_pending`` jobs are waiting new ones are rejected instead of
+    queueing without bound.
+    """
+
+    def __init__(
+        self,
+        rounds: int,
+        workers: int,
+        max_pending: int,
+        kind: Literal["thread", "process"] = "thread",
+    ):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.kind = kind
+        self.metrics = PasswordHasherMetrics()
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hasher"
+                )
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self.metrics.pending >= self.max_pending:
+            self.metrics.rejected += 1
+            raise PasswordHasherBusy("Too many password operations in progress")
+
+        self.metrics.pending += 1
+        self.metrics.peak_pending = max(self.metrics.peak_pending, self.metrics.pending)
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            result, run_seconds = await loop.run_in_executor(
+                self._get_executor(), fn, *args
+            )
+        finally:
+            self.metrics.pending -= 1
+
+        total_seconds = time.perf_counter() - start
+        self.metrics.completed += 1
+        self.metrics.run_time.observe(run_seconds * 1000)
+        self.metrics.queue_wait.observe(max(0.0, total_seconds - run_seconds) * 1000)
+        return result
+
+    async def hash(self, password: str) -> str:
+        """Hash a password at the configured cost."""
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify_and_update(
+        self, password: str, hashed: str
+    ) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also return a new hash if the cost has changed."""
+        return await self._run(_verify_and_update, password, hashed, self.rounds)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
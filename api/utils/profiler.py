@@ -0,0 +1,172 @@
+"""
+Statistical profiling of a live worker.
+
+A sampler thread wakes every ``interval`` seconds, reads every other
+thread's current stack with ``sys._current_frames()`` and counts identical
+stacks. Nothing is hooked into the code being profiled, so cost is a stack
+walk per thread per sample and the rest of the process runs unchanged.
+
+Output is the collapsed-stack format (``thread;outer;...;inner count`` per
+line) read by flamegraph.pl, speedscope and most flame graph viewers.
+
+Samples are wall-clock: a coroutine shows up while it runs on the event
+loop, and an idle loop shows up waiting in its selector. Awaiting
+coroutines are not on any thread's stack, so slow I/O appears as idle time
+rather than under the coroutine waiting for it.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from types import CodeType
+from typing import Dict, Set
+
+from api.config import settings
+from api.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# Sampler threads never sample each other
+_sampler_threads: Set[int] = set()
+
+_labels: Dict[CodeType, str] = {}
+
+
+def _short_path(filename: str) -> str:
+    for marker in ("site-packages/", "lib/python"):
+        index = filename.rfind(marker)
+        if index != -1:
+            return filename[index + len(marker) :]
+    try:
+        return os.path.relpath(filename)
+    except ValueError:
+        return filename
+
+
+def _label(code: CodeType) -> str:
+    # Per function rather than per line, so samples in one function merge
+    label = _labels.get(code)
+    if label is None:
+        label = f"{code.co_qualname} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+        _labels[code] = label
+    return label
+
+
+class SamplingProfiler:
+    """Counts the stacks of all threads, sampled from a background thread."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def sample(self) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident in _sampler_threads:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(_label(frame.f_code))
+                frame = frame.f_back
+            frames.append(names.get(ident, f"thread-{ident}"))
+            frames.reverse()
+            self.stacks[";".join(frames)] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        """The counted stacks, one ``frame;frame;... count`` line each."""
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+    def _run(self) -> None:
+        _sampler_threads.add(threading.get_ident())
+        try:
+            while not self._stop.wait(self.interval):
+                self.sample()
+        finally:
+            _sampler_threads.discard(threading.get_ident())
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop sampling and wait for the sampler thread; blocking."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class ContinuousProfiler(SamplingProfiler):
+    """Samples at a low rate and writes a snapshot file every period.
+
+    Each snapshot holds the stacks counted since the previous one, in
+    ``profile-<pid>-<unix time>.folded``; only the newest ``keep`` files
+    for this process are kept.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        interval: float = 0.1,
+        snapshot_seconds: float = 60.0,
+        keep: int = 60,
+    ):
+        super().__init__(interval)
+        self.directory = Path(directory)
+        self.snapshot_seconds = snapshot_seconds
+        self.keep = keep
+
+    def write_snapshot(self) -> Path | None:
+        """Write and reset the stacks counted so far; blocking file I/O."""
+        if not self.stacks:
+            return None
+        data = self.collapsed()
+        self.stacks = Counter()
+        self.samples = 0
+        path = self.directory / f"profile-{os.getpid()}-{int(time.time())}.folded"
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path.write_text(data)
+            snapshots = sorted(
+                self.directory.glob(f"profile-{os.getpid()}-*.folded"),
+                key=lambda p: p.stat().st_mtime,
+            )
+            for old in snapshots[: -self.keep]:
+                old.unlink(missing_ok=True)
+        except OSError as e:
+            logger.error("Could not write profile snapshot: %s", e)
+            return None
+        return path
+
+    def _run(self) -> None:
+        _sampler_threads.add(threading.get_ident())
+        try:
+            deadline = time.monotonic() + self.snapshot_seconds
+            while not self._stop.wait(self.interval):
+                self.sample()
+                if time.monotonic() >= deadline:
+                    self.write_snapshot()
+                    deadline = time.monotonic() + self.snapshot_seconds
+            self.write_snapshot()
+        finally:
+            _sampler_threads.discard(threading.get_ident())
+
+
+continuous_profiler = ContinuousProfiler(
+    settings.PROFILER_DIR,
+    interval=settings.PROFILER_CONTINUOUS_INTERVAL_MS / 1000,
+    snapshot_seconds=settings.PROFILER_SNAPSHOT_SECONDS,
+    keep=settings.PROFILER_KEEP,
+)
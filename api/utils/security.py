@@ -1,36 +1,81 @@
+import secrets
+from dataclasses import dataclass
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from api.config import settings
 from api.database import get_session
 from api.models import UserModel
+from api.utils.cache import TTLCache
+from api.utils.metrics import track_stage
+from api.utils.password_hasher import PasswordHasher, crypt_context
+from api.utils.tracing import tracer
 
 # Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    rounds=settings.BCRYPT_ROUNDS,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+)
 
 # OAuth2 scheme
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# Whether a user id still refers to an account, so a valid token costs no
+# database read while the entry is fresh
+user_exists_cache: TTLCache[bool] = TTLCache(
+    maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Authenticated caller, built from verified token claims."""
+
+    id: int
+
+
+def invalidate_cached_user(user_id: int) -> None:
+    """Forget cached account state after the account changes."""
+    user_exists_cache.invalidate(user_id)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash."""
-    return pwd_context.verify(plain_password, hashed_password)
+    """Verify a password against its hash (blocking; see ``check_password``)."""
+    return crypt_context(settings.BCRYPT_ROUNDS).verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password."""
-    return pwd_context.hash(password)
+    """Hash a password (blocking; see ``hash_password``)."""
+    return crypt_context(settings.BCRYPT_ROUNDS).hash(password)
+
+
+async def hash_password(password: str) -> str:
+    """Hash a password on the password hashing executor."""
+    return await password_hasher.hash(password)
+
+
+async def check_password(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """Verify a password on the password hashing executor.
+
+    Returns whether it matched and, if the stored hash uses an outdated cost,
+    a replacement hash to store.
+    """
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Create a JWT access token."""
+    from jose import jwt  # imported on first use, off the startup path
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -44,31 +89,86 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
-async def get_current_user(
-    token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)
-) -> UserModel:
-    """Get the current authenticated user."""
-    credentials_exception = HTTPException(
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
 
+
+def _decode_user_id(token: str) -> int:
+    """Verify a token and return the user id it was issued to."""
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(
             token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM]
         )
         user_id: str = payload.get("sub")
         if user_id is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+            raise _credentials_exception()
+        return int(user_id)
+    except (JWTError, ValueError):
+        raise _credentials_exception()
 
-    stmt = select(UserModel).where(UserModel.id == int(user_id))
-    result = await session.execute(stmt)
-    user = result.scalar_one_or_none()
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)
+) -> Principal:
+    """Get the current authenticated principal.
+
+    The account is only looked up when its cached state has expired; use
+    ``get_current_user_model`` for endpoints that need the full user row.
+    """
+    with track_stage("auth"):
+        user_id = _decode_user_id(token)
+
+        exists = user_exists_cache.get(user_id)
+        if exists is None:
+            stmt = select(UserModel.id).where(UserModel.id == user_id)
+            result = await session.execute(stmt)
+            exists = result.scalar_one_or_none() is not None
+            user_exists_cache.set(user_id, exists)
+
+    if not exists:
+        raise _credentials_exception()
+
+    tracer.annotate_root(user_id=user_id)
+    return Principal(id=user_id)
+
+
+async def get_current_user_model(
+    token: str = Depends(oauth2_scheme), session: AsyncSession = Depends(get_session)
+) -> UserModel:
+    """Get the current authenticated user, loading the full row."""
+    with track_stage("auth"):
+        user_id = _decode_user_id(token)
+
+        stmt = select(UserModel).where(UserModel.id == user_id)
+        result = await session.execute(stmt)
+        user = result.scalar_one_or_none()
 
     if user is None:
-        raise credentials_exception
+        user_exists_cache.set(user_id, False)
+        raise _credentials_exception()
 
+    user_exists_cache.set(user_id, True)
+    tracer.annotate_root(user_id=user_id)
     return user
+
+
+async def require_admin(x_admin_token: str | None = Header(None)) -> None:
+    """Allow operators holding ``ADMIN_TOKEN``.
+
+    With no token configured the admin endpoints do not exist, as far as
+    callers can tell.
+    """
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if x_admin_token is None or not secrets.compare_digest(
+        x_admin_token.encode(), settings.ADMIN_TOKEN.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Admin token required"
+        )
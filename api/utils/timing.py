@@ -0,0 +1,105 @@
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Tuple
+
+from starlette.datastructures import MutableHeaders
+
+from api.utils.ledger import record_stage
+from api.utils.logging import get_logger
+
+logger = get_logger(__name__)
+
+# The current request's (name, seconds) spans; tasks the request starts share
+# the same list, so batch work reports into it too
+_request_spans: ContextVar[List[Tuple[str, float]] | None] = ContextVar(
+    "request_spans", default=None
+)
+
+
+def record_span(name: str, seconds: float) -> None:
+    """Add a span to the current request's timing, if one is being timed.
+
+    Spans inside a ledger operation are also added to its entry.
+    """
+    record_stage(name, seconds)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+def _totals(spans: List[Tuple[str, float]]) -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for name, seconds in spans:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return totals
+
+
+def server_timing_header(spans: List[Tuple[str, float]], total: float) -> str:
+    """Format spans, summed by name, as a ``Server-Timing`` value."""
+    entries = [
+        f"{name};dur={seconds * 1000:.1f}" for name, seconds in _totals(spans).items()
+    ]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries)
+
+
+class ServerTimingMiddleware:
+    """Reports where each request's time went.
+
+    Spans recorded before the response starts go out in a ``Server-Timing``
+    header, for the browser's network panel. Once the response has been sent,
+    requests that recorded any spans get one log line with every span,
+    including those from streamed work finished after the headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        spans: List[Tuple[str, float]] = []
+        token = _request_spans.set(spans)
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    server_timing_header(spans, time.perf_counter() - start),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_spans.reset(token)
+            total = time.perf_counter() - start
+            if spans:
+                totals = {
+                    name: round(seconds * 1000, 1)
+                    for name, seconds in _totals(spans).items()
+                }
+                logger.info(
+                    "timing method=%s path=%s status=%s total_ms=%.1f %s",
+                    scope["method"],
+                    scope["path"],
+                    status_code,
+                    total * 1000,
+                    " ".join(f"{name}_ms={ms}" for name, ms in totals.items()),
+                    extra={
+                        "timing": {
+                            "method": scope["method"],
+                            "path": scope["path"],
+                            "status": status_code,
+                            "total_ms": round(total * 1000, 1),
+                            "spans_ms": totals,
+                        }
+                    },
+                )
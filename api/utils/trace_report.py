@@ -0,0 +1,213 @@
+"""
+Summarize trace files written by ``api.utils.tracing``.
+
+Reads every ``traces-*.jsonl`` file (rotated ones included) in a directory
+and prints:
+
+- per span name: count, errors, p50/p95/max duration and self time
+  (duration minus time covered by children)
+- the critical path of the slowest traces: the chain of spans that
+  determined when each one finished, skipping work that ran alongside
+- where critical-path time goes across all traces, by span name
+- the slowest individual spans with their attributes
+
+    PYTHONPATH=. uv run python -m api.utils.trace_report data/traces --top 10
+"""
+
+import argparse
+import sys
+from collections import defaultdict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+import orjson
+
+from api.config import settings
+
+# Children ending within this much of a later sibling's start still count
+# as sequential; timestamps come from two different clocks
+_TOLERANCE_MS = 0.5
+
+
+@dataclass
+class TraceSpan:
+    span_id: str
+    trace_id: str
+    parent_id: str | None
+    name: str
+    start_ms: float
+    duration_ms: float
+    status: str
+    attributes: dict
+    children: List["TraceSpan"] = field(default_factory=list)
+
+    @property
+    def end_ms(self) -> float:
+        return self.start_ms + self.duration_ms
+
+    @property
+    def self_ms(self) -> float:
+        return max(0.0, self.duration_ms - _covered_ms(self.children))
+
+
+def _covered_ms(spans: List[TraceSpan]) -> float:
+    """Wall time covered by possibly overlapping spans."""
+    covered, end = 0.0, float("-inf")
+    for span in sorted(spans, key=lambda s: s.start_ms):
+        start = max(span.start_ms, end)
+        if span.end_ms > start:
+            covered += span.end_ms - start
+        end = max(end, span.end_ms)
+    return covered
+
+
+def read_spans(paths: Iterable[Path]) -> List[TraceSpan]:
+    spans = []
+    for path in paths:
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = orjson.loads(line)
+                except orjson.JSONDecodeError:
+                    continue  # a line cut short by a crash
+                spans.append(
+                    TraceSpan(
+                        span_id=record["span_id"],
+                        trace_id=record["trace_id"],
+                        parent_id=record["parent_id"],
+                        name=record["name"],
+                        start_ms=record["start"] * 1000,
+                        duration_ms=record["duration_ms"],
+                        status=record["status"],
+                        attributes=record.get("attributes", {}),
+                    )
+                )
+    return spans
+
+
+def build_traces(spans: List[TraceSpan]) -> List[TraceSpan]:
+    """Link spans to their children and return the roots."""
+    by_id = {span.span_id: span for span in spans}
+    roots = []
+    for span in spans:
+        parent = by_id.get(span.parent_id) if span.parent_id else None
+        if parent is None:
+            # A root, or a span whose parent was dropped or is in a later file
+            roots.append(span)
+        else:
+            parent.children.append(span)
+    return roots
+
+
+def critical_path(span: TraceSpan) -> List[Tuple[TraceSpan, float]]:
+    """Spans on the path that determined ``span``'s end, with their time on it.
+
+    Walks back from the end of the span, at each step taking the child that
+    finished last before the current point, then continuing from its start.
+    Children that overlapped a chosen one ran alongside it and are skipped.
+    """
+    path: List[Tuple[TraceSpan, float]] = []
+    cursor = span.end_ms
+    covered = 0.0
+    for child in sorted(span.children, key=lambda s: s.end_ms, reverse=True):
+        if child.end_ms <= cursor + _TOLERANCE_MS:
+            path = critical_path(child) + path
+            covered += child.duration_ms
+            cursor = child.start_ms
+    return [(span, max(0.0, span.duration_ms - covered))] + path
+
+
+def _percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(fraction * len(sorted_values)))
+    return sorted_values[index]
+
+
+def _flatten(roots: List[TraceSpan]) -> List[TraceSpan]:
+    spans, stack = [], list(roots)
+    while stack:
+        span = stack.pop()
+        spans.append(span)
+        stack.extend(span.children)
+    return spans
+
+
+def summarize(roots: List[TraceSpan], top: int) -> str:
+    lines = []
+    spans = _flatten(roots)
+
+    by_name: Dict[str, List[TraceSpan]] = defaultdict(list)
+    for span in spans:
+        by_name[span.name].append(span)
+    lines.append(f"{len(roots)} traces, {len(spans)} spans")
+    lines.append("")
+    lines.append(
+        f"{'span':<44} {'count':>6} {'errors':>6} {'p50 ms':>9} "
+        f"{'p95 ms':>9} {'max ms':>9} {'self ms':>10}"
+    )
+    ranked = sorted(by_name.items(), key=lambda item: -sum(s.self_ms for s in item[1]))
+    for name, group in ranked:
+        durations = sorted(s.duration_ms for s in group)
+        lines.append(
+            f"{name[:44]:<44} {len(group):>6} "
+            f"{sum(s.status == 'error' for s in group):>6} "
+            f"{_percentile(durations, 0.5):>9.1f} {_percentile(durations, 0.95):>9.1f} "
+            f"{durations[-1]:>9.1f} {sum(s.self_ms for s in group):>10.1f}"
+        )
+
+    on_path: Dict[str, float] = defaultdict(float)
+    for root in roots:
+        for span, ms in critical_path(root):
+            on_path[span.name] += ms
+    total = sum(on_path.values()) or 1.0
+    lines.append("")
+    lines.append("Critical-path time by span")
+    for name, ms in sorted(on_path.items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"  {name[:44]:<44} {ms:>10.1f} ms {ms / total:>6.1%}")
+
+    lines.append("")
+    lines.append(f"Critical paths of the {top} slowest traces")
+    for root in sorted(roots, key=lambda s: -s.duration_ms)[:top]:
+        user = root.attributes.get("user_id")
+        lines.append(
+            f"  {root.name} {root.duration_ms:.1f} ms  trace={root.trace_id}"
+            + (f" user={user}" if user is not None else "")
+        )
+        for span, ms in critical_path(root)[1:]:
+            lines.append(f"    {span.name[:50]:<50} {ms:>9.1f} ms")
+
+    lines.append("")
+    lines.append(f"{top} slowest spans")
+    for span in sorted(spans, key=lambda s: -s.duration_ms)[:top]:
+        attributes = " ".join(f"{k}={v}" for k, v in span.attributes.items())
+        lines.append(
+            f"  {span.duration_ms:>9.1f} ms  {span.name[:40]:<40} "
+            f"trace={span.trace_id[:8]} {attributes[:80]}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Summarize local trace files: slowest spans and critical paths"
+    )
+    parser.add_argument("directory", nargs="?", default=settings.TRACE_DIR, type=Path)
+    parser.add_argument("--top", type=int, default=10, help="Traces and spans to list")
+    parser.add_argument("--trace", help="Only this trace id")
+    args = parser.parse_args(argv)
+
+    paths = sorted(args.directory.glob("traces-*.jsonl*"))
+    spans = read_spans(paths)
+    if args.trace:
+        spans = [span for span in spans if span.trace_id == args.trace]
+    if not spans:
+        print(f"No spans found in {args.directory}", file=sys.stderr)
+        return 1
+    print(summarize(build_traces(spans), args.top))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
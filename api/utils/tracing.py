@@ -0,0 +1,269 @@
+"""
+Request tracing to local files.
+
+Spans nest through a context variable, so a span opened anywhere under a
+request (a pipeline stage, a SQL statement, an OpenAI call) becomes a child
+of whatever span is open around it. Finished spans go into a bounded ring
+buffer; a background task appends them in batches to rotating JSON-lines
+files, one set per worker process. ``python -m api.utils.trace_report``
+summarizes those files.
+"""
+
+import asyncio
+import os
+import secrets
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from api.config import settings
+from api.utils.logging import get_logger, get_request_id
+
+logger = get_logger(__name__)
+
+
+@dataclass(slots=True)
+class Span:
+    """One timed operation within a trace."""
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None
+    start: float  # Unix time, seconds
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    duration_ms: float = 0.0
+    status: str = "ok"
+    _started: float = field(default_factory=time.perf_counter, repr=False)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def as_record(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+_current_span: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_current_root: ContextVar[Span | None] = ContextVar("current_root", default=None)
+
+
+class Tracer:
+    """Collects finished spans and writes them to rotating files.
+
+    The buffer keeps the newest ``buffer_size`` spans; if the writer falls
+    behind, the oldest are overwritten and counted in ``dropped``. Files are
+    ``traces-<pid>.jsonl`` in ``directory``, rotated to ``.1`` ...
+    ``.<backup_count>`` once they reach ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        directory: str | Path,
+        buffer_size: int = 10000,
+        max_bytes: int = 20 * 1024 * 1024,
+        backup_count: int = 5,
+        flush_interval: float = 5.0,
+        enabled: bool = True,
+    ):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.enabled = enabled
+        self.finished: Deque[Span] = deque(maxlen=buffer_size)
+        self.dropped = 0
+        self._task: asyncio.Task | None = None
+
+    def start_span(self, name: str, **attributes: Any) -> Span:
+        """A child of the current span, or the root of a new trace.
+
+        The span is not made current; use ``span`` for blocks that may open
+        spans of their own.
+        """
+        parent = _current_span.get()
+        return Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            start=time.time(),
+            attributes=attributes,
+        )
+
+    def finish(self, span: Span, error: bool = False) -> None:
+        span.duration_ms = round((time.perf_counter() - span._started) * 1000, 3)
+        if error:
+            span.status = "error"
+        if not self.enabled:
+            return
+        if len(self.finished) == self.finished.maxlen:
+            self.dropped += 1
+        self.finished.append(span)
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Span]:
+        """Trace a block; spans opened inside it become its children."""
+        span = self.start_span(name, **attributes)
+        token = _current_span.set(span)
+        root_token = _current_root.set(span) if span.parent_id is None else None
+        error = False
+        try:
+            yield span
+        except BaseException:
+            error = True
+            raise
+        finally:
+            _current_span.reset(token)
+            if root_token is not None:
+                _current_root.reset(root_token)
+            self.finish(span, error)
+
+    def annotate(self, **attributes: Any) -> None:
+        """Add attributes to the innermost open span, if any."""
+        span = _current_span.get()
+        if span is not None:
+            span.set(**attributes)
+
+    def annotate_root(self, **attributes: Any) -> None:
+        """Add attributes to the current trace's root span, if any."""
+        span = _current_root.get()
+        if span is not None:
+            span.set(**attributes)
+
+    @property
+    def path(self) -> Path:
+        return self.directory / f"traces-{os.getpid()}.jsonl"
+
+    def _rotate(self) -> None:
+        path = self.path
+        for index in range(self.backup_count - 1, 0, -1):
+            source = path.with_name(f"{path.name}.{index}")
+            if source.exists():
+                os.replace(source, path.with_name(f"{path.name}.{index + 1}"))
+        if self.backup_count:
+            os.replace(path, path.with_name(f"{path.name}.1"))
+        else:
+            path.unlink()
+
+    def flush(self) -> int:
+        """Append buffered spans to the trace file; blocking file I/O."""
+        if not self.finished:
+            return 0
+        batch = [self.finished.popleft() for _ in range(len(self.finished))]
+        data = b"".join(orjson.dumps(span.as_record()) + b"\n" for span in batch)
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "ab") as f:
+                f.write(data)
+                size = f.tell()
+            if size >= self.max_bytes:
+                self._rotate()
+        except OSError as e:
+            logger.error("Dropped %d spans: %s", len(batch), e)
+            return 0
+        return len(batch)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            # Shielded so stopping mid-write does not lose the batch
+            await asyncio.shield(asyncio.to_thread(self.flush))
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background task and write what is still buffered."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.flush)
+
+
+tracer = Tracer(
+    settings.TRACE_DIR,
+    buffer_size=settings.TRACE_BUFFER_SIZE,
+    max_bytes=settings.TRACE_FILE_MAX_MB * 1024 * 1024,
+    backup_count=settings.TRACE_FILE_BACKUPS,
+    flush_interval=settings.TRACE_FLUSH_SECONDS,
+    enabled=settings.TRACING_ENABLED,
+)
+
+
+def trace_engine(engine: AsyncEngine, tracer: Tracer = tracer) -> None:
+    """Record each SQL statement run inside a trace as a ``db.query`` span."""
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        span = None
+        if _current_span.get() is not None:
+            span = tracer.start_span(
+                "db.query", statement=" ".join(statement.split())[:200]
+            )
+        conn.info.setdefault("trace_spans", []).append(span)
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after_execute(conn, cursor, statement, parameters, context, executemany):
+        span = conn.info["trace_spans"].pop()
+        if span is not None:
+            span.set(rows=cursor.rowcount)
+            tracer.finish(span)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _on_error(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("trace_spans"):
+            span = conn.info["trace_spans"].pop()
+            if span is not None:
+                tracer.finish(span, error=True)
+
+
+class TracingMiddleware:
+    """Opens each HTTP request's root span, named after its route template."""
+
+    def __init__(self, app, tracer: Tracer = tracer):
+        self.app = app
+        self.tracer = tracer
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                span.set(status_code=message["status"])
+            await send(message)
+
+        with self.tracer.span(f"{scope['method']} {scope['path']}") as span:
+            span.set(method=scope["method"], request_id=get_request_id())
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = scope.get("route")
+                if route is not None:
+                    span.name = f"{scope['method']} {route.path}"
+                    span.set(route=route.path)
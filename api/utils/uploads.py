@@ -0,0 +1,151 @@
+import hashlib
+import json
+import tempfile
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Tuple
+
+from fastapi import UploadFile
+
+# Read size for hashing and size checks; large enough to keep thread hops for
+# disk-spooled uploads rare, small enough that concurrent uploads stay cheap
+CHUNK_SIZE = 1024 * 1024
+
+# Allowance for multipart boundaries and part headers on top of the file size
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds its size limit."""
+
+
+@dataclass(frozen=True, slots=True)
+class IngestedUpload:
+    """A validated upload, ready to hand downstream without copying."""
+
+    file: BinaryIO
+    size: int
+    sha256: str
+
+
+async def ingest_upload(
+    upload: UploadFile, max_bytes: int, chunk_size: int = CHUNK_SIZE
+) -> IngestedUpload:
+    """Check an upload's size and hash it, reading one chunk at a time.
+
+    Starlette has already spooled the part to a temporary file, so the file
+    is streamed through once and rewound; only one chunk is ever held here.
+    """
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+
+    digest = hashlib.sha256()
+    size = 0
+    await upload.seek(0)
+    while chunk := await upload.read(chunk_size):
+        size += len(chunk)
+        if size > max_bytes:
+            raise UploadTooLargeError(f"Upload exceeds {max_bytes} bytes")
+        digest.update(chunk)
+    await upload.seek(0)
+
+    return IngestedUpload(file=upload.file, size=size, sha256=digest.hexdigest())
+
+
+def detach_upload(upload: UploadFile) -> UploadFile:
+    """Take ownership of an upload's spooled file; the caller must close it.
+
+    FastAPI closes request files when the endpoint returns (before 0.118,
+    that is before a streaming body has been sent), so work that outlives
+    the endpoint keeps its own handle and leaves an empty one behind.
+    """
+    owned = UploadFile(
+        file=upload.file,
+        size=upload.size,
+        filename=upload.filename,
+        headers=upload.headers,
+    )
+    upload.file = tempfile.SpooledTemporaryFile()
+    return owned
+
+
+class _BodyTooLarge(Exception):
+    pass
+
+
+class RequestSizeLimitMiddleware:
+    """Rejects oversized request bodies on selected routes before parsing.
+
+    ``limits`` maps ``(method, path)`` to a maximum body size in bytes. A
+    declared ``Content-Length`` over the limit is answered with 413 before a
+    single body byte is read; bodies without one (chunked transfer) are cut
+    off as soon as the running total passes the limit.
+    """
+
+    def __init__(self, app, limits: Dict[Tuple[str, str], int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = None
+        if scope["type"] == "http":
+            limit = self.limits.get((scope["method"], scope["path"]))
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                if value.isdigit() and int(value) > limit:
+                    await self._reject(send, limit)
+                    return
+                break
+
+        received = 0
+        exceeded = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    exceeded = True
+                    raise _BodyTooLarge()
+            return message
+
+        async def guarded_send(message):
+            nonlocal rejected
+            # The framework may turn the aborted read into its own error
+            # response; answer 413 instead
+            if exceeded:
+                if message["type"] == "http.response.start" and not rejected:
+                    rejected = True
+                    await self._reject(send, limit)
+                return
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except _BodyTooLarge:
+            pass
+        if exceeded and not rejected:
+            await self._reject(send, limit)
+
+    @staticmethod
+    async def _reject(send, limit: int) -> None:
+        body = json.dumps(
+            {"detail": f"File too large. Maximum request size is {limit} bytes"}
+        ).encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                    (b"connection", b"close"),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
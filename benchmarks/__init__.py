@@ -0,0 +1,13 @@
+"""
+Performance benchmarks for the Lyrebird API.
+
+Each ``bench_*`` module is runnable on its own, e.g.:
+
+    uv run python -m benchmarks.bench_dictation_history --rows 100000
+
+Benchmarks default to a throwaway SQLite database so they run anywhere; pass
+``--database-url`` to point them at a real Postgres instance. They drop and
+recreate every table there, so it must be a scratch database: the
+application's own database is refused, and any other needs
+``--i-know-this-drops-tables``.
+"""
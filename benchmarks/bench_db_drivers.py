@@ -0,0 +1,170 @@
+"""
+Driver comparison: psycopg vs asyncpg on the API's query mix.
+
+Runs the auth, preference and dictation queries the API issues per request
+against each driver, from ``--concurrency`` concurrent workers for
+``--duration`` seconds, using the same pool settings as the application.
+Requires a scratch Postgres database, whose tables are dropped: pass it as
+``--database-url`` (the application's own database is refused) and the
+driver part of the URL is swapped per run.
+
+    uv run python -m benchmarks.bench_db_drivers --concurrency 20 \
+        --database-url postgresql://.../scratch --i-know-this-drops-tables
+"""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Dict, List
+
+from sqlalchemy import insert, select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from api.database import Base, build_engine
+from api.models import DictationsModel, UserModel, UserPreferencesModel
+from api.repositories.dictations import DictationsRepository
+from api.repositories.preferences import PreferencesRepository
+from benchmarks.common import (
+    LatencyStats,
+    base_parser,
+    check_scratch_database,
+    print_report,
+)
+
+USERS = 200
+NOTE = "Patient reviewed, stable, continue current medication. " * 10
+
+# Relative frequency of each query in the per-request mix
+MIX = {
+    "auth: user by id": 10,
+    "auth: user by email": 1,
+    "prefs: rule block": 4,
+    "prefs: list": 1,
+    "dictation: insert": 2,
+    "dictation: history page": 3,
+}
+
+Operation = Callable[[AsyncSession, int], Awaitable[None]]
+
+
+async def user_by_id(session: AsyncSession, user_id: int) -> None:
+    await session.execute(select(UserModel).where(UserModel.id == user_id))
+
+
+async def user_by_email(session: AsyncSession, user_id: int) -> None:
+    stmt = select(UserModel).where(UserModel.email == f"bench{user_id}@example.com")
+    await session.execute(stmt)
+
+
+async def rule_block(session: AsyncSession, user_id: int) -> None:
+    await PreferencesRepository(session).get_rule_block(user_id)
+
+
+async def list_preferences(session: AsyncSession, user_id: int) -> None:
+    await PreferencesRepository(session).list_preferences(user_id)
+
+
+async def insert_dictation(session: AsyncSession, user_id: int) -> None:
+    session.add(DictationsModel(user_id=user_id, text=NOTE, formatted_text=NOTE))
+    await session.commit()
+
+
+async def history_page(session: AsyncSession, user_id: int) -> None:
+    await DictationsRepository(session).list_page(user_id, 20, fields=["created_at"])
+
+
+OPERATIONS: Dict[str, Operation] = {
+    "auth: user by id": user_by_id,
+    "auth: user by email": user_by_email,
+    "prefs: rule block": rule_block,
+    "prefs: list": list_preferences,
+    "dictation: insert": insert_dictation,
+    "dictation: history page": history_page,
+}
+
+
+async def prepare(engine: AsyncEngine) -> None:
+    """Create the schema and seed users, preferences and history."""
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(UserModel),
+            [
+                {"id": i, "email": f"bench{i}@example.com", "hashed_password": "x"}
+                for i in range(1, USERS + 1)
+            ],
+        )
+        await conn.execute(
+            insert(UserPreferencesModel),
+            [
+                {"user_id": i, "user_edits_id": 0, "rules": f"Rule {j} for {i}"}
+                for i in range(1, USERS + 1)
+                for j in range(10)
+            ],
+        )
+        await conn.execute(
+            insert(DictationsModel),
+            [
+                {"user_id": i, "text": NOTE, "formatted_text": NOTE}
+                for i in range(1, USERS + 1)
+                for _ in range(50)
+            ],
+        )
+
+
+async def run_driver(
+    engine: AsyncEngine, concurrency: int, duration: float
+) -> tuple[List[LatencyStats], int]:
+    """Run the query mix; return per-operation stats and total operations."""
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    stats = {name: LatencyStats(name) for name in OPERATIONS}
+    names, weights = list(MIX), list(MIX.values())
+    deadline = time.perf_counter() + duration
+
+    async def worker(seed: int) -> None:
+        rng = random.Random(seed)
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            async with session_factory() as session:
+                with stats[name].measure():
+                    await OPERATIONS[name](session, rng.randint(1, USERS))
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return list(stats.values()), sum(len(s.samples) for s in stats.values())
+
+
+async def main() -> None:
+    parser = base_parser(__doc__)
+    parser.add_argument("--drivers", nargs="+", default=["psycopg", "asyncpg"])
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=15.0)
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url is required: a scratch Postgres database")
+    check_scratch_database(args.database_url, args.drop_tables)
+
+    base_url = make_url(args.database_url)
+    summary = []
+    for driver in args.drivers:
+        url = base_url.set(drivername=f"postgresql+{driver}")
+        engine = build_engine(url.render_as_string(hide_password=False))
+        await prepare(engine)
+
+        # Warm the pool and statement caches before measuring
+        await run_driver(engine, args.concurrency, min(2.0, args.duration))
+        stats, total = await run_driver(engine, args.concurrency, args.duration)
+        await engine.dispose()
+
+        print_report(f"{driver}: per-query latency", stats)
+        summary.append(f"{driver:<10} {total / args.duration:10.1f} queries/s")
+
+    print("\nThroughput")
+    print("-" * 100)
+    print("\n".join(summary))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,130 @@
+"""
+Dictation history pagination: keyset cursor vs OFFSET at increasing depth.
+
+Seeds one user with ``--rows`` dictations and measures page latency at the
+start, middle and end of their history. Keyset latency should stay flat while
+OFFSET grows linearly with depth.
+
+    uv run python -m benchmarks.bench_dictation_history --rows 100000
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from api.models import DictationsModel, UserModel
+from api.repositories.dictations import DictationsRepository, encode_cursor
+from benchmarks.common import (
+    LatencyStats,
+    base_parser,
+    create_benchmark_engine,
+    print_report,
+)
+
+PAGE_SIZE = 20
+BODY = "Patient presents with intermittent chest pain radiating to the left arm. " * 20
+
+
+async def seed(session: AsyncSession, rows: int) -> int:
+    """Create a heavy user plus background users; return the heavy user's id."""
+    await session.execute(
+        insert(UserModel),
+        [
+            {
+                "id": user_id,
+                "email": f"bench{user_id}@example.com",
+                "hashed_password": "x",
+            }
+            for user_id in (1, 2, 3)
+        ],
+    )
+    base = datetime(2024, 1, 1)
+    chunk = 5000
+    for start in range(0, rows, chunk):
+        batch = []
+        for i in range(start, min(start + chunk, rows)):
+            created_at = base + timedelta(seconds=i)
+            batch.append(
+                {
+                    # Interleave background users so the heavy user's rows are
+                    # not physically contiguous
+                    "user_id": 1 if i % 4 else 2 + (i // 4) % 2,
+                    "text": BODY,
+                    "formatted_text": BODY,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+            )
+        await session.execute(insert(DictationsModel), batch)
+    await session.commit()
+    return 1
+
+
+async def cursor_at(session: AsyncSession, user_id: int, depth: int) -> str | None:
+    """Cursor a client would hold after paging ``depth`` rows in."""
+    if depth == 0:
+        return None
+    stmt = (
+        select(DictationsModel.created_at, DictationsModel.id)
+        .where(DictationsModel.user_id == user_id)
+        .order_by(DictationsModel.created_at.desc(), DictationsModel.id.desc())
+        .offset(depth - 1)
+        .limit(1)
+    )
+    created_at, dictation_id = (await session.execute(stmt)).one()
+    return encode_cursor(created_at, dictation_id)
+
+
+async def main() -> None:
+    parser = base_parser(__doc__)
+    parser.add_argument("--rows", type=int, default=140_000)
+    args = parser.parse_args()
+
+    engine = await create_benchmark_engine(args.database_url, args.drop_tables)
+    session_factory = sessionmaker(engine, class_=AsyncSession)
+
+    async with session_factory() as session:
+        user_id = await seed(session, args.rows)
+        total = (
+            await session.execute(
+                select(DictationsModel.id).where(DictationsModel.user_id == user_id)
+            )
+        ).all()
+        print(f"Seeded {len(total)} dictations for user {user_id}")
+
+        repository = DictationsRepository(session)
+        depths = [0, len(total) // 2, len(total) - PAGE_SIZE]
+        stats = []
+        for depth in depths:
+            cursor = await cursor_at(session, user_id, depth)
+
+            keyset = LatencyStats(f"keyset  depth={depth}")
+            for _ in range(args.iterations):
+                with keyset.measure():
+                    await repository.list_page(
+                        user_id, PAGE_SIZE, cursor, ["created_at"]
+                    )
+
+            offset = LatencyStats(f"offset  depth={depth}")
+            stmt = (
+                select(DictationsModel.id, DictationsModel.created_at)
+                .where(DictationsModel.user_id == user_id)
+                .order_by(DictationsModel.created_at.desc(), DictationsModel.id.desc())
+                .offset(depth)
+                .limit(PAGE_SIZE)
+            )
+            for _ in range(args.iterations):
+                with offset.measure():
+                    (await session.execute(stmt)).all()
+
+            stats.extend([keyset, offset])
+
+    print_report("Dictation history page latency", stats)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
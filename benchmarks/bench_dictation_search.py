@@ -0,0 +1,141 @@
+"""
+Full-text search: indexed search vs a LIKE scan over a synthetic corpus.
+
+Generates ``--rows`` clinical-style notes spread over ``--users`` users, then
+measures ranked, highlighted search for rare and common terms against the
+equivalent ``LIKE '%term%'`` query the index replaces. Ranked search pays for
+every match of a common term, while the unranked LIKE can stop at the first
+page, so compare the rare-term rows for the cost of the scan itself.
+
+    uv run python -m benchmarks.bench_dictation_search --rows 2000000
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+from sqlalchemy import insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from api.models import DictationsModel, UserModel
+from api.repositories.search import DictationSearchRepository
+from benchmarks.common import (
+    LatencyStats,
+    base_parser,
+    create_benchmark_engine,
+    print_report,
+)
+
+SURNAMES = [f"surname{i}" for i in range(5000)] + ["Okafor", "Nguyen", "Kowalski"]
+MEDICATIONS = [
+    "metformin",
+    "lisinopril",
+    "atorvastatin",
+    "amoxicillin",
+    "omeprazole",
+    "salbutamol",
+    "sertraline",
+    "warfarin",
+]
+FILLER = (
+    "patient reviewed in clinic today reports improvement denies fever chest pain "
+    "shortness of breath examination unremarkable plan follow up in two weeks"
+).split()
+
+
+def synthetic_note(rng: random.Random) -> tuple[str, str]:
+    """Build a (text, formatted_text) pair mentioning a patient and medication."""
+    surname = rng.choice(SURNAMES)
+    medication = rng.choice(MEDICATIONS)
+    words = rng.sample(FILLER, 12)
+    text = f"Mr {surname} {' '.join(words)} continue {medication}"
+    formatted_text = (
+        f"**Patient:** {surname}\n**Assessment:** {' '.join(words[:6])}\n"
+        f"**Plan:** continue {medication}"
+    )
+    return text, formatted_text
+
+
+async def seed(session: AsyncSession, rows: int, users: int) -> None:
+    """Insert users and a synthetic corpus of notes."""
+    await session.execute(
+        insert(UserModel),
+        [
+            {"id": i, "email": f"bench{i}@example.com", "hashed_password": "x"}
+            for i in range(1, users + 1)
+        ],
+    )
+    rng = random.Random(42)
+    base = datetime(2024, 1, 1)
+    chunk = 10_000
+    for start in range(0, rows, chunk):
+        batch = []
+        for i in range(start, min(start + chunk, rows)):
+            text, formatted_text = synthetic_note(rng)
+            created_at = base + timedelta(seconds=i)
+            batch.append(
+                {
+                    "user_id": 1 + i % users,
+                    "text": text,
+                    "formatted_text": formatted_text,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                }
+            )
+        await session.execute(insert(DictationsModel), batch)
+        await session.commit()
+        print(f"  seeded {min(start + chunk, rows):,} rows", end="\r")
+    print()
+
+
+async def main() -> None:
+    parser = base_parser(__doc__)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=50)
+    args = parser.parse_args()
+
+    engine = await create_benchmark_engine(args.database_url, args.drop_tables)
+    session_factory = sessionmaker(engine, class_=AsyncSession)
+
+    async with session_factory() as session:
+        await seed(session, args.rows, args.users)
+        repository = DictationSearchRepository(session)
+
+        stats = []
+        for label, query in [
+            ("rare name", "Okafor"),
+            ("common medication", "metformin"),
+            ("name + medication", "Nguyen warfarin"),
+        ]:
+            indexed = LatencyStats(f"search  {label}")
+            for _ in range(args.iterations):
+                with indexed.measure():
+                    await repository.search(1, query, limit=20)
+
+            like = LatencyStats(f"LIKE    {label}")
+            term = f"%{query.split()[0]}%"
+            stmt = (
+                select(DictationsModel.id)
+                .where(DictationsModel.user_id == 1)
+                .where(
+                    or_(
+                        DictationsModel.text.like(term),
+                        DictationsModel.formatted_text.like(term),
+                    )
+                )
+                .limit(20)
+            )
+            # LIKE scans are slow; a handful of samples is enough
+            for _ in range(max(1, args.iterations // 20)):
+                with like.measure():
+                    (await session.execute(stmt)).all()
+
+            stats.extend([indexed, like])
+
+    print_report(f"Dictation search latency ({args.rows:,} rows)", stats)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+"""
+Event-loop latency under concurrent logins: inline bcrypt vs an executor.
+
+Runs ``--iterations`` password verifications from ``--concurrency`` concurrent
+"logins" while a ticker coroutine sleeps for 5 ms in a loop; how late each
+tick wakes up is the delay every other request on the worker would see.
+Inline verification blocks the loop for the whole bcrypt call; the thread and
+process executors keep it responsive.
+
+    uv run python -m benchmarks.bench_password_hashing --rounds 12
+"""
+
+import asyncio
+import time
+from typing import List
+
+from api.utils.password_hasher import PasswordHasher, crypt_context
+from benchmarks.common import LatencyStats, base_parser, print_report
+
+TICK_SECONDS = 0.005
+
+
+async def tick(lag: LatencyStats, stop: asyncio.Event) -> None:
+    """Record how late the loop wakes a coroutine sleeping for one tick."""
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lag.samples.append(max(0.0, time.perf_counter() - start - TICK_SECONDS))
+
+
+async def run_mode(
+    mode: str, rounds: int, workers: int, concurrency: int, iterations: int
+) -> tuple[List[LatencyStats], float]:
+    """Run the logins in one mode; return loop lag and login stats, and rate."""
+    hashed = crypt_context(rounds).hash("correct horse battery staple")
+    hasher = PasswordHasher(
+        rounds,
+        workers,
+        max_pending=iterations,
+        kind="process" if mode == "process" else "thread",
+    )
+    lag = LatencyStats(f"{mode}: event loop lag")
+    logins = LatencyStats(f"{mode}: login")
+    remaining = iter(range(iterations))
+
+    async def login() -> None:
+        for _ in remaining:
+            with logins.measure():
+                if mode == "inline":
+                    crypt_context(rounds).verify_and_update("wrong", hashed)
+                    # Yield like a real handler would between awaits
+                    await asyncio.sleep(0)
+                else:
+                    await hasher.verify_and_update("wrong", hashed)
+
+    # Warm the pool (process workers import passlib on first use)
+    if mode != "inline":
+        await hasher.hash("warmup")
+
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(tick(lag, stop))
+    await asyncio.sleep(TICK_SECONDS * 4)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await ticker
+    hasher.shutdown()
+    return [lag, logins], iterations / elapsed
+
+
+async def main() -> None:
+    parser = base_parser(__doc__)
+    parser.set_defaults(iterations=24)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--modes", nargs="+", default=["inline", "thread", "process"])
+    args = parser.parse_args()
+
+    summary = []
+    for mode in args.modes:
+        stats, rate = await run_mode(
+            mode, args.rounds, args.workers, args.concurrency, args.iterations
+        )
+        print_report(f"{mode}: bcrypt rounds={args.rounds}", stats)
+        lag = stats[0]
+        summary.append(
+            f"{mode:<10} {rate:8.1f} logins/s   "
+            f"max loop lag {max(lag.samples, default=0) * 1000:8.1f}ms"
+        )
+
+    print("\nSummary")
+    print("-" * 100)
+    print("\n".join(summary))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
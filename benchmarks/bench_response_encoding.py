@@ -0,0 +1,231 @@
+"""
+Bytes on the wire and CPU per response: JSON encoder and compression.
+
+Builds the payloads the dictations router actually returns, with realistic
+multi-kilobyte clinical notes (transcript plus formatted note per item): a
+20-item history page, a single created dictation and a long preference list.
+For each it times rendering with the standard ``JSONResponse`` against
+``FastJSONResponse`` (orjson), then sends the rendered body through
+``CompressionMiddleware`` for every encoding the client might accept and
+reports the bytes that leave the server and the time spent compressing.
+
+    uv run python -m benchmarks.bench_response_encoding --iterations 500
+"""
+
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from fastapi.responses import JSONResponse
+
+from api.schemas import (
+    DictationsCreateResponse,
+    DictationsListItem,
+    DictationsPage,
+    UserPreferencesResponse,
+)
+from api.utils.compression import CompressionMiddleware, brotli
+from api.utils.responses import FastJSONResponse
+from benchmarks.common import LatencyStats, base_parser, print_report
+
+SYMPTOMS = [
+    "intermittent chest pain on exertion",
+    "productive cough with green sputum",
+    "worsening shortness of breath on stairs",
+    "bilateral ankle swelling in the evenings",
+    "left knee pain with morning stiffness",
+    "episodes of dizziness on standing",
+    "burning epigastric pain after meals",
+    "low mood, poor sleep and reduced appetite",
+    "frequent urination and increased thirst",
+    "recurrent frontal headaches behind the eyes",
+    "lower back pain radiating to the right buttock",
+    "palpitations lasting a few minutes at a time",
+]
+QUALIFIERS = [
+    "relieved by rest",
+    "worse at night",
+    "no associated fever or weight loss",
+    "partially eased by paracetamol",
+    "interfering with work as a {job}",
+    "denies chest pain or syncope",
+    "no red flag features elicited",
+    "similar episode {n} years ago that settled",
+]
+PLANS = [
+    "Start {drug} {dose}mg once daily and review in {n} weeks.",
+    "Bloods today: FBC, U&E, LFT, HbA1c and lipid profile.",
+    "Refer to physiotherapy; advised graded return to activity.",
+    "ECG performed, sinus rhythm at {hr} bpm, no acute changes.",
+    "Safety-netting advice given to attend ED if symptoms escalate.",
+    "Increase {drug} to {dose}mg; recheck blood pressure in {n} weeks.",
+    "Discussed smoking cessation and offered referral to local service.",
+]
+DRUGS = ["amlodipine", "ramipril", "metformin", "sertraline", "omeprazole"]
+JOBS = ["nurse", "builder", "teacher", "bus driver", "accountant"]
+HEADINGS = ["## Subjective", "## Objective", "## Assessment", "## Plan"]
+
+
+def _fill(rng: random.Random, template: str) -> str:
+    return template.format(
+        job=rng.choice(JOBS),
+        drug=rng.choice(DRUGS),
+        dose=rng.choice([2.5, 5, 10, 20, 500, 1000]),
+        n=rng.randint(1, 8),
+        hr=rng.randint(55, 110),
+    )
+
+
+def make_note(rng: random.Random, sentences: int) -> Tuple[str, str]:
+    """A transcript and its formatted note, each a few kilobytes."""
+    picked = []
+    for _ in range(sentences):
+        kind = rng.random()
+        if kind < 0.45:
+            picked.append(
+                f"Reports {rng.choice(SYMPTOMS)} for {rng.randint(2, 30)} days, "
+                f"{_fill(rng, rng.choice(QUALIFIERS))}."
+            )
+        elif kind < 0.7:
+            picked.append(
+                f"BP {rng.randint(105, 170)}/{rng.randint(60, 100)} mmHg, "
+                f"HR {rng.randint(55, 110)}, temp {rng.uniform(36.1, 38.4):.1f}C, "
+                f"SpO2 {rng.randint(93, 100)}%, weight {rng.uniform(52, 118):.1f}kg."
+            )
+        else:
+            picked.append(_fill(rng, rng.choice(PLANS)))
+    transcript = " ".join(picked)
+    sections = []
+    for i, heading in enumerate(HEADINGS):
+        body = picked[i::4]
+        sections.append(heading + "\n" + "\n".join(f"- {s}" for s in body))
+    return transcript, "\n\n".join(sections)
+
+
+def build_payloads(seed: int = 7) -> Dict[str, object]:
+    """JSON-ready content as FastAPI hands it to the response class."""
+    rng = random.Random(seed)
+    base = datetime(2025, 1, 1)
+
+    items = []
+    for i in range(20):
+        text, formatted = make_note(rng, rng.randint(30, 60))
+        items.append(
+            DictationsListItem(
+                id=1000 - i,
+                text=text,
+                formatted_text=formatted,
+                created_at=base - timedelta(hours=i),
+            )
+        )
+    page = DictationsPage(items=items, next_cursor="eyJjIjoiMjAyNS0wMS0wMSJ9")
+
+    text, formatted = make_note(rng, 50)
+    created = DictationsCreateResponse(
+        id=1, user_id=1, text=text, formatted_text=formatted, audio_duration=182.4
+    )
+
+    preferences = [
+        UserPreferencesResponse(
+            id=i,
+            user_id=1,
+            user_edits_id=i,
+            rules=f"- Write {rng.choice(SYMPTOMS)} as a bullet under Subjective\n"
+            f"- {_fill(rng, rng.choice(PLANS))}",
+        )
+        for i in range(300)
+    ]
+
+    return {
+        "history page (20 notes)": page.model_dump(mode="json", exclude_unset=True),
+        "created dictation": created.model_dump(mode="json"),
+        "preferences (300)": [p.model_dump(mode="json") for p in preferences],
+    }
+
+
+async def wire_bytes(body: bytes, accept: str, **options) -> Tuple[int, str, float]:
+    """Send one JSON body through the middleware; bytes out, encoding, seconds."""
+
+    async def app(scope, receive, send):
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    middleware = CompressionMiddleware(app, **options)
+    sent: List[dict] = []
+
+    async def send(message):
+        sent.append(message)
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    scope = {
+        "type": "http",
+        "method": "GET",
+        "path": "/dictations/",
+        "headers": [(b"accept-encoding", accept.encode())],
+    }
+    start = time.perf_counter()
+    await middleware(scope, receive, send)
+    elapsed = time.perf_counter() - start
+
+    headers = dict(sent[0]["headers"])
+    encoding = headers.get(b"content-encoding", b"identity").decode()
+    size = sum(len(m.get("body", b"")) for m in sent[1:])
+    return size, encoding, elapsed
+
+
+async def main() -> None:
+    parser = base_parser(__doc__)
+    parser.set_defaults(iterations=500)
+    args = parser.parse_args()
+    payloads = build_payloads()
+
+    stats = []
+    for name, content in payloads.items():
+        for response_class in (JSONResponse, FastJSONResponse):
+            stat = LatencyStats(f"{name}: {response_class.__name__}")
+            for _ in range(args.iterations):
+                with stat.measure():
+                    response_class(content)
+            stats.append(stat)
+    print_report("Serialization CPU per response", stats)
+
+    settings_under_test = [("gzip", {"gzip_level": level}) for level in (1, 6, 9)]
+    if brotli is not None:
+        settings_under_test += [
+            ("br", {"brotli_quality": quality}) for quality in (4, 11)
+        ]
+    else:
+        print("\n(brotli not installed; gzip only)")
+
+    print("\nBytes on the wire and compression time per response")
+    print("-" * 100)
+    for name, content in payloads.items():
+        body = FastJSONResponse(content).body
+        print(f"{name:<28} identity {len(body):>8} bytes")
+        for accept, options in settings_under_test:
+            timings = []
+            for _ in range(max(1, args.iterations // 10)):
+                size, encoding, elapsed = await wire_bytes(body, accept, **options)
+                timings.append(elapsed)
+            label = f"{encoding} {list(options.values())[0]}"
+            print(
+                f"{'':<28} {label:<8} {size:>8} bytes "
+                f"({size / len(body):6.1%})  {min(timings) * 1000:7.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
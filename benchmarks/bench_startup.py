@@ -0,0 +1,124 @@
+"""
+Worker cold start: how long ``import api.main`` takes, and where it goes.
+
+Imports the app ``--iterations`` times, each in a fresh interpreter, and
+reports the import time. One more run under ``python -X importtime`` gives
+the packages that cost the most (self time summed per top-level package)
+and the slowest individual modules.
+
+Fails, with exit status 1, when the median import takes longer than
+``--budget-ms`` or when a module that is meant to load on first use
+(OpenAI, LangSmith, JWT and password hashing) is imported with the app.
+
+    uv run python -m benchmarks.bench_startup --budget-ms 1500
+"""
+
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from benchmarks.common import LatencyStats, base_parser, print_report
+
+# Median import on a small single-core worker; was ~2100ms before the LLM,
+# JWT and passlib imports were deferred
+STARTUP_BUDGET_MS = 1500
+
+# Loaded by the first request that needs them, not at startup
+DEFERRED_MODULES = ("openai", "langsmith", "langchain", "jose", "passlib")
+
+_CHILD = """
+import sys, time
+start = time.perf_counter()
+import api.main
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(" ".join(name for name in sys.argv[1:] if name in sys.modules))
+"""
+
+_IMPORT_TIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def import_app(*flags: str) -> Tuple[float, List[str], str]:
+    """Import the app in a new interpreter.
+
+    Returns the import time in seconds, which deferred modules got loaded,
+    and the interpreter's stderr.
+    """
+    result = subprocess.run(
+        [sys.executable, *flags, "-c", _CHILD, *DEFERRED_MODULES],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed, loaded = (result.stdout.splitlines() + [""])[:2]
+    return float(elapsed), loaded.split(), result.stderr
+
+
+def parse_import_times(stderr: str) -> List[Tuple[str, int, int]]:
+    """``(module, self µs, cumulative µs)`` from ``-X importtime`` output."""
+    rows = []
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match:
+            rows.append((match[4], int(match[1]), int(match[2])))
+    return rows
+
+
+def print_profile(rows: List[Tuple[str, int, int]], top: int) -> None:
+    by_package: Dict[str, int] = defaultdict(int)
+    for module, self_us, _ in rows:
+        by_package[module.partition(".")[0]] += self_us
+
+    print(f"\nMost expensive packages (self time, {len(rows)} modules imported)")
+    print("-" * 100)
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:<40} {self_us / 1000:8.1f}ms")
+
+    print("\nSlowest modules (cumulative)")
+    print("-" * 100)
+    for module, self_us, cumulative_us in sorted(rows, key=lambda row: -row[2])[:top]:
+        print(
+            f"{module:<60} {cumulative_us / 1000:8.1f}ms "
+            f"(self {self_us / 1000:.1f}ms)"
+        )
+
+
+def main() -> None:
+    parser = base_parser(__doc__)
+    parser.set_defaults(iterations=5)
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    import_app()  # fill the bytecode cache so every run starts alike
+    stats = LatencyStats("import api.main")
+    loaded: List[str] = []
+    for _ in range(args.iterations):
+        elapsed, loaded, _ = import_app()
+        stats.samples.append(elapsed)
+    print_report("Cold import, fresh interpreter per run", [stats])
+
+    _, _, stderr = import_app("-X", "importtime")
+    print_profile(parse_import_times(stderr), args.top)
+
+    failures = []
+    median_ms = stats.percentile(50) * 1000
+    if median_ms > args.budget_ms:
+        failures.append(
+            f"median import {median_ms:.0f}ms is over the {args.budget_ms:.0f}ms budget"
+        )
+    if loaded:
+        failures.append(f"imported at startup: {', '.join(loaded)}")
+
+    print("\nBudget")
+    print("-" * 100)
+    if failures:
+        print("\n".join(f"FAIL {failure}" for failure in failures))
+        sys.exit(1)
+    print(f"OK   median import {median_ms:.0f}ms, budget {args.budget_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+Peak memory under concurrent large uploads: buffered vs streamed ingestion.
+
+Sends ``--concurrency`` simultaneous uploads of ``--size-mb`` to
+``POST /dictations/`` through the ASGI app, then the same number of
+oversized uploads, and reports the Python heap high-water mark (tracemalloc)
+for each. "buffered" reproduces the previous ingestion, which read every
+upload into memory and only then checked the size limit; "streamed" is the
+current path (Content-Length rejection, chunked hashing, the spooled file
+handed downstream). The transcription stand-in drains the file it is given
+in chunks, like the OpenAI client does. The request bodies themselves are
+built once, up front, and fed in 64KB pieces, so they are not part of the
+measurement.
+
+    uv run python -m benchmarks.bench_upload_memory --concurrency 8 --size-mb 9
+"""
+
+import asyncio
+import logging
+import time
+import tracemalloc
+from contextlib import ExitStack
+from typing import AsyncIterator
+from unittest.mock import patch
+
+from fastapi import HTTPException, UploadFile, status
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from api import dictations
+from api.database import get_session
+from api.main import app
+from api.models import UserModel
+from api.utils.security import create_access_token
+from benchmarks.common import base_parser, create_benchmark_engine, silent_wav
+
+CHUNK = 64 * 1024
+
+
+async def buffered_read_audio(audio: UploadFile) -> tuple[bytes, None]:
+    """The previous ingestion: read everything, then check the limit."""
+    if audio.content_type not in dictations.ALLOWED_CONTENT_TYPES:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST)
+    content = await audio.read()
+    if len(content) > dictations.MAX_AUDIO_BYTES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+    return content, None
+
+
+async def draining_transcribe(self, audio_data) -> str:
+    if isinstance(audio_data, bytes):
+        return "Transcript"
+    while audio_data.read(CHUNK):
+        await asyncio.sleep(0)
+    return "Transcript"
+
+
+async def fake_format(self, transcript: str, rule_block: str) -> str:
+    return transcript
+
+
+def multipart_body(size: int) -> tuple[bytes, str]:
+    boundary = "benchboundary"
+    head = (
+        f"--{boundary}\r\n"
+        'Content-Disposition: form-data; name="audio"; filename="visit.wav"\r\n'
+        "Content-Type: audio/wav\r\n\r\n"
+    ).encode()
+    body = head + silent_wav(size) + f"\r\n--{boundary}--\r\n".encode()
+    return body, f"multipart/form-data; boundary={boundary}"
+
+
+async def chunked(body: bytes) -> AsyncIterator[bytes]:
+    """Deliver the body in socket-sized pieces, as an ASGI server would."""
+    view = memoryview(body)
+    for start in range(0, len(body), CHUNK):
+        yield bytes(view[start : start + CHUNK])
+
+
+async def run_wave(client: AsyncClient, body: bytes, content_type: str, n: int):
+    headers = {
+        "Authorization": f"Bearer {create_access_token({'sub': '1'})}",
+        "Content-Type": content_type,
+        "Content-Length": str(len(body)),
+    }
+
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    responses = await asyncio.gather(
+        *(
+            client.post("/dictations/", content=chunked(body), headers=headers)
+            for _ in range(n)
+        )
+    )
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    return [r.status_code for r in responses], peak, elapsed
+
+
+async def main() -> None:
+    parser = base_parser(__doc__)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--size-mb", type=float, default=9.0)
+    parser.add_argument("--oversize-mb", type=float, default=30.0)
+    parser.add_argument("--modes", nargs="+", default=["buffered", "streamed"])
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    engine = await create_benchmark_engine(args.database_url, args.drop_tables)
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as session:
+        await session.execute(
+            insert(UserModel).values(
+                id=1, email="bench@example.com", hashed_password="x"
+            )
+        )
+        await session.commit()
+
+    async def override_get_session():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    accepted = multipart_body(int(args.size_mb * 1024 * 1024))
+    oversized = multipart_body(int(args.oversize_mb * 1024 * 1024))
+
+    tracemalloc.start()
+    print(f"\n{args.concurrency} concurrent uploads")
+    print("-" * 100)
+    for mode in args.modes:
+        with ExitStack() as stack:
+            stack.enter_context(
+                patch(
+                    "api.services.llm_service.LLMService.transcribe_audio",
+                    draining_transcribe,
+                )
+            )
+            stack.enter_context(
+                patch(
+                    "api.services.llm_service.LLMService.format_transcript", fake_format
+                )
+            )
+            stack.enter_context(patch("api.services.audio_service.embedding_index.add"))
+            if mode == "buffered":
+                stack.enter_context(
+                    patch("api.dictations._read_audio", buffered_read_audio)
+                )
+                # No early rejection either
+                stack.enter_context(
+                    patch.dict(dictations.REQUEST_BODY_LIMITS, clear=True)
+                )
+
+            transport = ASGITransport(app=app)
+            async with AsyncClient(
+                transport=transport, base_url="http://bench"
+            ) as client:
+                for label, (body, content_type) in (
+                    (f"{args.size_mb:g}MB accepted", accepted),
+                    (f"{args.oversize_mb:g}MB rejected", oversized),
+                ):
+                    codes, peak, elapsed = await run_wave(
+                        client, body, content_type, args.concurrency
+                    )
+                    print(
+                        f"{mode:<10} {label:<18} status={sorted(set(codes))} "
+                        f"peak={peak / 1024 / 1024:8.1f}MB  time={elapsed * 1000:8.1f}ms"
+                    )
+
+    tracemalloc.stop()
+    app.dependency_overrides.clear()
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,149 @@
+"""
+Database round trips and latency per write endpoint.
+
+Drives the register, login, create-dictation and preference-extraction
+endpoints through the ASGI app and counts what each request sends to the
+database: every statement plus every COMMIT/ROLLBACK is one round trip (with
+Postgres drivers the implicit BEGIN rides along with the first statement).
+The OpenAI calls are replaced by instant stand-ins and bcrypt runs at its
+minimum cost so only database work is measured.
+
+    uv run python -m benchmarks.bench_write_round_trips --database-url postgresql+psycopg://... \
+        --i-know-this-drops-tables
+"""
+
+import asyncio
+import logging
+import statistics
+from typing import Dict, List
+from unittest.mock import patch
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.orm import sessionmaker
+
+from api.database import get_session
+from api.main import app
+from api.utils.security import password_hasher
+from benchmarks.common import (
+    LatencyStats,
+    base_parser,
+    create_benchmark_engine,
+    print_report,
+    silent_wav,
+)
+
+NOTE = "Patient reviewed, stable, continue current medication."
+AUDIO = silent_wav(32000)
+
+
+class RoundTripCounter:
+    """Counts statements and transaction ends sent through an engine."""
+
+    def __init__(self, engine: AsyncEngine):
+        self.count = 0
+        sync_engine = engine.sync_engine
+        event.listen(sync_engine, "before_cursor_execute", self._bump)
+        event.listen(sync_engine, "commit", self._bump)
+        event.listen(sync_engine, "rollback", self._bump)
+
+    def _bump(self, *args) -> None:
+        self.count += 1
+
+
+async def fake_transcribe(self, audio_data: bytes) -> str:
+    return NOTE
+
+
+async def fake_format(self, transcript: str, rule_block: str) -> str:
+    return transcript
+
+
+async def fake_extract(self, original: str, edited: str, existing: str) -> str:
+    return "Use metric units"
+
+
+async def run(engine: AsyncEngine, iterations: int) -> tuple[List[LatencyStats], Dict]:
+    session_factory = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_session():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_session] = override_get_session
+    counter = RoundTripCounter(engine)
+    stats = {
+        name: LatencyStats(name)
+        for name in ("register", "login", "create dictation", "preference extract")
+    }
+    trips: Dict[str, List[int]] = {name: [] for name in stats}
+
+    async def call(name: str, method: str, url: str, **kwargs):
+        counter.count = 0
+        with stats[name].measure():
+            response = await client.request(method, url, **kwargs)
+        trips[name].append(counter.count)
+        assert response.status_code < 300, response.text
+        return response
+
+    transport = ASGITransport(app=app)
+    async with AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(iterations):
+            credentials = {"email": f"bench{i}@example.com", "password": "pw123456"}
+            await call("register", "POST", "/auth/register", json=credentials)
+            response = await call(
+                "login",
+                "POST",
+                "/auth/login",
+                data={"username": credentials["email"], "password": "pw123456"},
+            )
+            headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+            await call(
+                "create dictation",
+                "POST",
+                "/dictations/",
+                headers=headers,
+                files={"audio": ("a.wav", AUDIO, "audio/wav")},
+            )
+            await call(
+                "preference extract",
+                "POST",
+                "/dictations/preference_extract",
+                headers=headers,
+                params={"original_text": NOTE, "edited_text": NOTE + " kg"},
+            )
+
+    app.dependency_overrides.clear()
+    return list(stats.values()), trips
+
+
+async def main() -> None:
+    parser = base_parser(__doc__)
+    parser.set_defaults(iterations=100)
+    args = parser.parse_args()
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    engine = await create_benchmark_engine(args.database_url, args.drop_tables)
+    with (
+        patch("api.services.llm_service.LLMService.transcribe_audio", fake_transcribe),
+        patch("api.services.llm_service.LLMService.format_transcript", fake_format),
+        patch(
+            "api.services.llm_service.LLMService.extract_user_preferences",
+            fake_extract,
+        ),
+        patch("api.services.audio_service.embedding_index.add"),
+        patch.object(password_hasher, "rounds", 4),
+    ):
+        stats, trips = await run(engine, args.iterations)
+    await engine.dispose()
+
+    print_report(f"Write endpoints ({engine.dialect.name})", stats)
+    print("\nRound trips per request")
+    print("-" * 100)
+    for name, counts in trips.items():
+        print(f"{name:<40} mean={statistics.fmean(counts):5.2f} max={max(counts)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
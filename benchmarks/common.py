@@ -0,0 +1,134 @@
+"""
+Shared helpers for benchmarks: timing, reporting and database setup.
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import wave
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, List
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from api.config import settings
+from api.database import Base
+
+
+@dataclass
+class LatencyStats:
+    """Collects latency samples (in seconds) and summarises them."""
+
+    name: str
+    samples: List[float] = field(default_factory=list)
+
+    @contextmanager
+    def measure(self) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.append(time.perf_counter() - start)
+
+    def percentile(self, pct: float) -> float:
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def row(self) -> str:
+        return (
+            f"{self.name:<40} n={len(self.samples):<6} "
+            f"mean={statistics.fmean(self.samples) * 1000:8.3f}ms "
+            f"p50={self.percentile(50) * 1000:8.3f}ms "
+            f"p95={self.percentile(95) * 1000:8.3f}ms"
+        )
+
+
+def print_report(title: str, stats: List[LatencyStats]) -> None:
+    """Print a latency table for a group of measurements."""
+    print(f"\n{title}")
+    print("-" * 100)
+    for stat in stats:
+        print(stat.row())
+
+
+def silent_wav(size: int, rate: int = 16000) -> bytes:
+    """A valid 16-bit mono WAV of roughly ``size`` bytes of silence."""
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as output:
+        output.setnchannels(1)
+        output.setsampwidth(2)
+        output.setframerate(rate)
+        output.writeframes(b"\0" * max(2, size - size % 2))
+    return buffer.getvalue()
+
+
+def base_parser(description: str) -> argparse.ArgumentParser:
+    """Argument parser with the options every benchmark understands."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--database-url",
+        help="Async SQLAlchemy URL of a scratch database to benchmark against; "
+        "its tables are dropped (default: temporary SQLite)",
+    )
+    parser.add_argument(
+        "--i-know-this-drops-tables",
+        dest="drop_tables",
+        action="store_true",
+        help="Confirm that every table in --database-url may be dropped",
+    )
+    parser.add_argument(
+        "--iterations", type=int, default=200, help="Measured iterations per case"
+    )
+    return parser
+
+
+def check_scratch_database(database_url: str, drop_tables: bool) -> None:
+    """Exit unless ``database_url`` is safe to wipe.
+
+    Benchmarks drop and recreate every table, so they refuse the
+    application's own database outright, and any other database until the
+    user confirms with ``--i-know-this-drops-tables``.
+    """
+    url = make_url(database_url)
+    app_url = make_url(settings.DATABASE_URL)
+    if (
+        url.get_backend_name() == app_url.get_backend_name()
+        and url.database == app_url.database
+    ):
+        sys.exit(
+            f"Refusing to benchmark against {url.database!r}, the application's "
+            "database: the benchmark drops every table. Create a scratch "
+            "database with another name."
+        )
+    if not drop_tables:
+        sys.exit(
+            f"Benchmarking drops every table in {url.database!r}; pass "
+            "--i-know-this-drops-tables if it is a scratch database."
+        )
+
+
+async def create_benchmark_engine(
+    database_url: str | None, drop_tables: bool = False
+) -> AsyncEngine:
+    """Create an engine with a fresh schema, on a temporary SQLite by default.
+
+    A given ``database_url`` must pass ``check_scratch_database``.
+    """
+    if database_url is None:
+        path = os.path.join(tempfile.mkdtemp(prefix="lyrebird-bench-"), "bench.db")
+        database_url = f"sqlite+aiosqlite:///{path}"
+    else:
+        check_scratch_database(database_url, drop_tables)
+
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    return engine
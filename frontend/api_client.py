@@ -1,9 +1,8 @@
+import json
 import os
-import tempfile
-from typing import Dict, Optional, List, Any
+from typing import Dict, Iterator, Optional, List, Any, Tuple
 
 import requests
-import streamlit as st
 
 from config import config
 from session_manager import SessionManager
@@ -20,6 +19,50 @@ class APIClient:
         token = self.session_manager.get_jwt_token()
         return {"Authorization": f"Bearer {token}"} if token else {}
 
+    def refresh(self) -> bool:
+        """Exchange the refresh token for a new token pair, without a password."""
+        refresh_token = self.session_manager.get_refresh_token()
+        if not refresh_token:
+            return False
+
+        try:
+            response = requests.post(
+                config.auth_refresh_endpoint, json={"refresh_token": refresh_token}
+            )
+        except requests.RequestException:
+            return False
+
+        if response.status_code != 200:
+            # Expired or revoked: the user has to log in again
+            self.session_manager.logout()
+            return False
+
+        data = response.json()
+        self.session_manager.set_tokens(
+            data.get("access_token"), data.get("refresh_token")
+        )
+        return True
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> requests.Response:
+        """Send an authenticated request, refreshing the token once on 401."""
+        response = requests.request(
+            method, url, headers={**self._get_headers(), **(headers or {})}, **kwargs
+        )
+        if response.status_code == 401 and self.refresh():
+            response = requests.request(
+                method,
+                url,
+                headers={**self._get_headers(), **(headers or {})},
+                **kwargs,
+            )
+        return response
+
     def _handle_response(self, response: requests.Response) -> Dict[str, Any]:
         """Handle API response consistently."""
         if response.status_code in [200, 201]:
@@ -40,7 +83,9 @@ class APIClient:
 
             if response.status_code in [200, 201]:
                 data = response.json()
-                st.session_state.jwt_token = data.get("access_token")
+                self.session_manager.set_tokens(
+                    data.get("access_token"), data.get("refresh_token")
+                )
                 self.session_manager.clear_error()
                 self.session_manager.navigate_to_function()
                 return True
@@ -51,6 +96,18 @@ class APIClient:
             self.session_manager.set_error(f"Login error: {str(e)}")
             return False
 
+    def logout(self) -> None:
+        """Revoke the refresh token and clear the session."""
+        refresh_token = self.session_manager.get_refresh_token()
+        if refresh_token:
+            try:
+                requests.post(
+                    config.auth_logout_endpoint, json={"refresh_token": refresh_token}
+                )
+            except requests.RequestException:
+                pass
+        self.session_manager.logout()
+
     def register(self, email: str, password: str) -> bool:
         """Register a new user with the API."""
         try:
@@ -82,30 +139,56 @@ class APIClient:
             if file_extension.lower() not in valid_extensions:
                 file_extension = ".wav"
 
-            with tempfile.NamedTemporaryFile(
-                suffix=file_extension, delete=False
-            ) as temp_file:
-                temp_file_path = temp_file.name
-                temp_file.write(audio_data)
+            # Sent from memory so the upload can be repeated after a refresh
+            content_type = self._get_content_type(file_extension)
+            files = {"audio": (f"audio{file_extension}", audio_data, content_type)}
+            key = self.session_manager.action_key("dictation", audio_data)
+            response = self._request(
+                "POST",
+                config.dictation_endpoint,
+                headers={"Idempotency-Key": key},
+                files=files,
+            )
 
-            headers = self._get_headers()
+            result = self._handle_response(response)
+            if result["success"]:
+                self.session_manager.finish_action("dictation")
+            return result
 
-            with open(temp_file_path, "rb") as audio_file:
-                content_type = self._get_content_type(file_extension)
-                files = {"audio": (f"audio{file_extension}", audio_file, content_type)}
-                response = requests.post(
-                    config.dictation_endpoint, headers=headers, files=files
-                )
+        except Exception as e:
+            return {"success": False, "error": f"Error sending audio: {str(e)}"}
 
-            try:
-                os.unlink(temp_file_path)
-            except:
-                pass
+    def send_audio_batch(
+        self, audio_files: List[Tuple[str, bytes]]
+    ) -> Iterator[Dict[str, Any]]:
+        """Send several audio files in one request.
+
+        Yields each file's result as the API finishes it: ``index`` (position
+        in ``audio_files``), ``status`` ("created" or "failed") and either the
+        ``dictation`` or an error ``detail``.
+        """
+        files = []
+        for filename, audio_data in audio_files:
+            file_extension = os.path.splitext(filename)[1].lower()
+            content_type = self._get_content_type(file_extension)
+            files.append(("audio", (filename, audio_data, content_type)))
 
-            return self._handle_response(response)
+        try:
+            response = self._request(
+                "POST", config.dictation_batch_endpoint, files=files, stream=True
+            )
+            if response.status_code != 200:
+                yield {
+                    "status": "failed",
+                    "detail": f"API Error ({response.status_code}): {response.text}",
+                }
+                return
 
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
         except Exception as e:
-            return {"success": False, "error": f"Error sending audio: {str(e)}"}
+            yield {"status": "failed", "detail": f"Error sending audio: {str(e)}"}
 
     def _get_content_type(self, file_extension: str) -> Optional[str]:
         """Get content type based on file extension."""
@@ -115,6 +198,8 @@ class APIClient:
             ".wav": "audio/wav",
             ".ogg": "audio/ogg",
             ".mp4": "audio/mp4",
+            ".m4a": "audio/mp4",
+            ".mpga": "audio/mpeg",
         }
         return content_types.get(file_extension.lower())
 
@@ -123,14 +208,18 @@ class APIClient:
     ) -> Optional[Dict[str, Any]]:
         """Submit original and edited text to extract user preferences."""
         try:
-            headers = self._get_headers()
-            response = requests.post(
+            key = self.session_manager.action_key(
+                "preference_extract", original_text, edited_text
+            )
+            response = self._request(
+                "POST",
                 config.preference_extract_endpoint,
-                headers=headers,
+                headers={"Idempotency-Key": key},
                 params={"original_text": original_text, "edited_text": edited_text},
             )
 
             if response.status_code in [200, 201]:
+                self.session_manager.finish_action("preference_extract")
                 result = response.json()
                 if "preferences" in result and result["preferences"]:
                     self.session_manager.set_user_preferences(result["preferences"])
@@ -143,8 +232,7 @@ class APIClient:
     def fetch_user_preferences(self) -> List[str]:
         """Fetch user preferences from the API."""
         try:
-            headers = self._get_headers()
-            response = requests.get(config.preferences_endpoint, headers=headers)
+            response = self._request("GET", config.preferences_endpoint)
 
             if response.status_code in [200, 201]:
                 preferences_data = response.json()
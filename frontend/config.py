@@ -13,6 +13,14 @@ class Config:
     def auth_login_endpoint(self) -> str:
         return f"{self.API_BASE_URL}/auth/login"
 
+    @property
+    def auth_refresh_endpoint(self) -> str:
+        return f"{self.API_BASE_URL}/auth/refresh"
+
+    @property
+    def auth_logout_endpoint(self) -> str:
+        return f"{self.API_BASE_URL}/auth/logout"
+
     @property
     def auth_register_endpoint(self) -> str:
         return f"{self.API_BASE_URL}/auth/register"
@@ -21,6 +29,10 @@ class Config:
     def dictation_endpoint(self) -> str:
         return f"{self.API_BASE_URL}/dictations"
 
+    @property
+    def dictation_batch_endpoint(self) -> str:
+        return f"{self.API_BASE_URL}/dictations/batch"
+
     @property
     def preference_extract_endpoint(self) -> str:
         return f"{self.API_BASE_URL}/dictations/preference_extract"
@@ -33,7 +33,7 @@ class LyrebirdPages:
         with st.sidebar:
             st.info("Logged in successfully")
             if st.button("Logout", key="logout_button", use_container_width=True):
-                self.session_manager.logout()
+                self.ui_components.api_client.logout()
                 st.rerun()
 
             self.ui_components.render_sidebar_preferences()
@@ -1,4 +1,7 @@
+import hashlib
+import uuid
 from typing import Optional, List
+
 import streamlit as st
 
 
@@ -10,6 +13,7 @@ class SessionManager:
         """Initialize session state variables if they don't exist."""
         defaults = {
             "jwt_token": None,
+            "refresh_token": None,
             "page": "auth",
             "auth_mode": "login",
             "transcript": "",
@@ -18,6 +22,7 @@ class SessionManager:
             "dictation_id": None,
             "user_preferences": [],
             "error_message": None,
+            "pending_actions": {},
         }
 
         for key, value in defaults.items():
@@ -59,6 +64,7 @@ class SessionManager:
         """Log out the user by clearing session state."""
         reset_keys = [
             "jwt_token",
+            "refresh_token",
             "transcript",
             "edited_transcript",
             "formatted_transcript",
@@ -69,6 +75,7 @@ class SessionManager:
         for key in reset_keys:
             st.session_state[key] = None if key != "user_preferences" else []
 
+        st.session_state.pending_actions = {}
         st.session_state.page = "auth"
         st.session_state.auth_mode = "login"
 
@@ -93,7 +100,43 @@ class SessionManager:
         """Get JWT token from session state."""
         return st.session_state.get("jwt_token")
 
+    @staticmethod
+    def get_refresh_token() -> Optional[str]:
+        """Get refresh token from session state."""
+        return st.session_state.get("refresh_token")
+
+    @staticmethod
+    def set_tokens(access_token: Optional[str], refresh_token: Optional[str]):
+        """Store the access and refresh tokens in session state."""
+        st.session_state.jwt_token = access_token
+        st.session_state.refresh_token = refresh_token
+
     @staticmethod
     def set_user_preferences(preferences: List[str]):
         """Set user preferences in session state."""
         st.session_state.user_preferences = preferences
+
+    @staticmethod
+    def action_key(action: str, *inputs: str | bytes) -> str:
+        """Idempotency-Key for a user action, reused only when it is retried.
+
+        Each action gets a random key. It is kept until the action succeeds,
+        so trying the same action again with the same input (say after a
+        timeout) sends the same key; new input starts a new action.
+        """
+        digest = hashlib.sha256()
+        for part in inputs:
+            digest.update(part.encode() if isinstance(part, str) else part)
+            digest.update(b"\0")
+
+        pending = st.session_state.pending_actions
+        key, fingerprint = pending.get(action, (None, None))
+        if fingerprint != digest.digest():
+            key = str(uuid.uuid4())
+            pending[action] = (key, digest.digest())
+        return key
+
+    @staticmethod
+    def finish_action(action: str):
+        """Forget a succeeded action's key so the next attempt is a new one."""
+        st.session_state.pending_actions.pop(action, None)
@@ -160,19 +160,26 @@ class UIComponents:
     def render_audio_uploader(self):
         """Render audio file uploader."""
         st.subheader("Upload Audio File")
-        st.write("Select an audio file from your device to transcribe.")
+        st.write("Select one or more audio files from your device to transcribe.")
 
-        uploaded_file = st.file_uploader(
+        uploaded_files = st.file_uploader(
             "Supported formats: WAV, MP3, M4A, OGG",
             type=["wav", "mp3", "mpga", "m4a", "ogg"],
+            accept_multiple_files=True,
         )
 
-        if uploaded_file is not None:
+        if len(uploaded_files) == 1:
+            uploaded_file = uploaded_files[0]
             st.success(f"File uploaded: {uploaded_file.name}")
             st.audio(uploaded_file)
 
             if st.button("Transcribe Audio"):
                 self._process_uploaded_audio(uploaded_file)
+        elif uploaded_files:
+            st.success(f"{len(uploaded_files)} files uploaded")
+
+            if st.button(f"Transcribe {len(uploaded_files)} Files"):
+                self._process_uploaded_batch(uploaded_files)
 
     def _process_recorded_audio(self, audio_bytes: bytes):
         """Process recorded audio data."""
@@ -210,6 +217,33 @@ class UIComponents:
                     )
                 )
 
+    def _process_uploaded_batch(self, uploaded_files):
+        """Transcribe several uploaded files, showing each result as it finishes."""
+        audio_files = [(f.name, f.getvalue()) for f in uploaded_files]
+        progress = st.progress(0.0, text="Transcribing uploaded audio...")
+        last_created = None
+        done = 0
+
+        for result in self.api_client.send_audio_batch(audio_files):
+            if "index" not in result:
+                st.error(result.get("detail", "Batch upload failed"))
+                return
+
+            done += 1
+            progress.progress(
+                done / len(audio_files), text=f"{done} of {len(audio_files)} done"
+            )
+            filename = audio_files[result["index"]][0]
+            if result["status"] == "created":
+                st.success(f"{filename}: transcribed")
+                last_created = result["dictation"]
+            else:
+                st.error(f"{filename}: {result.get('detail', 'failed')}")
+
+        # Open the most recently finished note for editing
+        if last_created:
+            self.session_manager.set_transcription_data(last_created)
+
     def render_transcript_section(self):
         """Render transcript editing and action buttons."""
         st.markdown("---")